@@ -2,8 +2,15 @@ import reflex as rx
 from fastapi import FastAPI
 from sqlmodel import SQLModel, Session
 from .database import engine
+from .background import start_periodic_task
 from .logic.logic_users import create_first_admin
 from .logic.logic_settings import create_initial_settings
+from .logic.logic_schema import upgrade_schema
+from .logic.logic_idempotency import purge_expired_keys, IDEMPOTENCY_CLEANUP_INTERVAL_SECONDS
+from .logic.logic_auth import purge_expired_refresh_tokens, REFRESH_TOKEN_CLEANUP_INTERVAL_SECONDS
+from .logic.logic_stock import compact_stock_movements, STOCK_LEDGER, STOCK_COMPACT_INTERVAL_SECONDS
+from .logic.logic_rollups import rebuild_rollups_if_empty, compact_rollups, ROLLUP_COMPACT_INTERVAL_SECONDS, ROLLUP_COMPACT_BATCH_SIZE
+from .logic.logic_report_jobs import resume_pending_jobs, purge_old_report_jobs, REPORT_JOB_CLEANUP_INTERVAL_SECONDS
 from .routers import auth, inventory, users, settings, dashboard, reports, products, orders
 
 style = {"font_family": "Instrument Sans", "background_color": "#F9FAFB"}
@@ -11,12 +18,48 @@ app = rx.App(style=style)
 
 def init_db():
     SQLModel.metadata.create_all(bind=engine)
+    # Columnas e índices nuevos en tablas existentes (no hay migraciones)
+    for change in upgrade_schema(engine):
+        print(f"INFO:     Esquema actualizado: {change}")
     with Session(engine) as session:
         create_initial_settings(session)
         create_first_admin(session)
+        rebuild_rollups_if_empty(session)
+        resume_pending_jobs(session)
+
+def purge_idempotency_keys():
+    with Session(engine) as session:
+        purge_expired_keys(session)
+
+def purge_refresh_tokens():
+    with Session(engine) as session:
+        purge_expired_refresh_tokens(session)
+
+def compact_stock():
+    with Session(engine) as session:
+        compact_stock_movements(session)
+
+def compact_sales_rollups():
+    with Session(engine) as session:
+        # Lote lleno: quedan más pendientes, se sigue sin esperar al próximo ciclo
+        while compact_rollups(session) >= ROLLUP_COMPACT_BATCH_SIZE:
+            pass
+
+def purge_report_jobs():
+    with Session(engine) as session:
+        purge_old_report_jobs(session)
+
+def start_background_jobs():
+    start_periodic_task("idempotency-cleanup", IDEMPOTENCY_CLEANUP_INTERVAL_SECONDS, purge_idempotency_keys)
+    start_periodic_task("refresh-token-cleanup", REFRESH_TOKEN_CLEANUP_INTERVAL_SECONDS, purge_refresh_tokens)
+    start_periodic_task("report-job-cleanup", REPORT_JOB_CLEANUP_INTERVAL_SECONDS, purge_report_jobs)
+    start_periodic_task("rollup-compactor", ROLLUP_COMPACT_INTERVAL_SECONDS, compact_sales_rollups)
+    if STOCK_LEDGER:
+        start_periodic_task("stock-compactor", STOCK_COMPACT_INTERVAL_SECONDS, compact_stock)
 
 # Startup en la app raíz (sí se ejecuta)
 app._api.add_event_handler("startup", init_db)
+app._api.add_event_handler("startup", start_background_jobs)
 
 # Sub‑app con tus routers
 custom_api = FastAPI()
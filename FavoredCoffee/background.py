@@ -0,0 +1,21 @@
+import threading
+import time
+from typing import Callable
+
+def start_periodic_task(name: str, interval_seconds: float, task: Callable[[], None]) -> threading.Thread:
+    """
+    Ejecuta `task` cada `interval_seconds` en un hilo daemon.
+    Los errores se registran y no detienen el ciclo.
+    """
+    def loop():
+        while True:
+            time.sleep(interval_seconds)
+            try:
+                task()
+            except Exception as e:
+                print(f"ERROR:    La tarea '{name}' falló: {e}")
+
+    thread = threading.Thread(target=loop, name=name, daemon=True)
+    thread.start()
+    print(f"INFO:     Tarea periódica '{name}' iniciada (cada {interval_seconds}s).")
+    return thread
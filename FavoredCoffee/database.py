@@ -1,5 +1,10 @@
 import os
+from typing import Any, Callable, Union
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import SQLModel, create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 # Leemos la URL de la base de datos de las variables de entorno
 # Si no existe (local), usamos un sqlite temporal o falla
@@ -17,6 +22,75 @@ if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
 
 engine = create_engine(DATABASE_URL, echo=False)
 
+def _begin_before_savepoint(sync_engine):
+    """
+    pysqlite/aiosqlite abren la transacción recién con el primer INSERT/UPDATE,
+    así que un SAVEPOINT previo (begin_nested) haría commit al liberarse.
+    Antes de ese SAVEPOINT se abre la transacción con BEGIN IMMEDIATE: toma el
+    lock de escritura de entrada y espera al otro escritor, en vez de fallar
+    con "database is locked" al pasar de lectura a escritura. El resto de las
+    transacciones sigue el modo por defecto del driver (lecturas sin BEGIN).
+    """
+    @event.listens_for(sync_engine, "savepoint")
+    def _savepoint(connection, name):
+        dbapi_connection = connection.connection.dbapi_connection
+        # aiosqlite envuelve la conexión sqlite3 en `_connection`
+        if not getattr(dbapi_connection, "_connection", dbapi_connection).in_transaction:
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+if engine.dialect.name == "sqlite":
+    _begin_before_savepoint(engine)
+
+# Capa asíncrona para los routers (aiosqlite en local, asyncpg en Postgres).
+# DB_ASYNC=0 vuelve a la sesión síncrona, ejecutada en el threadpool.
+DB_ASYNC = os.environ.get("DB_ASYNC", "1") == "1"
+
+def _to_async_url(url: str) -> str:
+    if url.startswith("sqlite:///"):
+        return url.replace("sqlite:///", "sqlite+aiosqlite:///", 1)
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    return url
+
+ASYNC_DATABASE_URL = os.environ.get("ASYNC_DATABASE_URL") or _to_async_url(DATABASE_URL)
+
+async_engine = create_async_engine(ASYNC_DATABASE_URL, echo=False) if DB_ASYNC else None
+if async_engine is not None and async_engine.dialect.name == "sqlite":
+    _begin_before_savepoint(async_engine.sync_engine)
+
 def get_session():
     with Session(engine) as session:
-        yield session
\ No newline at end of file
+        yield session
+
+async def get_db():
+    """
+    Dependencia de los routers: AsyncSession, o Session síncrona si DB_ASYNC=0.
+    Usar siempre junto con run_db para no bloquear el event loop.
+    """
+    if DB_ASYNC:
+        # expire_on_commit=False: los objetos devueltos se serializan fuera de la sesión
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            yield session
+    else:
+        with Session(engine) as session:
+            yield session
+
+async def run_db(session: Union[AsyncSession, Session], fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Ejecuta una función de lógica síncrona (fn(db, ...)) sin bloquear el loop.
+    Con AsyncSession usa run_sync (el I/O va por el driver asíncrono);
+    con la Session síncrona de respaldo la ejecuta en el threadpool.
+    """
+    if isinstance(session, AsyncSession):
+        return await session.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, session, *args, **kwargs)
+
+async def run_in_sync_session(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Para lógica con mucho trabajo de CPU (p. ej. leer un Excel): la ejecuta
+    en el threadpool con su propia Session síncrona.
+    """
+    def task():
+        with Session(engine) as session:
+            return fn(session, *args, **kwargs)
+    return await run_in_threadpool(task)
@@ -0,0 +1,130 @@
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+from fastapi import HTTPException, status
+from sqlmodel import Session, select, delete
+from sqlalchemy import update
+from ..models import RefreshToken, User
+from ..security import REFRESH_TOKEN_EXPIRE_DAYS, SECRET_KEY
+
+REFRESH_TOKEN_CLEANUP_INTERVAL_SECONDS = 3600
+# Ventana en la que reusar un token recién rotado devuelve su sucesor en vez
+# de tratarse como robo (dos pestañas o una respuesta perdida en la red)
+REFRESH_TOKEN_REUSE_GRACE_SECONDS = int(os.environ.get("REFRESH_TOKEN_REUSE_GRACE_SECONDS", 30))
+
+def _hash_token(raw_token: str) -> str:
+    # SHA-256 basta: el token es aleatorio (no es una contraseña), y así
+    # la renovación cuesta una búsqueda por índice, nunca un bcrypt
+    return hashlib.sha256(raw_token.encode()).hexdigest()
+
+def _invalid_refresh_token() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Refresh token inválido o vencido",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+def _successor_token(raw_token: str) -> str:
+    """
+    Sucesor determinista de un token: HMAC con la clave del servidor. Así un
+    reintento dentro de la ventana de gracia recibe el mismo sucesor sin
+    guardar tokens en claro, y quien solo tiene el token viejo no puede calcularlo.
+    """
+    digest = hmac.new(SECRET_KEY.encode(), raw_token.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+def _new_refresh_token(db: Session, user_id: int, raw_token: Optional[str] = None) -> Tuple[RefreshToken, str]:
+    raw_token = raw_token or secrets.token_urlsafe(48)
+    record = RefreshToken(
+        token_hash=_hash_token(raw_token),
+        user_id=user_id,
+        expires_at=datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    )
+    db.add(record)
+    return record, raw_token
+
+def issue_refresh_token(db: Session, user: User) -> str:
+    """Crea un refresh token para el usuario (tras un login exitoso)."""
+    _, raw_token = _new_refresh_token(db, user.id)
+    db.commit()
+    return raw_token
+
+def rotate_refresh_token(db: Session, raw_token: str) -> Tuple[User, str]:
+    """
+    Valida el refresh token, lo revoca y emite uno nuevo. La revocación es un
+    UPDATE condicional (revoked_at IS NULL): de dos renovaciones simultáneas
+    solo una rota el token. Reusar un token ya rotado dentro de la ventana de
+    gracia devuelve el mismo sucesor; fuera de ella (posible robo) se revocan
+    todos los tokens activos del usuario.
+    """
+    now = datetime.utcnow()
+    record = db.exec(
+        select(RefreshToken).where(RefreshToken.token_hash == _hash_token(raw_token))
+    ).first()
+    if not record or record.expires_at <= now:
+        raise _invalid_refresh_token()
+
+    user = db.get(User, record.user_id)
+    if not user or not user.is_active:
+        raise _invalid_refresh_token()
+
+    if record.revoked_at is None:
+        result = db.exec(
+            update(RefreshToken)
+            .where(RefreshToken.id == record.id, RefreshToken.revoked_at == None)
+            .values(revoked_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 1:
+            new_record, new_raw_token = _new_refresh_token(db, user.id, _successor_token(raw_token))
+            db.flush()
+            db.exec(
+                update(RefreshToken)
+                .where(RefreshToken.id == record.id)
+                .values(replaced_by_id=new_record.id)
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+            return user, new_raw_token
+        # Otra renovación lo rotó entre la lectura y el UPDATE
+        db.rollback()
+        db.refresh(record)
+        db.refresh(user) # el rollback expira los objetos y el router los serializa fuera de la sesión
+
+    successor_raw_token = _successor_token(raw_token)
+    if record.replaced_by_id is not None and now - record.revoked_at <= timedelta(seconds=REFRESH_TOKEN_REUSE_GRACE_SECONDS):
+        successor = db.get(RefreshToken, record.replaced_by_id)
+        if (
+            successor is not None
+            and successor.revoked_at is None
+            and successor.token_hash == _hash_token(successor_raw_token)
+        ):
+            return user, successor_raw_token
+
+    db.exec(
+        update(RefreshToken)
+        .where(RefreshToken.user_id == record.user_id, RefreshToken.revoked_at == None)
+        .values(revoked_at=now)
+    )
+    db.commit()
+    raise _invalid_refresh_token()
+
+def revoke_refresh_token(db: Session, raw_token: str):
+    """Revoca el refresh token (logout). No falla si no existe."""
+    record = db.exec(
+        select(RefreshToken).where(RefreshToken.token_hash == _hash_token(raw_token))
+    ).first()
+    if record and record.revoked_at is None:
+        record.revoked_at = datetime.utcnow()
+        db.add(record)
+        db.commit()
+
+def purge_expired_refresh_tokens(db: Session) -> int:
+    """Elimina los refresh tokens vencidos. Devuelve cuántos borró."""
+    result = db.exec(delete(RefreshToken).where(RefreshToken.expires_at <= datetime.utcnow()))
+    db.commit()
+    return result.rowcount
@@ -0,0 +1,148 @@
+import os
+import shutil
+import tempfile
+import zipfile
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Tuple
+from fastapi import HTTPException
+from sqlmodel import Session, select
+
+from ..models import Order, OrderItem, Product
+from .logic_rollups import start_of_day_utc
+
+# Filas por RecordBatch: la memoria queda acotada a un lote por tabla
+COLUMNAR_BATCH_ROWS = int(os.environ.get("COLUMNAR_BATCH_ROWS", 50_000))
+COLUMNAR_FORMATS = {"parquet": "parquet", "arrow": "arrow"} # formato -> extensión
+
+def _pyarrow():
+    """pyarrow es opcional: solo se necesita para esta exportación."""
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise HTTPException(
+            status_code=501,
+            detail="La exportación columnar requiere pyarrow (pip install pyarrow)."
+        )
+    return pyarrow
+
+def _tables(pa, start_date: date, end_date: date) -> List[Tuple[str, "pa.Schema", object]]:
+    """(nombre, esquema, consulta) de cada tabla exportada. Products va completo."""
+    in_range = (
+        Order.created_at >= start_of_day_utc(start_date),
+        Order.created_at < start_of_day_utc(end_date + timedelta(days=1))
+    )
+    orders = (
+        "orders",
+        pa.schema([
+            ("id", pa.int64()),
+            ("created_at", pa.timestamp("us", tz="UTC")),
+            ("status", pa.string()),
+            ("payment_method", pa.string()),
+            ("subtotal", pa.float64()),
+            ("tax_amount", pa.float64()),
+            ("total_amount", pa.float64()),
+            ("user_id", pa.int64()),
+        ]),
+        select(
+            Order.id, Order.created_at, Order.status, Order.payment_method,
+            Order.subtotal, Order.tax_amount, Order.total_amount, Order.user_id
+        ).where(*in_range).order_by(Order.id)
+    )
+    order_items = (
+        "order_items",
+        pa.schema([
+            ("id", pa.int64()),
+            ("order_id", pa.int64()),
+            ("product_id", pa.int64()),
+            ("quantity", pa.int64()),
+            ("price_at_purchase", pa.float64()),
+        ]),
+        select(
+            OrderItem.id, OrderItem.order_id, OrderItem.product_id,
+            OrderItem.quantity, OrderItem.price_at_purchase
+        ).join(Order, OrderItem.order_id == Order.id).where(*in_range).order_by(OrderItem.id)
+    )
+    products = (
+        "products",
+        pa.schema([
+            ("id", pa.int64()),
+            ("sku", pa.string()),
+            ("name", pa.string()),
+            ("category", pa.string()),
+            ("price", pa.float64()),
+            ("stock", pa.int64()),
+        ]),
+        select(
+            Product.id, Product.sku, Product.name, Product.category, Product.price, Product.stock
+        ).order_by(Product.id)
+    )
+    return [orders, order_items, products]
+
+def _record_batches(pa, schema, rows: Iterable[tuple]):
+    """Agrupa las filas del cursor en RecordBatches de COLUMNAR_BATCH_ROWS filas."""
+    columns: List[list] = [[] for _ in schema.names]
+    for row in rows:
+        for column, value in zip(columns, row):
+            column.append(value)
+        if len(columns[0]) >= COLUMNAR_BATCH_ROWS:
+            yield pa.RecordBatch.from_arrays([pa.array(c, type=f.type) for c, f in zip(columns, schema)], schema=schema)
+            columns = [[] for _ in schema.names]
+    if columns[0]:
+        yield pa.RecordBatch.from_arrays([pa.array(c, type=f.type) for c, f in zip(columns, schema)], schema=schema)
+
+def export_columnar(
+    db: Session,
+    start_date: date,
+    end_date: date,
+    export_format: str,
+    output_dir: str
+) -> Dict[str, dict]:
+    """
+    Escribe orders, order_items y products del rango como Parquet o Arrow IPC
+    en output_dir, leyendo con un cursor del servidor (yield_per).
+    Devuelve {tabla: {"path", "rows"}}.
+    """
+    if export_format not in COLUMNAR_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Formato no soportado: {export_format}")
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="Rango de fechas inválido")
+    pa = _pyarrow()
+    os.makedirs(output_dir, exist_ok=True)
+
+    written = {}
+    for name, schema, statement in _tables(pa, start_date, end_date):
+        path = os.path.join(output_dir, f"{name}.{COLUMNAR_FORMATS[export_format]}")
+        rows = db.exec(statement.execution_options(yield_per=COLUMNAR_BATCH_ROWS))
+        if export_format == "parquet":
+            writer = pa.parquet.ParquetWriter(path, schema, compression="snappy")
+        else:
+            writer = pa.ipc.new_file(path, schema)
+        count = 0
+        try:
+            for batch in _record_batches(pa, schema, rows):
+                writer.write_batch(batch)
+                count += batch.num_rows
+        finally:
+            writer.close()
+        written[name] = {"path": path, "rows": count}
+    return written
+
+def export_columnar_zip(db: Session, start_date: date, end_date: date, export_format: str) -> Tuple[str, str]:
+    """
+    Exporta a un directorio temporal y empaqueta los archivos en un zip.
+    Devuelve (ruta del zip, directorio temporal); quien llama borra el directorio.
+    """
+    work_dir = tempfile.mkdtemp(prefix="columnar_export_")
+    try:
+        written = export_columnar(db, start_date, end_date, export_format, os.path.join(work_dir, "tables"))
+        zip_path = os.path.join(work_dir, "export.zip")
+        # Parquet/Arrow ya vienen comprimidos: ZIP_STORED evita recomprimir
+        with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_STORED) as archive:
+            for info in written.values():
+                archive.write(info["path"], arcname=os.path.basename(info["path"]))
+    except Exception:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise
+    return zip_path, work_dir
@@ -0,0 +1,95 @@
+import asyncio
+import threading
+import uuid
+from typing import Dict, List, Optional, Set
+from ..schemas import OrderResponse
+from .logic_rollups import business_date, week_start
+
+# Cola por suscriptor: si un cliente se atrasa se descartan eventos y se le
+# marca como atrasado para que haga una recarga completa.
+ORDER_EVENTS_QUEUE_SIZE = 100
+
+# Cada publicación lleva un número de secuencia creciente (por proceso). Una
+# lectura completa informa la secuencia vigente antes de consultar, y el
+# suscriptor descarta los deltas que ya están incluidos en esa lectura.
+# EVENTS_SOURCE identifica al proceso: con varios workers la secuencia de otro no sirve.
+EVENTS_SOURCE = uuid.uuid4().hex
+
+class OrderEventSubscription:
+    """
+    Suscripción a los eventos "órdenes confirmadas" del proceso actual.
+    Se crea dentro del event loop que la va a consumir; los publicadores
+    (hilos del threadpool o el group commit) entregan con call_soon_threadsafe.
+    """
+
+    def __init__(self):
+        self._loop = asyncio.get_running_loop()
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=ORDER_EVENTS_QUEUE_SIZE)
+        self.lagged = False
+
+    def _deliver(self, event: dict):
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.lagged = True
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[dict]:
+        """Siguiente evento, o None si pasa `timeout` sin eventos."""
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        unsubscribe(self)
+
+_subscribers: Set[OrderEventSubscription] = set()
+_subscribers_lock = threading.Lock()
+_sequence = 0
+
+def current_sequence() -> int:
+    """Última secuencia publicada: todo delta con seq <= este valor ya está confirmado en la base."""
+    with _subscribers_lock:
+        return _sequence
+
+def subscribe() -> OrderEventSubscription:
+    subscription = OrderEventSubscription()
+    with _subscribers_lock:
+        _subscribers.add(subscription)
+    return subscription
+
+def unsubscribe(subscription: OrderEventSubscription):
+    with _subscribers_lock:
+        _subscribers.discard(subscription)
+
+def publish_orders_committed(orders: List[OrderResponse]):
+    """
+    Publica el delta de un commit, agrupado por semana (lunes local):
+    {"seq", "week_start", "total_sales", "order_count", "product_units": {product_id: unidades}}.
+    Se llama después del commit, nunca dentro de la transacción.
+    """
+    global _sequence
+    if not orders:
+        return
+    deltas: Dict[str, dict] = {}
+    for order in orders:
+        week = week_start(business_date(order.created_at)).isoformat()
+        delta = deltas.setdefault(week, {"week_start": week, "total_sales": 0.0, "order_count": 0, "product_units": {}})
+        delta["total_sales"] += order.total_amount
+        delta["order_count"] += 1
+        for item in order.items:
+            delta["product_units"][item.product_id] = delta["product_units"].get(item.product_id, 0) + item.quantity
+
+    with _subscribers_lock:
+        _sequence += 1
+        for delta in deltas.values():
+            delta["seq"] = _sequence
+        subscribers = list(_subscribers)
+    for subscription in subscribers:
+        for delta in deltas.values():
+            try:
+                subscription._loop.call_soon_threadsafe(subscription._deliver, delta)
+            except RuntimeError:
+                # El loop del suscriptor ya cerró
+                unsubscribe(subscription)
+                break
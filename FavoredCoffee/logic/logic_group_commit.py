@@ -0,0 +1,235 @@
+import asyncio
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Dict, List, Optional
+from fastapi import HTTPException
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session
+
+from ..database import engine
+from ..models import User
+from ..schemas import OrderRequest, OrderResponse
+from .logic_settings import get_settings
+from .logic_orders import _apply_order, _load_products, after_orders_committed
+from . import logic_idempotency
+
+# Modo opcional: ORDER_GROUP_COMMIT=1 agrupa órdenes concurrentes en un solo commit
+ORDER_GROUP_COMMIT = os.environ.get("ORDER_GROUP_COMMIT", "0") == "1"
+ORDER_GROUP_COMMIT_WINDOW_MS = float(os.environ.get("ORDER_GROUP_COMMIT_WINDOW_MS", 5))
+ORDER_GROUP_COMMIT_MAX_ORDERS = int(os.environ.get("ORDER_GROUP_COMMIT_MAX_ORDERS", 50))
+ORDER_GROUP_COMMIT_TIMEOUT_SECONDS = 30
+
+class _OrderJob:
+    def __init__(self, order_request: OrderRequest, user: User, idempotency_key: Optional[str]):
+        self.order_request = order_request
+        self.user = user
+        self.idempotency_key = idempotency_key
+        self.order_hash = logic_idempotency.request_hash(order_request) if idempotency_key else None
+        self.future: Future = Future()
+        self.enqueued_at = time.perf_counter()
+
+class GroupCommitWriter:
+    """
+    Escritor único de órdenes. Junta las órdenes que llegan dentro de una
+    ventana corta (o hasta N órdenes), las aplica en una transacción con un
+    solo commit y resuelve el Future de cada llamador con su propio
+    resultado o error.
+    """
+
+    def __init__(self, window_ms: float, max_orders: int):
+        self.window_seconds = window_ms / 1000
+        self.max_orders = max_orders
+        self._queue: "queue.Queue[_OrderJob]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            "batches": 0,
+            "orders": 0,
+            "failed_orders": 0,
+            "failed_batches": 0,
+            "last_batch_size": 0,
+            "max_batch_size": 0,
+            "last_batch_ms": 0.0,
+            "max_batch_ms": 0.0,
+            "total_batch_ms": 0.0,
+            "total_wait_ms": 0.0,
+        }
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="order-group-commit", daemon=True)
+                self._thread.start()
+
+    def _enqueue(self, order_request: OrderRequest, user: User, idempotency_key: Optional[str]) -> Future:
+        self._ensure_started()
+        job = _OrderJob(order_request, user, idempotency_key)
+        self._queue.put(job)
+        return job.future
+
+    def submit(self, order_request: OrderRequest, user: User, idempotency_key: Optional[str] = None) -> OrderResponse:
+        """Encola la orden y bloquea hasta que su lote se confirme."""
+        future = self._enqueue(order_request, user, idempotency_key)
+        try:
+            return future.result(timeout=ORDER_GROUP_COMMIT_TIMEOUT_SECONDS)
+        except FutureTimeoutError:
+            pass
+        self._cancel_or_raise(future)
+        # El lote ya empezó: su resultado es definitivo, se espera sin límite
+        return future.result()
+
+    async def submit_async(self, order_request: OrderRequest, user: User, idempotency_key: Optional[str] = None) -> OrderResponse:
+        """Igual que submit, pero espera el lote sin ocupar un hilo del threadpool."""
+        future = self._enqueue(order_request, user, idempotency_key)
+        try:
+            # shield: el timeout no debe cancelar el Future por debajo, eso lo decide _cancel_or_raise
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout=ORDER_GROUP_COMMIT_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        self._cancel_or_raise(future)
+        return await asyncio.wrap_future(future)
+
+    @staticmethod
+    def _cancel_or_raise(future: Future):
+        """
+        Tras el timeout: si el trabajo sigue en cola se cancela (el escritor lo
+        salta, así que la orden nunca se aplica) y se responde 503 para que el
+        cliente reintente con la misma Idempotency-Key. Si su lote ya está en
+        curso no se puede cancelar y el llamador espera el resultado real.
+        """
+        if future.cancel():
+            raise HTTPException(
+                status_code=503,
+                detail="La orden no se procesó a tiempo y no fue registrada; intente de nuevo"
+            )
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.perf_counter() + self.window_seconds
+            while len(batch) < self.max_orders:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            # Los trabajos cancelados por timeout se descartan; el resto queda
+            # "en curso" y ya no se puede cancelar
+            batch = [job for job in batch if job.future.set_running_or_notify_cancel()]
+            if batch:
+                self._process(batch)
+
+    def _process(self, batch: List[_OrderJob]):
+        started = time.perf_counter()
+        outcomes = []
+        committed: List[OrderResponse] = []
+        seen_keys: Dict[str, tuple] = {} # key -> (user_id, order_hash, respuesta)
+
+        with Session(engine) as db:
+            try:
+                settings = get_settings(db)
+                product_ids = [item.product_id for job in batch for item in job.order_request.items]
+                products_map = _load_products(db, product_ids) if product_ids else {}
+
+                for job in batch:
+                    try:
+                        key = job.idempotency_key
+                        stored = None
+                        if key and key in seen_keys:
+                            # Misma clave repetida dentro del lote
+                            seen_user_id, seen_hash, stored = seen_keys[key]
+                            logic_idempotency._check_key(seen_user_id, seen_hash, job.user.id, job.order_hash)
+                        elif key:
+                            stored = logic_idempotency.get_stored_response(db, key, job.user.id, job.order_hash)
+                        if stored:
+                            outcomes.append((job, stored, None, None))
+                            continue
+                        expires_at = None
+                        try:
+                            # Orden y clave en el mismo SAVEPOINT: si la clave choca con
+                            # otra petición, solo se deshace esta orden, no el lote
+                            with db.begin_nested():
+                                response = _apply_order(db, job.order_request, job.user, settings.tax_rate, products_map)
+                                if key:
+                                    expires_at = logic_idempotency.save_response(db, key, job.user.id, job.order_hash, response)
+                                    db.flush()
+                        except IntegrityError as e:
+                            # Otra petición con la misma clave ganó la carrera: devolvemos su orden
+                            stored = logic_idempotency.get_stored_response(db, key, job.user.id, job.order_hash) if key else None
+                            if not stored:
+                                raise HTTPException(status_code=500, detail=f"Error interno al crear la orden: {str(e)}")
+                            outcomes.append((job, stored, None, None))
+                            continue
+                        committed.append(response)
+                        if key:
+                            seen_keys[key] = (job.user.id, job.order_hash, response)
+                        outcomes.append((job, response, None, expires_at))
+                    except HTTPException as e:
+                        outcomes.append((job, None, e, None))
+
+                db.commit()
+
+            except Exception as e:
+                db.rollback()
+                error = HTTPException(status_code=500, detail=f"Error interno al crear la orden: {str(e)}")
+                for job in batch:
+                    job.future.set_exception(error)
+                self._record(batch, started, failed_orders=len(batch), failed_batch=True)
+                return
+
+        after_orders_committed(committed)
+        for job, response, error, expires_at in outcomes:
+            if error is not None:
+                job.future.set_exception(error)
+                continue
+            if expires_at is not None:
+                logic_idempotency.remember_response(job.idempotency_key, job.user.id, job.order_hash, response, expires_at)
+            job.future.set_result(response)
+
+        self._record(batch, started, failed_orders=sum(1 for o in outcomes if o[2] is not None))
+
+    def _record(self, batch: List[_OrderJob], started: float, failed_orders: int, failed_batch: bool = False):
+        finished = time.perf_counter()
+        batch_ms = (finished - started) * 1000
+        with self._metrics_lock:
+            m = self._metrics
+            m["batches"] += 1
+            m["orders"] += len(batch)
+            m["failed_orders"] += failed_orders
+            m["failed_batches"] += int(failed_batch)
+            m["last_batch_size"] = len(batch)
+            m["max_batch_size"] = max(m["max_batch_size"], len(batch))
+            m["last_batch_ms"] = round(batch_ms, 2)
+            m["max_batch_ms"] = round(max(m["max_batch_ms"], batch_ms), 2)
+            m["total_batch_ms"] += batch_ms
+            m["total_wait_ms"] += sum((started - job.enqueued_at) * 1000 for job in batch)
+
+    def get_metrics(self) -> dict:
+        """Tamaño y latencia de los lotes desde el arranque del proceso."""
+        with self._metrics_lock:
+            m = dict(self._metrics)
+        batches = m.pop("batches")
+        orders = m["orders"]
+        total_batch_ms = m.pop("total_batch_ms")
+        total_wait_ms = m.pop("total_wait_ms")
+        return {
+            "enabled": ORDER_GROUP_COMMIT,
+            "window_ms": self.window_seconds * 1000,
+            "max_orders": self.max_orders,
+            "queued": self._queue.qsize(),
+            "batches": batches,
+            **m,
+            "avg_batch_size": round(orders / batches, 2) if batches else 0.0,
+            "avg_batch_ms": round(total_batch_ms / batches, 2) if batches else 0.0,
+            "avg_wait_ms": round(total_wait_ms / orders, 2) if orders else 0.0,
+        }
+
+group_commit_writer = GroupCommitWriter(ORDER_GROUP_COMMIT_WINDOW_MS, ORDER_GROUP_COMMIT_MAX_ORDERS)
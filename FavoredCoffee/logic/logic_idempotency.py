@@ -0,0 +1,101 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+from fastapi import HTTPException
+from sqlmodel import Session, delete
+from ..models import IdempotencyKey
+from ..schemas import OrderRequest, OrderResponse
+
+# Tiempo de vida de una clave y tamaño máximo del LRU en memoria
+IDEMPOTENCY_TTL_HOURS = int(os.environ.get("IDEMPOTENCY_TTL_HOURS", 24))
+IDEMPOTENCY_CACHE_SIZE = int(os.environ.get("IDEMPOTENCY_CACHE_SIZE", 2048))
+IDEMPOTENCY_CLEANUP_INTERVAL_SECONDS = int(os.environ.get("IDEMPOTENCY_CLEANUP_INTERVAL_SECONDS", 3600))
+
+# key -> (user_id, request_hash, OrderResponse, expires_at)
+_cache: "OrderedDict[str, tuple]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+def request_hash(order_request: OrderRequest) -> str:
+    """Huella del cuerpo de la orden: una clave solo puede repetir la misma orden."""
+    return hashlib.sha256(order_request.model_dump_json().encode()).hexdigest()
+
+def _check_key(key_user_id: int, key_hash: str, user_id: int, order_hash: str):
+    if key_user_id != user_id:
+        raise HTTPException(status_code=422, detail="La Idempotency-Key ya fue usada por otro usuario")
+    if key_hash != order_hash:
+        raise HTTPException(status_code=422, detail="La Idempotency-Key ya fue usada con otra orden")
+
+def _remember(key: str, user_id: int, order_hash: str, response: OrderResponse, expires_at: datetime):
+    with _cache_lock:
+        _cache[key] = (user_id, order_hash, response, expires_at)
+        _cache.move_to_end(key)
+        while len(_cache) > IDEMPOTENCY_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+def get_stored_response(db: Session, key: str, user_id: int, order_hash: str) -> Optional[OrderResponse]:
+    """
+    Devuelve la respuesta guardada para la clave, o None si no existe / expiró.
+    Primero consulta el LRU en memoria y luego la tabla. Si la clave se usó
+    con otro usuario u otro cuerpo de orden, responde 422.
+    """
+    now = datetime.utcnow()
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached:
+            _cache.move_to_end(key)
+    if cached:
+        cached_user_id, cached_hash, response, expires_at = cached
+        if expires_at > now:
+            _check_key(cached_user_id, cached_hash, user_id, order_hash)
+            return response
+        with _cache_lock:
+            _cache.pop(key, None)
+
+    record = db.get(IdempotencyKey, key)
+    if not record or record.expires_at <= now:
+        return None
+    _check_key(record.user_id, record.request_hash, user_id, order_hash)
+    response = OrderResponse.model_validate_json(record.response_json)
+    _remember(key, record.user_id, record.request_hash, response, record.expires_at)
+    return response
+
+def save_response(db: Session, key: str, user_id: int, order_hash: str, response: OrderResponse) -> datetime:
+    """
+    Agrega la clave a la transacción abierta (sin commit), para que la orden
+    y su clave se guarden juntas. Devuelve la fecha de expiración, que se
+    pasa a remember_response tras el commit.
+    """
+    now = datetime.utcnow()
+    expires_at = now + timedelta(hours=IDEMPOTENCY_TTL_HOURS)
+    # Una clave expirada que aún no limpió el job se reemplaza
+    existing = db.get(IdempotencyKey, key)
+    if existing and existing.expires_at <= now:
+        db.delete(existing)
+        db.flush()
+    db.add(IdempotencyKey(
+        key=key,
+        user_id=user_id,
+        response_json=response.model_dump_json(),
+        request_hash=order_hash,
+        created_at=now,
+        expires_at=expires_at
+    ))
+    return expires_at
+
+def remember_response(key: str, user_id: int, order_hash: str, response: OrderResponse, expires_at: datetime):
+    """Guarda la respuesta en el LRU una vez confirmada la transacción."""
+    _remember(key, user_id, order_hash, response, expires_at)
+
+def purge_expired_keys(db: Session) -> int:
+    """Elimina las claves expiradas de la tabla y del LRU. Devuelve cuántas borró."""
+    now = datetime.utcnow()
+    result = db.exec(delete(IdempotencyKey).where(IdempotencyKey.expires_at <= now))
+    db.commit()
+
+    with _cache_lock:
+        for key in [k for k, (_, _, _, expires_at) in _cache.items() if expires_at <= now]:
+            del _cache[key]
+    return result.rowcount
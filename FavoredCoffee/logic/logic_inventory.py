@@ -1,9 +1,15 @@
 from fastapi import HTTPException
+import os
 import pandas as pd
+from typing import List
 from sqlmodel import Session, select
+from sqlalchemy.dialects import postgresql, sqlite
 from ..models import Product
 from io import BytesIO
 
+# Filas por lote: una consulta IN y un executemany de upsert por lote
+INVENTORY_UPSERT_BATCH_SIZE = int(os.environ.get("INVENTORY_UPSERT_BATCH_SIZE", 1000))
+
 def process_inventory_file(db: Session, file_content: bytes, file_type: str):
     """
     Procesa un archivo de inventario.
@@ -32,49 +38,27 @@ def process_inventory_file(db: Session, file_content: bytes, file_type: str):
         # Error leyendo el archivo
         raise HTTPException(status_code=400, detail=f"Error leyendo el archivo: {str(e)}")
 
+    # Validar todo el archivo antes de aplicar cambios (vectorizado, sin iterrows)
+    try:
+        rows = _validate_rows(df)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Transacción fallida (revertida): {str(e)}")
+
     # Inicio de la lógica transaccional
     try:
         creados = 0
         actualizados = 0
 
-        # Validar todo el archivo antes de aplicar cambios
-        for index, row in df.iterrows():
-            if pd.isna(row["sku"]) or pd.isna(row["name"]) or pd.isna(row["category"]):
-                raise ValueError(f"Fila {index+2}: 'sku', 'name' y 'category' no pueden estar vacíos")
-            if not isinstance(row["price"], (int, float)) or row["price"] <= 0:
-                raise ValueError(f"Fila {index+2}: 'price' debe ser un número positivo")
-            if not isinstance(row["stock_a_sumar"], (int, float)):  # float por si pandas lo lee así
-                raise ValueError(f"Fila {index+2}: 'stock_a_sumar' debe ser un número")
-
-        # Si todas las validaciones pasan, aplicamos los cambios
-        for _, row in df.iterrows():
-            product_sku = str(row["sku"])
-
-            product = db.exec(
-                select(Product).where(Product.sku == product_sku)
-            ).first()
-
-            stock_a_sumar = int(row["stock_a_sumar"])
-
-            if product:
-                # Actualizar (Regla 1)
-                product.name = row["name"]
-                product.category = row["category"]
-                product.price = float(row["price"])
-                product.stock += stock_a_sumar  # (Regla 2: permite negativos)
-                actualizados += 1
-            else:
-                # Crear nuevo
-                product = Product(
-                    sku=product_sku,
-                    name=row["name"],
-                    category=row["category"],
-                    price=float(row["price"]),
-                    stock=stock_a_sumar,
-                )
-                creados += 1
-
-            db.add(product)
+        # Por lotes: una consulta IN para saber qué SKUs existen y un
+        # INSERT ... ON CONFLICT(sku) DO UPDATE (executemany) para aplicarlos
+        for start in range(0, len(rows), INVENTORY_UPSERT_BATCH_SIZE):
+            batch = rows[start:start + INVENTORY_UPSERT_BATCH_SIZE]
+            existing = set(db.exec(
+                select(Product.sku).where(Product.sku.in_([row["sku"] for row in batch]))
+            ).all())
+            actualizados += len(existing)
+            creados += len(batch) - len(existing)
+            _upsert_products(db, batch)
 
         # Si todo fue bien, guardar cambios
         db.commit()
@@ -88,3 +72,63 @@ def process_inventory_file(db: Session, file_content: bytes, file_type: str):
         # Regla 3 (Atomicidad): Si algo falla, revertir todo
         db.rollback()
         raise HTTPException(status_code=400, detail=f"Transacción fallida (revertida): {str(e)}")
+
+def _validate_rows(df: pd.DataFrame) -> List[dict]:
+    """
+    Valida el archivo con operaciones de columna y devuelve una fila por SKU.
+    Un SKU repetido suma su stock; nombre, categoría y precio quedan los de
+    su última fila (igual que aplicar las filas una a una).
+    """
+    def first_bad_row(mask: pd.Series) -> int:
+        return int(mask.to_numpy().nonzero()[0][0]) + 2 # +2: encabezado y base 1
+
+    def numeric(column: pd.Series) -> pd.Series:
+        # Solo celdas que ya son números: un texto como "1.200" se rechaza
+        # (NaN) en vez de convertirse, igual que la validación fila por fila
+        if column.dtype == object:
+            column = column.where(column.map(pd.api.types.is_number))
+        return pd.to_numeric(column, errors="coerce")
+
+    missing = df[["sku", "name", "category"]].isna().any(axis=1)
+    if missing.any():
+        raise ValueError(f"Fila {first_bad_row(missing)}: 'sku', 'name' y 'category' no pueden estar vacíos")
+
+    price = numeric(df["price"])
+    bad_price = price.isna() | (price <= 0)
+    if bad_price.any():
+        raise ValueError(f"Fila {first_bad_row(bad_price)}: 'price' debe ser un número positivo")
+
+    stock = numeric(df["stock_a_sumar"])
+    if stock.isna().any():
+        raise ValueError(f"Fila {first_bad_row(stock.isna())}: 'stock_a_sumar' debe ser un número")
+
+    products = pd.DataFrame({
+        "sku": df["sku"].astype(str),
+        "name": df["name"].astype(str),
+        "category": df["category"].astype(str),
+        "price": price.astype(float),
+        "stock": stock.astype(int),
+    })
+    products = products.groupby("sku", sort=False).agg(
+        name=("name", "last"), category=("category", "last"), price=("price", "last"), stock=("stock", "sum")
+    ).reset_index()
+    products["stock"] = products["stock"].astype(int)
+    return products.to_dict("records")
+
+def _upsert_products(db: Session, rows: List[dict]):
+    """
+    INSERT ... ON CONFLICT(sku) DO UPDATE: actualiza nombre, categoría y precio
+    (Regla 1) y suma el stock (Regla 2: permite negativos).
+    """
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    statement = dialect.insert(Product)
+    statement = statement.on_conflict_do_update(
+        index_elements=["sku"],
+        set_={
+            "name": statement.excluded.name,
+            "category": statement.excluded.category,
+            "price": statement.excluded.price,
+            "stock": Product.stock + statement.excluded.stock,
+        }
+    )
+    db.exec(statement, params=rows)
@@ -1,27 +1,74 @@
-import pytz
-from datetime import datetime
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
 from sqlmodel import Session, select
+from sqlalchemy import update, insert
+from sqlalchemy.exc import IntegrityError
 from ..models import Product, Order, OrderItem, User, BusinessSettings
-from ..schemas import OrderRequest
-from .logic_settings import get_settings
+from ..schemas import OrderRequest, OrderResponse, OrderBatchResult
+from .logic_settings import get_settings, TIMEZONE
+from . import logic_idempotency, logic_stock, logic_rollups, logic_report_cache, logic_events
 from fastapi import HTTPException
 
-TIMEZONE = pytz.timezone("America/Bogota")
+MAX_BATCH_ORDERS = 200
+# Ventas encoladas sin conexión: se registran con su hora real (sold_at) solo
+# dentro de esta ventana; más viejas quedan para revisión de un admin
+ORDER_MAX_BACKDATE_HOURS = int(os.environ.get("ORDER_MAX_BACKDATE_HOURS", 72))
+ORDER_MAX_CLOCK_SKEW_SECONDS = int(os.environ.get("ORDER_MAX_CLOCK_SKEW_SECONDS", 300))
 
-def create_new_order(db: Session, order_request: OrderRequest, user: User) -> Order:
-    
-    # 1. Obtener configuración de impuestos
-    settings = get_settings(db)
-    TAX_RATE = settings.tax_rate
+def _load_products(db: Session, product_ids: List[int], lock: bool = False) -> Dict[int, Product]:
+    """Carga (y opcionalmente bloquea) todos los productos pedidos en una sola consulta."""
+    statement = select(Product).where(Product.id.in_(set(product_ids)))
+    if lock:
+        statement = statement.with_for_update()
+    return {p.id: p for p in db.exec(statement).all()}
 
-    product_ids = [item.product_id for item in order_request.items]
-    if not product_ids:
-        raise HTTPException(status_code=400, detail="La orden no tiene productos")
+def _decrement_stock(db: Session, product_id: int, quantity: int) -> bool:
+    """UPDATE product SET stock = stock - :q WHERE id = :id AND stock >= :q"""
+    result = db.exec(
+        update(Product)
+        .where(Product.id == product_id, Product.stock >= quantity)
+        .values(stock=Product.stock - quantity)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
 
-    # 2. Validar stock (bloqueando filas para evitar race conditions)
-    statement = select(Product).where(Product.id.in_(product_ids)).with_for_update()
-    products_db = db.exec(statement).all()
-    products_map = {p.id: p for p in products_db}
+def _resolve_created_at(order_request: OrderRequest) -> datetime:
+    """created_at de la orden (UTC sin zona): la hora de venta declarada, o ahora."""
+    now = datetime.utcnow()
+    sold_at = order_request.sold_at
+    if sold_at is None:
+        return now
+    if sold_at.tzinfo is not None:
+        sold_at = sold_at.astimezone(timezone.utc).replace(tzinfo=None)
+    if sold_at > now + timedelta(seconds=ORDER_MAX_CLOCK_SKEW_SECONDS):
+        raise HTTPException(status_code=422, detail="La hora de venta está en el futuro")
+    if sold_at < now - timedelta(hours=ORDER_MAX_BACKDATE_HOURS):
+        raise HTTPException(
+            status_code=422, detail=f"La hora de venta tiene más de {ORDER_MAX_BACKDATE_HOURS} horas"
+        )
+    return min(sold_at, now) # Un reloj levemente adelantado no deja órdenes en el futuro
+
+def after_orders_committed(orders: List[OrderResponse]):
+    """Efectos posteriores al commit: invalida reportes abiertos y publica el delta."""
+    logic_report_cache.invalidate_open_ranges()
+    logic_events.publish_orders_committed(orders)
+
+def _apply_order(
+    db: Session,
+    order_request: OrderRequest,
+    user: User,
+    tax_rate: float,
+    products_map: Dict[int, Product]
+) -> OrderResponse:
+    """
+    Escribe una orden dentro de la transacción abierta, sin hacer commit.
+    En lotes, llamarla con _apply_order_isolated para que un rechazo no
+    deje escrituras a medias.
+    """
+    if not order_request.items:
+        raise HTTPException(status_code=400, detail="La orden no tiene productos")
+    created_at = _resolve_created_at(order_request)
 
     subtotal_calc = 0.0
     items_to_create = []
@@ -42,43 +89,180 @@ def create_new_order(db: Session, order_request: OrderRequest, user: User) -> Or
             (product, item.quantity, price) # (Producto, Cantidad, PrecioEnEseMomento)
         )
 
+    sold_items = [(product, quantity) for (product, quantity, _) in items_to_create]
+
+    # 1. Descontar stock
+    if not logic_stock.STOCK_LEDGER:
+        # De forma atómica (el UPDATE condicional re-valida el stock)
+        # Con ledger se descuenta en record_sale, que también re-valida
+        for (product, quantity) in sold_items:
+            if not _decrement_stock(db, product.id, quantity):
+                raise HTTPException(status_code=400, detail=f"Stock insuficiente para '{product.name}'")
+
+    # 2. Calcular impuestos
+    tax_amount_calc = round(subtotal_calc * (tax_rate / 100), 2)
+    total_amount_calc = round(subtotal_calc + tax_amount_calc, 2)
+
+    # 3. Crear la Orden (flush para obtener el id sin hacer commit)
+    new_order = Order(
+        user_id=user.id,
+        created_at=created_at,
+        payment_method=order_request.payment_method,
+        subtotal=subtotal_calc,
+        tax_amount=tax_amount_calc,
+        total_amount=total_amount_calc
+    )
+    db.add(new_order)
+    db.flush()
+
+    # 4. Insertar todos los OrderItems en un solo executemany
+    db.exec(
+        insert(OrderItem),
+        params=[
+            {
+                "order_id": new_order.id,
+                "product_id": product.id,
+                "quantity": quantity,
+                "price_at_purchase": price_at_purchase
+            } for (product, quantity, price_at_purchase) in items_to_create
+        ]
+    )
+    if logic_stock.STOCK_LEDGER:
+        logic_stock.record_sale(db, new_order.id, sold_items)
+
+    # 5. Rollups: la orden queda encolada en la misma transacción (compact_rollups la suma)
+    logic_rollups.record_order(db, new_order.id)
+    if logic_rollups.business_date(created_at) < logic_rollups.today():
+        # Venta de un día anterior: los reportes de rangos cerrados ya no valen
+        logic_report_cache.bump_cache_version(db)
+
+    # La respuesta se arma con los datos en memoria: evita los db.refresh()
+    return OrderResponse(
+        id=new_order.id,
+        created_at=new_order.created_at,
+        status=new_order.status,
+        payment_method=new_order.payment_method,
+        subtotal=new_order.subtotal,
+        tax_amount=new_order.tax_amount,
+        total_amount=new_order.total_amount,
+        user_id=user.id,
+        user_full_name=user.full_name or "N/A",
+        items=[
+            {
+                "product_id": product.id,
+                "quantity": quantity,
+                "price_at_purchase": price_at_purchase,
+                "product_name": product.name
+            } for (product, quantity, price_at_purchase) in items_to_create
+        ]
+    )
+
+def _apply_order_isolated(
+    db: Session,
+    order_request: OrderRequest,
+    user: User,
+    tax_rate: float,
+    products_map: Dict[int, Product]
+) -> OrderResponse:
+    """
+    _apply_order dentro de un SAVEPOINT: si la orden se rechaza, se deshace
+    todo lo que alcanzó a escribir (stock, items, ledger, rollups) y el
+    resto del lote sigue intacto.
+    """
+    with db.begin_nested():
+        return _apply_order(db, order_request, user, tax_rate, products_map)
+
+def create_new_order(
+    db: Session,
+    order_request: OrderRequest,
+    user: User,
+    idempotency_key: Optional[str] = None
+) -> OrderResponse:
+    """
+    Crea una orden en una única transacción (cabecera, items y stock).
+    El stock se descuenta con un UPDATE condicional, por lo que no hace
+    falta bloquear las filas de Product mientras se valida la orden.
+    Si llega una Idempotency-Key ya usada, devuelve la respuesta guardada
+    sin tocar los productos (reintentos seguros desde el POS).
+    """
+
+    # 0. Reintento: devolver la orden ya creada (si es la misma orden)
+    if idempotency_key:
+        order_hash = logic_idempotency.request_hash(order_request)
+        stored = logic_idempotency.get_stored_response(db, idempotency_key, user.id, order_hash)
+        if stored:
+            return stored
+    
+    # 1. Obtener configuración de impuestos
+    settings = get_settings(db)
+
+    product_ids = [item.product_id for item in order_request.items]
+    if not product_ids:
+        raise HTTPException(status_code=400, detail="La orden no tiene productos")
+
+    # 2. Cargar productos (precio y nombre). El stock se re-valida en el UPDATE.
+    products_map = _load_products(db, product_ids)
+
     try:
-        # 3. Calcular impuestos
-        tax_amount_calc = round(subtotal_calc * (TAX_RATE / 100), 2)
-        total_amount_calc = round(subtotal_calc + tax_amount_calc, 2)
-
-        # 4. Crear la Orden
-        new_order = Order(
-            user_id=user.id,
-            payment_method=order_request.payment_method,
-            subtotal=subtotal_calc,
-            tax_amount=tax_amount_calc,
-            total_amount=total_amount_calc
-        )
-        db.add(new_order)
-        db.commit()
-        db.refresh(new_order)
-
-        # 5. Descontar stock y crear OrderItems
-        for (product, quantity, price_at_purchase) in items_to_create:
-            # Descontar stock
-            product.stock -= quantity
-            db.add(product)
-            
-            # Crear item
-            order_item = OrderItem(
-                order_id=new_order.id,
-                product_id=product.id,
-                quantity=quantity,
-                price_at_purchase=price_at_purchase
-            )
-            db.add(order_item)
-        
+        response = _apply_order(db, order_request, user, settings.tax_rate, products_map)
+        if idempotency_key:
+            key_expires_at = logic_idempotency.save_response(db, idempotency_key, user.id, order_hash, response)
+        # 3. Un único commit para cabecera, items, stock y clave
         db.commit()
-        db.refresh(new_order)
-        return new_order
     
+    except HTTPException:
+        db.rollback()
+        raise
+    except IntegrityError as e:
+        db.rollback()
+        # Otra petición con la misma clave ganó la carrera: devolvemos su orden
+        if idempotency_key:
+            stored = logic_idempotency.get_stored_response(db, idempotency_key, user.id, order_hash)
+            if stored:
+                return stored
+        raise HTTPException(status_code=500, detail=f"Error interno al crear la orden: {str(e)}")
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Error interno al crear la orden: {str(e)}")
 
+    after_orders_committed([response])
+    if idempotency_key:
+        logic_idempotency.remember_response(idempotency_key, user.id, order_hash, response, key_expires_at)
+    return response
+
+def create_orders_batch(db: Session, order_requests: List[OrderRequest], user: User) -> List[OrderBatchResult]:
+    """
+    Procesa un lote de órdenes (p. ej. ventas encoladas por una terminal
+    que estuvo sin conexión) en una sola transacción.
+    La configuración se lee una vez y todos los productos se bloquean y
+    cargan con una única consulta. Cada orden tiene su propio resultado:
+    una orden rechazada no impide guardar las demás.
+    """
+    if not order_requests:
+        raise HTTPException(status_code=400, detail="El lote no tiene órdenes")
+    if len(order_requests) > MAX_BATCH_ORDERS:
+        raise HTTPException(status_code=400, detail=f"El lote supera el máximo de {MAX_BATCH_ORDERS} órdenes")
+
+    settings = get_settings(db)
+    product_ids = [item.product_id for request in order_requests for item in request.items]
+
+    try:
+        products_map = _load_products(db, product_ids, lock=True) if product_ids else {}
+
+        results = []
+        for index, order_request in enumerate(order_requests):
+            try:
+                order = _apply_order_isolated(db, order_request, user, settings.tax_rate, products_map)
+                results.append(OrderBatchResult(index=index, success=True, order=order))
+            except HTTPException as e:
+                results.append(OrderBatchResult(index=index, success=False, detail=str(e.detail)))
+
+        db.commit()
+
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Error interno al procesar el lote: {str(e)}")
+
+    after_orders_committed([result.order for result in results if result.success])
+    return results
+
@@ -0,0 +1,31 @@
+from typing import List
+from fastapi import HTTPException
+from sqlmodel import Session, select
+from ..models import Product
+from ..schemas import ProductCreate, Product as ProductSchema
+from . import logic_stock
+
+def get_products(db: Session) -> List[Product]:
+    """Obtiene la lista completa de productos."""
+    products = db.exec(select(Product)).all()
+    if not logic_stock.STOCK_LEDGER:
+        return products
+
+    # Con el ledger, el stock visible incluye los movimientos sin consolidar
+    pending = logic_stock.get_pending_deltas(db)
+    return [
+        ProductSchema.model_validate(p).model_copy(update={"stock": p.stock + pending.get(p.id, 0)})
+        for p in products
+    ]
+
+def create_product(db: Session, product_data: ProductCreate) -> Product:
+    """Crea un producto nuevo validando que el SKU no exista."""
+    db_product = db.exec(select(Product).where(Product.sku == product_data.sku)).first()
+    if db_product:
+        raise HTTPException(status_code=400, detail="SKU ya registrado")
+    
+    new_product = Product.from_orm(product_data)
+    db.add(new_product)
+    db.commit()
+    db.refresh(new_product)
+    return new_product
@@ -0,0 +1,124 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Optional, Tuple
+from sqlmodel import Session, select
+from sqlalchemy import update
+from ..models import BusinessSettings
+
+# Reportes de rangos cerrados: sin expiración (solo expulsión LRU).
+# Rangos con días abiertos (hoy): TTL corto y se invalidan al crear órdenes.
+REPORT_CACHE_SIZE = int(os.environ.get("REPORT_CACHE_SIZE", 256))
+REPORT_CACHE_OPEN_TTL_SECONDS = float(os.environ.get("REPORT_CACHE_OPEN_TTL_SECONDS", 30))
+# El caché es por proceso: cada worker compara BusinessSettings.report_cache_version
+# con su copia cada tantos segundos y se vacía si otro proceso lo invalidó
+REPORT_CACHE_VERSION_CHECK_SECONDS = float(os.environ.get("REPORT_CACHE_VERSION_CHECK_SECONDS", 5))
+
+ReportKey = Tuple[date, date, str] # (start_date, end_date, granularity)
+
+# key -> (expires_at monotonic o None, reporte)
+_cache: "OrderedDict[ReportKey, tuple]" = OrderedDict()
+_cache_lock = threading.Lock()
+_metrics = {"hits": 0, "misses": 0, "invalidations": 0, "purges": 0}
+_cache_version: Optional[int] = None
+_last_version_check = 0.0
+
+def sync_cache_version(db: Session) -> Optional[int]:
+    """
+    Vacía el caché de este worker si otro proceso lo invalidó (rebuild-rollups,
+    DELETE /reports/cache en otro worker). Solo consulta la columna, y como
+    mucho cada REPORT_CACHE_VERSION_CHECK_SECONDS. Devuelve la versión vigente.
+    """
+    global _cache_version, _last_version_check
+    with _cache_lock:
+        if time.monotonic() - _last_version_check < REPORT_CACHE_VERSION_CHECK_SECONDS:
+            return _cache_version
+        _last_version_check = time.monotonic()
+    version = db.exec(
+        select(BusinessSettings.report_cache_version).where(BusinessSettings.id == 1)
+    ).first() or 0
+    with _cache_lock:
+        if _cache_version is not None and version != _cache_version:
+            _cache.clear()
+            _metrics["purges"] += 1
+        _cache_version = version
+        return _cache_version
+
+def bump_cache_version(db: Session):
+    """Invalida el caché de reportes de todos los workers. Sin commit: va en la transacción del llamador."""
+    db.exec(
+        update(BusinessSettings)
+        .where(BusinessSettings.id == 1)
+        .values(report_cache_version=BusinessSettings.report_cache_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+def get_cached_report(key: ReportKey) -> Optional[dict]:
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached:
+            expires_at, report = cached
+            if expires_at is None or expires_at > time.monotonic():
+                _cache.move_to_end(key)
+                _metrics["hits"] += 1
+                return report
+            _cache.pop(key, None)
+        _metrics["misses"] += 1
+    return None
+
+def store_report(key: ReportKey, report: dict, closed: bool, version: Optional[int]):
+    """
+    `closed`: el rango termina antes del primer día abierto (logic_rollups.first_open_day),
+    así que no cambia (salvo ediciones retroactivas) y se guarda sin expiración.
+    `version`: la de sync_cache_version antes de calcular; si cambió mientras
+    tanto, el reporte pudo leer rollups viejos y no se guarda.
+    """
+    expires_at = None if closed else time.monotonic() + REPORT_CACHE_OPEN_TTL_SECONDS
+    with _cache_lock:
+        if version != _cache_version:
+            return
+        _cache[key] = (expires_at, report)
+        _cache.move_to_end(key)
+        while len(_cache) > REPORT_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+def invalidate_open_ranges():
+    """Descarta los reportes que incluyen hoy. Se llama tras el commit de una orden."""
+    with _cache_lock:
+        open_keys = [key for key, (expires_at, _) in _cache.items() if expires_at is not None]
+        for key in open_keys:
+            del _cache[key]
+        if open_keys:
+            _metrics["invalidations"] += len(open_keys)
+
+def purge_report_cache() -> int:
+    """Vacía el caché de este worker. Para todos los workers: bump_cache_version."""
+    with _cache_lock:
+        purged = len(_cache)
+        _cache.clear()
+        _metrics["purges"] += 1
+    return purged
+
+def purge_all_report_caches(db: Session) -> int:
+    """Vacía el caché de este worker y sube la versión para que los demás también lo vacíen."""
+    bump_cache_version(db)
+    db.commit()
+    return purge_report_cache()
+
+def get_report_cache_metrics() -> dict:
+    with _cache_lock:
+        metrics = dict(_metrics)
+        entries = len(_cache)
+        open_entries = sum(1 for expires_at, _ in _cache.values() if expires_at is not None)
+    lookups = metrics["hits"] + metrics["misses"]
+    return {
+        "entries": entries,
+        "closed_entries": entries - open_entries,
+        "open_entries": open_entries,
+        "max_entries": REPORT_CACHE_SIZE,
+        "open_ttl_seconds": REPORT_CACHE_OPEN_TTL_SECONDS,
+        **metrics,
+        "hit_rate": round(metrics["hits"] / lookups, 4) if lookups else 0.0
+    }
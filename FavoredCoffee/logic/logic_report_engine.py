@@ -0,0 +1,139 @@
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Optional
+from sqlmodel import Session, select, func
+from sqlalchemy import Float, Integer, String, cast, literal, null, union_all
+
+from ..models import Order, OrderItem, Product, DailySalesRollup, DailyProductRollup, DailyCategoryRollup
+from .logic_rollups import local_period_expr, rollup_period_expr, split_range, start_of_day_utc
+
+def empty_aggregates() -> dict:
+    return {"total_sales": 0.0, "order_count": 0, "products": {}, "categories": {}, "periods": {}}
+
+def scan_sales(db: Session, start_utc: datetime, end_utc: datetime, granularity: str) -> dict:
+    """
+    Recorre una sola vez las órdenes pagadas del rango [start_utc, end_utc) y
+    devuelve KPIs, unidades por producto y categoría y ventas por periodo.
+
+    Es una única sentencia: un CTE materializado filtra el rango una vez y
+    cuatro agregados sobre él se devuelven juntos con UNION ALL.
+    """
+    scoped = (
+        select(
+            Order.id.label("order_id"),
+            Order.total_amount.label("total_amount"),
+            local_period_expr(db, Order.created_at, granularity).label("period")
+        )
+        .where(
+            Order.status == "Pagada", # (Regla 4)
+            Order.created_at >= start_utc,
+            Order.created_at < end_utc
+        )
+        .cte("scoped_orders")
+        .prefix_with("MATERIALIZED")
+    )
+    lines = (
+        select(Product.name.label("name"), Product.category.label("category"), OrderItem.quantity.label("quantity"))
+        .join(scoped, OrderItem.order_id == scoped.c.order_id)
+        .join(Product, OrderItem.product_id == Product.id)
+        .cte("scoped_lines")
+        .prefix_with("MATERIALIZED")
+    )
+
+    # Columnas comunes: (tipo, clave, valor, conteo)
+    kpis = select(
+        literal("kpi").label("kind"), cast(null(), String).label("key"),
+        cast(func.sum(scoped.c.total_amount), Float).label("value"), cast(func.count(), Integer).label("count")
+    )
+    products = select(
+        literal("product"), cast(lines.c.name, String),
+        cast(func.sum(lines.c.quantity), Float), cast(null(), Integer)
+    ).group_by(lines.c.name)
+    categories = select(
+        literal("category"), cast(lines.c.category, String),
+        cast(func.sum(lines.c.quantity), Float), cast(null(), Integer)
+    ).group_by(lines.c.category)
+    periods = select(
+        literal("period"), cast(scoped.c.period, String),
+        cast(func.sum(scoped.c.total_amount), Float), cast(null(), Integer)
+    ).group_by(scoped.c.period)
+
+    return _collect(db, union_all(kpis, products, categories, periods))
+
+def scan_rollups(db: Session, start_date: date, end_date: date, granularity: str) -> dict:
+    """
+    Mismo resultado que scan_sales, leído de los rollups diarios/horarios para
+    los días cerrados [start_date, end_date]. También es una sola sentencia.
+    """
+    kpis = select(
+        literal("kpi").label("kind"), cast(null(), String).label("key"),
+        cast(func.sum(DailySalesRollup.total_sales), Float).label("value"),
+        cast(func.sum(DailySalesRollup.order_count), Integer).label("count")
+    ).where(DailySalesRollup.business_date >= start_date, DailySalesRollup.business_date <= end_date)
+    products = select(
+        literal("product"), cast(Product.name, String),
+        cast(func.sum(DailyProductRollup.units), Float), cast(null(), Integer)
+    ).join(Product, DailyProductRollup.product_id == Product.id).where(
+        DailyProductRollup.business_date >= start_date, DailyProductRollup.business_date <= end_date
+    ).group_by(Product.name)
+    categories = select(
+        literal("category"), cast(DailyCategoryRollup.category, String),
+        cast(func.sum(DailyCategoryRollup.units), Float), cast(null(), Integer)
+    ).where(
+        DailyCategoryRollup.business_date >= start_date, DailyCategoryRollup.business_date <= end_date
+    ).group_by(DailyCategoryRollup.category)
+    label, rollup = rollup_period_expr(db, granularity)
+    periods = select(
+        literal("period"), cast(label, String),
+        cast(func.sum(rollup.total_sales), Float), cast(null(), Integer)
+    ).where(rollup.business_date >= start_date, rollup.business_date <= end_date).group_by(label)
+
+    return _collect(db, union_all(kpis, products, categories, periods))
+
+def sales_aggregates(
+    db: Session,
+    start_date: date,
+    end_date: date,
+    granularity: str,
+    on_progress: Optional[Callable[[int], None]] = None
+) -> dict:
+    """
+    Agregados del rango [start_date, end_date] (días locales): rollups para los
+    días cerrados y un único recorrido de las órdenes para los días abiertos
+    (hoy y los que aún tienen órdenes sin consolidar).
+    """
+    on_progress = on_progress or (lambda _: None)
+    last_closed, first_open = split_range(db, start_date, end_date)
+
+    aggregates = empty_aggregates()
+    if last_closed:
+        merge_aggregates(aggregates, scan_rollups(db, start_date, last_closed, granularity))
+    on_progress(50)
+    if first_open:
+        open_range = (start_of_day_utc(first_open), start_of_day_utc(end_date + timedelta(days=1)))
+        merge_aggregates(aggregates, scan_sales(db, *open_range, granularity))
+    on_progress(90)
+    return aggregates
+
+def _collect(db: Session, statement) -> dict:
+    aggregates = empty_aggregates()
+    for kind, key, value, count in db.exec(statement).all():
+        if kind == "kpi":
+            aggregates["total_sales"] = value or 0.0
+            aggregates["order_count"] = count or 0
+        elif kind == "product":
+            aggregates["products"][key] = int(value)
+        elif kind == "category":
+            aggregates["categories"][key] = int(value)
+        else:
+            aggregates["periods"][key] = value
+    return aggregates
+
+def merge_aggregates(target: dict, other: dict) -> dict:
+    """Suma `other` sobre `target` (p. ej. días cerrados + el día de hoy)."""
+    target["total_sales"] += other["total_sales"]
+    target["order_count"] += other["order_count"]
+    for section in ("products", "categories", "periods"):
+        merged: Dict = target[section]
+        for key, value in other[section].items():
+            merged[key] = merged.get(key, 0) + value
+    return target
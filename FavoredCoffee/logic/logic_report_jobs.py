@@ -0,0 +1,153 @@
+import json
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from fastapi import HTTPException
+from sqlalchemy import update
+from sqlmodel import Session, select
+
+from ..database import engine
+from ..models import ReportJob, User
+from ..schemas import ReportJobRequest
+from . import logic_reports
+
+# Pool propio: los reportes largos nunca ocupan un worker web ni el threadpool de FastAPI
+REPORT_JOB_WORKERS = int(os.environ.get("REPORT_JOB_WORKERS", 2))
+REPORT_JOB_RESULTS_DIR = os.environ.get("REPORT_JOB_RESULTS_DIR", "report_jobs")
+REPORT_JOB_RETENTION_HOURS = int(os.environ.get("REPORT_JOB_RETENTION_HOURS", 24))
+REPORT_JOB_CLEANUP_INTERVAL_SECONDS = int(os.environ.get("REPORT_JOB_CLEANUP_INTERVAL_SECONDS", 3600))
+# Un job "En proceso" más viejo que esto quedó huérfano (el proceso que lo corría murió)
+REPORT_JOB_TIMEOUT_MINUTES = int(os.environ.get("REPORT_JOB_TIMEOUT_MINUTES", 30))
+
+_executor = ThreadPoolExecutor(max_workers=REPORT_JOB_WORKERS, thread_name_prefix="report-job")
+
+def enqueue_report_job(db: Session, request: ReportJobRequest, user: User) -> ReportJob:
+    """Registra el job (commit) y lo envía al pool. Responde de inmediato."""
+    # Valida el rango y la granularidad antes de aceptar el trabajo
+    if request.end_date < request.start_date:
+        raise HTTPException(status_code=400, detail="Rango de fechas inválido")
+    logic_reports.resolve_granularity(request.start_date, request.end_date, request.granularity)
+
+    job = ReportJob(
+        id=str(uuid.uuid4()),
+        params_json=request.model_dump_json(),
+        user_id=user.id
+    )
+    db.add(job)
+    db.commit()
+    _executor.submit(_run_job, job.id)
+    return job
+
+def _set_job(db: Session, job_id: str, **values):
+    db.exec(update(ReportJob).where(ReportJob.id == job_id).values(**values))
+    db.commit()
+
+def _run_job(job_id: str):
+    with Session(engine) as db:
+        # Reclamo atómico: si otro worker ya lo tomó, no se ejecuta dos veces
+        claimed = db.exec(
+            update(ReportJob)
+            .where(ReportJob.id == job_id, ReportJob.status == "Pendiente")
+            .values(status="En proceso", started_at=datetime.utcnow(), progress=5)
+        )
+        db.commit()
+        if claimed.rowcount != 1:
+            return
+
+        try:
+            job = db.get(ReportJob, job_id)
+            params = ReportJobRequest.model_validate_json(job.params_json)
+            report = logic_reports.get_sales_report(
+                db, params.start_date, params.end_date, params.granularity,
+                on_progress=lambda percent: _set_job(db, job_id, progress=percent)
+            )
+
+            os.makedirs(REPORT_JOB_RESULTS_DIR, exist_ok=True)
+            path = os.path.join(REPORT_JOB_RESULTS_DIR, f"{job_id}.json")
+            # Escritura atómica: quien consulta nunca lee un archivo a medias
+            with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, default=str)
+            os.replace(f"{path}.tmp", path)
+
+            _set_job(db, job_id, status="Completado", progress=100, result_path=path, finished_at=datetime.utcnow())
+        except Exception as e:
+            db.rollback()
+            detail = e.detail if isinstance(e, HTTPException) else str(e)
+            _set_job(db, job_id, status="Fallido", error=str(detail), finished_at=datetime.utcnow())
+            print(f"ERROR:    El job de reporte {job_id} falló: {detail}")
+
+def get_report_job(db: Session, job_id: str) -> dict:
+    """Estado del job y, si terminó, el reporte leído desde disco."""
+    job = db.get(ReportJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job de reporte no encontrado")
+
+    result = None
+    if job.status == "Completado":
+        try:
+            with open(job.result_path, encoding="utf-8") as f:
+                result = json.load(f)
+        except OSError:
+            raise HTTPException(status_code=410, detail="El resultado del reporte ya no está disponible")
+
+    return {
+        "id": job.id,
+        "status": job.status,
+        "progress": job.progress,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
+        "error": job.error,
+        "result": result
+    }
+
+def fail_stale_jobs(db: Session) -> int:
+    """
+    Marca como fallidos los jobs "En proceso" que pasaron REPORT_JOB_TIMEOUT_MINUTES:
+    su proceso murió (reinicio, OOM) y nadie los va a terminar. No se re-encolan,
+    por si es el propio reporte el que tumba al proceso; el usuario puede pedirlo de nuevo.
+    """
+    now = datetime.utcnow()
+    result = db.exec(
+        update(ReportJob)
+        .where(
+            ReportJob.status == "En proceso",
+            ReportJob.started_at < now - timedelta(minutes=REPORT_JOB_TIMEOUT_MINUTES)
+        )
+        .values(status="Fallido", error="El reporte se interrumpió; vuelva a generarlo", finished_at=now)
+    )
+    db.commit()
+    if result.rowcount:
+        print(f"INFO:     {result.rowcount} jobs de reporte interrumpidos marcados como fallidos.")
+    return result.rowcount
+
+def resume_pending_jobs(db: Session):
+    """
+    Al arrancar, re-encola los jobs que quedaron pendientes (p. ej. tras un
+    reinicio) y da por fallidos los que quedaron colgados "En proceso".
+    """
+    fail_stale_jobs(db)
+    pending = db.exec(select(ReportJob.id).where(ReportJob.status == "Pendiente")).all()
+    for job_id in pending:
+        _executor.submit(_run_job, job_id)
+    if pending:
+        print(f"INFO:     {len(pending)} jobs de reporte re-encolados.")
+
+def purge_old_report_jobs(db: Session):
+    """
+    Borra jobs terminados (y sus archivos) con más de REPORT_JOB_RETENTION_HOURS.
+    De paso falla los colgados: con varios workers, uno puede morir sin que otro reinicie.
+    """
+    fail_stale_jobs(db)
+    cutoff = datetime.utcnow() - timedelta(hours=REPORT_JOB_RETENTION_HOURS)
+    old_jobs = db.exec(
+        select(ReportJob).where(
+            ReportJob.status.in_(["Completado", "Fallido"]),
+            ReportJob.finished_at < cutoff
+        )
+    ).all()
+    for job in old_jobs:
+        if job.result_path and os.path.exists(job.result_path):
+            os.remove(job.result_path)
+        db.delete(job)
+    db.commit()
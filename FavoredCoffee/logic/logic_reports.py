@@ -1,21 +1,39 @@
 from fastapi import HTTPException
+import base64
+import csv
+import io
+import json
 import pytz
-from datetime import datetime, timedelta
-from sqlmodel import Session, select, func
-from sqlalchemy.orm import joinedload
-from sqlalchemy import Date, cast
+from datetime import datetime
+from typing import Callable, Iterator, Optional
+from sqlmodel import Session, select
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy import and_, or_
 
-from ..models import Order, OrderItem, Product
-from ..logic.logic_orders import TIMEZONE
+from ..database import engine
+from ..models import Order, OrderItem, Product, User
+from ..logic.logic_settings import TIMEZONE
+from . import logic_rollups, logic_report_cache, logic_report_engine
 from ..schemas import OrderResponse # Usaremos el schema de respuesta
 
-def get_sales_report(db: Session, start_date: datetime.date, end_date: datetime.date):
-    """
-    Calcula el reporte de ventas para un rango de fechas.
-    Implementa las Reglas de Negocio 3, 4 y 5.
-    """
-    
-    # --- Configuración de Fechas (UTC) ---
+DETAILED_SALES_MAX_LIMIT = 200
+
+# sales_over_time: 'auto' elige el bucket según los días del rango
+AUTO_GRANULARITY = [(2, "hour"), (62, "day"), (366, "week")]
+HOURLY_MAX_DAYS = 31
+
+WEEKDAYS = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado", "Domingo"]
+
+# Exportación: filas traídas por viaje al cursor del servidor
+EXPORT_YIELD_PER = 1000
+EXPORT_COLUMNS = [
+    "order_id", "created_at", "payment_method", "cashier",
+    "sku", "product", "category", "quantity", "unit_price", "line_total",
+    "order_subtotal", "order_tax", "order_total"
+]
+
+def _utc_range(start_date: datetime.date, end_date: datetime.date):
+    """Convierte un rango de días locales (inclusive) a instantes UTC."""
     try:
         start_time_local = TIMEZONE.localize(datetime.combine(start_date, datetime.min.time()))
         end_time_local = TIMEZONE.localize(datetime.combine(end_date, datetime.max.time()))
@@ -24,126 +42,266 @@ def get_sales_report(db: Session, start_date: datetime.date, end_date: datetime.
         end_utc = end_time_local.astimezone(pytz.utc)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Rango de fechas inválido: {e}")
+    return start_utc, end_utc
 
-    # --- 1. Métricas Principales (Regla 4: Solo 'Pagada') ---
-    main_metrics_query = db.exec(
-        select(
-            func.sum(Order.total_amount),
-            func.count(Order.id),
-            func.avg(Order.total_amount)
-        ).where(
-            Order.status == "Pagada",
-            Order.created_at >= start_utc,
-            Order.created_at <= end_utc
-        )
-    ).first()
-    
-    total_revenue = main_metrics_query[0] or 0.0
-    total_orders = main_metrics_query[1] or 0
-    average_ticket = main_metrics_query[2] or 0.0
-
-    # Base query para todos los reportes (Regla 4)
-    base_query = (
-        select(OrderItem, Product, Order)
-        .join(Product, OrderItem.product_id == Product.id)
-        .join(Order, OrderItem.order_id == Order.id)
-        .where(
-            Order.status == "Pagada",
-            Order.created_at >= start_utc,
-            Order.created_at <= end_utc
+def resolve_granularity(start_date: datetime.date, end_date: datetime.date, granularity: str) -> str:
+    """Traduce 'auto' según el largo del rango y valida el máximo para 'hour'."""
+    days = (end_date - start_date).days + 1
+    if granularity == "auto":
+        for max_days, resolved in AUTO_GRANULARITY:
+            if days <= max_days:
+                return resolved
+        return "month"
+    if granularity == "hour" and days > HOURLY_MAX_DAYS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"La granularidad por hora admite como máximo {HOURLY_MAX_DAYS} días"
         )
-    )
-    
-    report_items = db.exec(base_query).all()
+    return granularity
+
+def get_sales_report(
+    db: Session,
+    start_date: datetime.date,
+    end_date: datetime.date,
+    granularity: str = "week",
+    on_progress: Optional[Callable[[int], None]] = None
+):
+    """
+    Reporte de ventas para un rango de fechas, servido desde el caché cuando se puede.
+    Los rangos cerrados se guardan sin expiración; los que incluyen hoy, con TTL.
+    `on_progress(porcentaje)` se llama al terminar cada sección (lo usan los jobs).
+    """
+    _utc_range(start_date, end_date) # Valida el rango
+    granularity = resolve_granularity(start_date, end_date, granularity)
+    key = (start_date, end_date, granularity)
+    cache_version = logic_report_cache.sync_cache_version(db)
+    report = logic_report_cache.get_cached_report(key)
+    if report is None:
+        # Antes de calcular: si el rango ya estaba cerrado, el reporte no cambia
+        closed = end_date < logic_rollups.first_open_day(db)
+        report = _build_sales_report(db, start_date, end_date, granularity, on_progress or (lambda _: None))
+        logic_report_cache.store_report(key, report, closed, cache_version)
+    return report
+
+def _build_sales_report(
+    db: Session,
+    start_date: datetime.date,
+    end_date: datetime.date,
+    granularity: str,
+    on_progress: Callable[[int], None]
+):
+    """
+    Calcula el reporte de ventas para un rango de fechas.
+    Implementa las Reglas de Negocio 3, 4 y 5.
+    """
+
+    # Un solo paso: rollups para los días cerrados y un único recorrido
+    # (CTE) de las órdenes de los días abiertos, con todos los agregados juntos
+    aggregates = logic_report_engine.sales_aggregates(db, start_date, end_date, granularity, on_progress)
+
+    # --- 1. Métricas Principales (Regla 4: Solo 'Pagada') ---
+    total_revenue = aggregates["total_sales"]
+    total_orders = aggregates["order_count"]
+    average_ticket = total_revenue / total_orders if total_orders else 0.0
 
     # --- 2. Top Productos y Categorías (Regla 5: Unidades) ---
-    top_products = {}
-    sales_by_category = {}
-
-    for item, product, order in report_items:
-        # Top Productos
-        top_products[product.name] = top_products.get(product.name, 0) + item.quantity
-        # Top Categorías
-        sales_by_category[product.category] = sales_by_category.get(product.category, 0) + item.quantity
-    
-    # Ordenar y formatear
     top_products_list = [
-        {"name": k, "units": v} for k, v in sorted(top_products.items(), key=lambda i: i[1], reverse=True)
+        {"name": k, "units": v}
+        for k, v in sorted(aggregates["products"].items(), key=lambda i: i[1], reverse=True) if v
     ]
     sales_by_category_list = [
-        {"name": k, "units": v} for k, v in sorted(sales_by_category.items(), key=lambda i: i[1], reverse=True)
+        {"name": k, "units": v}
+        for k, v in sorted(aggregates["categories"].items(), key=lambda i: i[1], reverse=True) if v
     ]
 
-    # --- 3. Evolución de Ventas (Regla 3: Semanal) ---
-    sales_over_time = {}
-    for item, product, order in report_items:
-        # Agrupar por el Lunes de esa semana
-        order_date_local = order.created_at.astimezone(TIMEZONE).date()
-        start_of_week = order_date_local - timedelta(days=order_date_local.weekday())
-        week_key = start_of_week.isoformat()
-        
-        # Usamos un set para contar órdenes únicas por semana
-        if week_key not in sales_over_time:
-            sales_over_time[week_key] = {"total_sales": 0.0, "order_ids": set()}
-        
-        # Evitar doble conteo si una orden tiene múltiples items
-        if order.id not in sales_over_time[week_key]["order_ids"]:
-            sales_over_time[week_key]["total_sales"] += order.total_amount
-            sales_over_time[week_key]["order_ids"].add(order.id)
-
+    # --- 3. Evolución de Ventas (Regla 3: semanal por defecto) ---
     sales_over_time_list = [
-        {"period": k, "total_sales": v["total_sales"]} for k, v in sorted(sales_over_time.items())
+        {"period": period, "total_sales": total}
+        for period, total in sorted(aggregates["periods"].items()) if total
     ]
 
-    # --- 4. Resumen Detallado de Ventas ---
-    # Re-consultar órdenes con carga ansiosa (eager loading)
-    detailed_orders = db.exec(
+    return {
+        "start_date": start_date.isoformat(),
+        "end_date": end_date.isoformat(),
+        "granularity": granularity,
+        "total_revenue": total_revenue,
+        "total_orders": total_orders,
+        "average_ticket": average_ticket,
+        "top_products": top_products_list,
+        "sales_by_category": sales_by_category_list,
+        "sales_over_time": sales_over_time_list
+    }
+
+def _encode_cursor(created_at: datetime, order_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{order_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def _decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created_at, order_id = raw.split("|")
+        return datetime.fromisoformat(created_at), int(order_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor de paginación inválido.")
+
+def get_detailed_sales(
+    db: Session,
+    start_date: datetime.date,
+    end_date: datetime.date,
+    cursor: Optional[str] = None,
+    limit: int = 50
+):
+    """
+    Página de órdenes pagadas del rango, de la más reciente a la más antigua.
+    Paginación por cursor sobre (created_at, id): cada página cuesta lo mismo
+    sin importar cuántas órdenes tenga el rango.
+    """
+    start_utc, end_utc = _utc_range(start_date, end_date)
+    limit = max(1, min(limit, DETAILED_SALES_MAX_LIMIT))
+
+    query = (
         select(Order)
         .options(
             joinedload(Order.user), # Cargar info del usuario
-            joinedload(Order.items).joinedload(OrderItem.product) # Cargar items y sus productos
+            selectinload(Order.items).joinedload(OrderItem.product) # Items en una sola consulta extra
         )
         .where(
             Order.status == "Pagada", # (Regla 4)
             Order.created_at >= start_utc,
             Order.created_at <= end_utc
         )
-        .order_by(Order.created_at.desc())
+    )
+    if cursor:
+        cursor_created_at, cursor_id = _decode_cursor(cursor)
+        query = query.where(
+            or_(
+                Order.created_at < cursor_created_at,
+                and_(Order.created_at == cursor_created_at, Order.id < cursor_id)
+            )
+        )
+
+    # Se pide una fila extra para saber si hay una página siguiente
+    orders = db.exec(
+        query.order_by(Order.created_at.desc(), Order.id.desc()).limit(limit + 1)
     ).all()
+    has_more = len(orders) > limit
+    orders = orders[:limit]
 
-    # Convertir a schemas de respuesta (costoso pero completo)
-    detailed_sales_response = []
-    for order in detailed_orders:
-        detailed_sales_response.append(
-            OrderResponse(
-                id=order.id,
-                created_at=order.created_at,
-                status=order.status,
-                payment_method=order.payment_method,
-                subtotal=order.subtotal,
-                tax_amount=order.tax_amount,
-                total_amount=order.total_amount,
-                user_id=order.user_id,
-                user_full_name=order.user.full_name if order.user else "N/A",
-                items=[
-                    {
-                        "product_id": item.product_id,
-                        "quantity": item.quantity,
-                        "price_at_purchase": item.price_at_purchase,
-                        "product_name": item.product.name if item.product else "N/A"
-                    } for item in order.items
-                ]
-            )
+    items = [
+        OrderResponse(
+            id=order.id,
+            created_at=order.created_at,
+            status=order.status,
+            payment_method=order.payment_method,
+            subtotal=order.subtotal,
+            tax_amount=order.tax_amount,
+            total_amount=order.total_amount,
+            user_id=order.user_id,
+            user_full_name=order.user.full_name if order.user else "N/A",
+            items=[
+                {
+                    "product_id": item.product_id,
+                    "quantity": item.quantity,
+                    "price_at_purchase": item.price_at_purchase,
+                    "product_name": item.product.name if item.product else "N/A"
+                } for item in order.items
+            ]
         )
+        for order in orders
+    ]
+
+    next_cursor = None
+    if has_more and orders:
+        next_cursor = _encode_cursor(orders[-1].created_at, orders[-1].id)
+
+    return {"items": items, "next_cursor": next_cursor}
+
+def _iter_sales_rows(db: Session, start_date: datetime.date, end_date: datetime.date) -> Iterator[dict]:
+    """Una fila por item vendido, en orden cronológico, sin cargar el rango en memoria."""
+    start_utc, end_utc = _utc_range(start_date, end_date)
+    statement = (
+        select(
+            Order.id, Order.created_at, Order.payment_method, User.full_name,
+            Product.sku, Product.name, Product.category,
+            OrderItem.quantity, OrderItem.price_at_purchase,
+            Order.subtotal, Order.tax_amount, Order.total_amount
+        )
+        .join(OrderItem, OrderItem.order_id == Order.id)
+        .join(Product, OrderItem.product_id == Product.id)
+        .outerjoin(User, Order.user_id == User.id)
+        .where(
+            Order.status == "Pagada", # (Regla 4)
+            Order.created_at >= start_utc,
+            Order.created_at <= end_utc
+        )
+        .order_by(Order.created_at, Order.id, OrderItem.id)
+        .execution_options(yield_per=EXPORT_YIELD_PER) # Cursor del lado del servidor
+    )
+    for (order_id, created_at, payment_method, cashier, sku, name, category,
+         quantity, price, subtotal, tax_amount, total_amount) in db.exec(statement):
+        yield {
+            "order_id": order_id,
+            "created_at": pytz.utc.localize(created_at).astimezone(TIMEZONE).isoformat(),
+            "payment_method": payment_method,
+            "cashier": cashier or "N/A",
+            "sku": sku,
+            "product": name,
+            "category": category,
+            "quantity": quantity,
+            "unit_price": price,
+            "line_total": round(price * quantity, 2),
+            "order_subtotal": subtotal,
+            "order_tax": tax_amount,
+            "order_total": total_amount
+        }
+
+def stream_sales_export(start_date: datetime.date, end_date: datetime.date, export_format: str) -> Iterator[str]:
+    """
+    Genera la exportación (csv o ndjson) por bloques de EXPORT_YIELD_PER filas.
+    Abre su propia sesión: vive mientras el StreamingResponse consume el generador.
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS) if export_format == "csv" else None
+    if writer:
+        writer.writeheader()
+        yield buffer.getvalue() # Primer byte inmediato
+        buffer.seek(0)
+        buffer.truncate()
+
+    with Session(engine) as db:
+        pending = 0
+        for row in _iter_sales_rows(db, start_date, end_date):
+            if writer:
+                writer.writerow(row)
+            else:
+                buffer.write(json.dumps(row, ensure_ascii=False) + "\n")
+            pending += 1
+            if pending >= EXPORT_YIELD_PER:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                pending = 0
+        if pending:
+            yield buffer.getvalue()
+
+def get_sales_heatmap(db: Session, start_date: datetime.date, end_date: datetime.date):
+    """
+    Matriz 7x24 (lunes..domingo x hora local) de ingresos y órdenes pagadas.
+    Se agrega en SQL sobre el rollup horario: como máximo 168 filas llegan a Python.
+    """
+    _utc_range(start_date, end_date) # Valida el rango
+
+    revenue = [[0.0] * 24 for _ in WEEKDAYS]
+    orders = [[0] * 24 for _ in WEEKDAYS]
+    for day, hour, total, count in logic_rollups.weekday_hour_sales(db, start_date, end_date):
+        revenue[day][hour] += total or 0.0
+        orders[day][hour] += count or 0
 
     return {
         "start_date": start_date.isoformat(),
         "end_date": end_date.isoformat(),
-        "total_revenue": total_revenue,
-        "total_orders": total_orders,
-        "average_ticket": average_ticket,
-        "top_products": top_products_list,
-        "sales_by_category": sales_by_category_list,
-        "sales_over_time": sales_over_time_list,
-        "detailed_sales": detailed_sales_response
-    }
\ No newline at end of file
+        "weekdays": WEEKDAYS,
+        "hours": list(range(24)),
+        "revenue": revenue,
+        "orders": orders
+    }
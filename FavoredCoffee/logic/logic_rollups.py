@@ -0,0 +1,553 @@
+import os
+import pytz
+from collections import defaultdict
+from datetime import datetime, date, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlmodel import Session, select, func, delete
+from sqlalchemy import Date, DateTime, Integer, case, cast, insert, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+
+from ..models import (
+    Order, OrderItem, Product,
+    DailySalesRollup, HourlySalesRollup, DailyProductRollup, DailyCategoryRollup,
+    WeeklySalesRollup, WeeklyProductRollup, RollupPending
+)
+from .logic_settings import TIMEZONE
+from . import logic_report_cache
+
+UPSERT_BATCH_SIZE = 500
+# Las órdenes solo encolan una fila en rollup_pending; un proceso en segundo
+# plano las suma a los rollups (así los commits no compiten por las filas del día)
+ROLLUP_COMPACT_INTERVAL_SECONDS = float(os.environ.get("ROLLUP_COMPACT_INTERVAL_SECONDS", 2))
+ROLLUP_COMPACT_BATCH_SIZE = int(os.environ.get("ROLLUP_COMPACT_BATCH_SIZE", 500))
+# Un día se da por cerrado un rato después de la medianoche: las órdenes que
+# estaban en curso a esa hora (p. ej. en un lote del group commit) ya confirmaron
+ROLLUP_SETTLE_SECONDS = 60
+# Clave del advisory lock (Postgres) que serializa compact_rollups y rebuild_rollups
+ROLLUP_LOCK_KEY = 7015
+
+# Claves y columnas sumables de cada rollup
+ROLLUP_COLUMNS = {
+    DailySalesRollup: (["business_date"], ["total_sales", "order_count"]),
+    HourlySalesRollup: (["business_date", "hour"], ["total_sales", "order_count"]),
+    DailyProductRollup: (["business_date", "product_id"], ["units"]),
+    DailyCategoryRollup: (["business_date", "category"], ["units"]),
+    WeeklySalesRollup: (["week_start"], ["total_sales", "order_count"]),
+    WeeklyProductRollup: (["week_start", "product_id"], ["units"]),
+}
+
+def local_datetime(created_at_utc: datetime) -> datetime:
+    """Hora local (TIMEZONE) de un created_at guardado en UTC."""
+    return pytz.utc.localize(created_at_utc).astimezone(TIMEZONE)
+
+def business_date(created_at_utc: datetime) -> date:
+    """Día de negocio (fecha local en TIMEZONE) de un created_at guardado en UTC."""
+    return local_datetime(created_at_utc).date()
+
+def today() -> date:
+    return datetime.now(TIMEZONE).date()
+
+def week_start(day: date) -> date:
+    """Lunes de la semana de un día local."""
+    return day - timedelta(days=day.weekday())
+
+def start_of_day_utc(day: date) -> datetime:
+    """Instante UTC (sin zona, como created_at) en que empieza un día local."""
+    start_local = TIMEZONE.localize(datetime.combine(day, datetime.min.time()))
+    return start_local.astimezone(pytz.utc).replace(tzinfo=None)
+
+def _sqlite_offset_modifier() -> str:
+    """Modificador '-300 minutes' para SQLite, que no conoce zonas horarias.
+    America/Bogota no tiene horario de verano: el desfase es fijo."""
+    offset = TIMEZONE.utcoffset(datetime.utcnow())
+    return f"{int(offset.total_seconds() // 60):+d} minutes"
+
+def local_date_expr(db: Session, column):
+    """Expresión SQL con la fecha local (TIMEZONE) de una columna datetime en UTC."""
+    if db.get_bind().dialect.name == "sqlite":
+        return func.date(column, _sqlite_offset_modifier())
+    return cast(func.timezone(TIMEZONE.zone, func.timezone("UTC", column)), Date)
+
+def local_period_expr(db: Session, column, granularity: str):
+    """
+    Etiqueta del periodo local (TIMEZONE) de una columna datetime en UTC, como texto:
+    'YYYY-MM-DDTHH:00' (hour), 'YYYY-MM-DD' (day y week: lunes) o 'YYYY-MM' (month).
+    """
+    if db.get_bind().dialect.name == "sqlite":
+        offset = _sqlite_offset_modifier()
+        if granularity == "hour":
+            return func.strftime("%Y-%m-%dT%H:00", column, offset)
+        if granularity == "day":
+            return func.date(column, offset)
+        if granularity == "week":
+            return func.date(column, offset, "weekday 0", "-6 days")
+        return func.strftime("%Y-%m", column, offset)
+
+    local_time = func.timezone(TIMEZONE.zone, func.timezone("UTC", column))
+    if granularity == "hour":
+        return func.to_char(func.date_trunc("hour", local_time), 'YYYY-MM-DD"T"HH24:00')
+    if granularity == "day":
+        return func.to_char(local_time, "YYYY-MM-DD")
+    if granularity == "week":
+        return func.to_char(func.date_trunc("week", local_time), "YYYY-MM-DD")
+    return func.to_char(local_time, "YYYY-MM")
+
+def local_hour_expr(db: Session, column):
+    """Hora local (0-23, TIMEZONE) de una columna datetime en UTC."""
+    if db.get_bind().dialect.name == "sqlite":
+        return cast(func.strftime("%H", column, _sqlite_offset_modifier()), Integer)
+    local_time = func.timezone(TIMEZONE.zone, func.timezone("UTC", column))
+    return cast(func.extract("hour", local_time), Integer)
+
+def weekday_expr(db: Session, date_column):
+    """Día de la semana (0=lunes .. 6=domingo) de una columna date."""
+    if db.get_bind().dialect.name == "sqlite":
+        # %w: 0=domingo; se corre a 0=lunes
+        return (cast(func.strftime("%w", date_column), Integer) + 6) % 7
+    return cast(func.extract("isodow", date_column), Integer) - 1
+
+def week_start_expr(db: Session, date_column):
+    """Lunes de la semana de una columna date."""
+    if db.get_bind().dialect.name == "sqlite":
+        return func.date(date_column, "weekday 0", "-6 days")
+    return cast(func.date_trunc("week", date_column), Date)
+
+def _upsert_add(db: Session, model, rows: List[dict], key_columns: List[str], sum_columns: List[str]):
+    """INSERT ... ON CONFLICT (claves) DO UPDATE SET col = col + excluded.col"""
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    table = model.__table__
+    # Por lotes: un VALUES gigante supera el límite de parámetros de SQLite
+    for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+        statement = dialect.insert(model).values(rows[start:start + UPSERT_BATCH_SIZE])
+        statement = statement.on_conflict_do_update(
+            index_elements=key_columns,
+            set_={column: table.c[column] + statement.excluded[column] for column in sum_columns}
+        )
+        db.exec(statement)
+
+def _delete_empty(db: Session, model, rows: List[dict], key_columns: List[str], sum_columns: List[str]):
+    """
+    Borra las filas que quedaron en cero tras sumar un lote (p. ej. una venta
+    y su cancelación en la única orden de esa hora): el escaneo crudo no
+    tiene ese periodo y el reporte tampoco debe mostrarlo.
+    """
+    period_column = key_columns[0]
+    periods = list({row[period_column] for row in rows})
+    if not periods:
+        return
+    table = model.__table__
+    db.exec(
+        delete(model)
+        .where(table.c[period_column].in_(periods), *(table.c[column] == 0 for column in sum_columns))
+        .execution_options(synchronize_session=False)
+    )
+
+def record_order(db: Session, order_id: int, sign: int = 1):
+    """
+    Encola la orden para los rollups, sin hacer commit. Es un INSERT en
+    rollup_pending: no toca las filas del día ni de la semana, que comparten
+    todas las órdenes. Una cancelación futura debe llamarla con sign=-1 en su
+    misma transacción.
+    """
+    db.exec(insert(RollupPending).values(order_id=order_id, sign=sign))
+
+def _lock_rollups(db: Session):
+    """
+    Serializa compact_rollups y rebuild_rollups. En Postgres es un advisory
+    lock hasta el fin de la transacción; en SQLite ya lo hace el lock de escritura.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        db.exec(select(func.pg_advisory_xact_lock(ROLLUP_LOCK_KEY)))
+
+def _rollup_rows(orders, items) -> Dict[type, List[dict]]:
+    """
+    Filas a sumar a cada rollup por un conjunto de órdenes.
+    orders: (order_id, created_at, total_amount, sign); items: (order_id, product_id, quantity, category).
+    """
+    daily, hourly, weekly = defaultdict(lambda: [0.0, 0]), defaultdict(lambda: [0.0, 0]), defaultdict(lambda: [0.0, 0])
+    products, categories, weekly_products = defaultdict(int), defaultdict(int), defaultdict(int)
+    order_days = {}
+    for order_id, created_at, total_amount, sign in orders:
+        local_time = local_datetime(created_at)
+        day = local_time.date()
+        week = week_start(day)
+        order_days[order_id] = (day, week, sign)
+        for totals in (daily[day], hourly[(day, local_time.hour)], weekly[week]):
+            totals[0] += total_amount * sign
+            totals[1] += sign
+    for order_id, product_id, quantity, category in items:
+        day, week, sign = order_days[order_id]
+        products[(day, product_id)] += quantity * sign
+        categories[(day, category)] += quantity * sign
+        weekly_products[(week, product_id)] += quantity * sign
+
+    return {
+        DailySalesRollup: [
+            {"business_date": d, "total_sales": total, "order_count": count} for d, (total, count) in daily.items()
+        ],
+        HourlySalesRollup: [
+            {"business_date": d, "hour": h, "total_sales": total, "order_count": count}
+            for (d, h), (total, count) in hourly.items()
+        ],
+        DailyProductRollup: [
+            {"business_date": d, "product_id": product_id, "units": units} for (d, product_id), units in products.items()
+        ],
+        DailyCategoryRollup: [
+            {"business_date": d, "category": category, "units": units} for (d, category), units in categories.items()
+        ],
+        WeeklySalesRollup: [
+            {"week_start": w, "total_sales": total, "order_count": count} for w, (total, count) in weekly.items()
+        ],
+        WeeklyProductRollup: [
+            {"week_start": w, "product_id": product_id, "units": units} for (w, product_id), units in weekly_products.items()
+        ],
+    }
+
+def compact_rollups(db: Session, batch_size: int = ROLLUP_COMPACT_BATCH_SIZE) -> int:
+    """
+    Suma a los rollups las órdenes de rollup_pending (un upsert por tabla para
+    todo el lote) y borra esas filas en la misma transacción.
+    Devuelve cuántas órdenes procesó.
+    """
+    _lock_rollups(db)
+    pending = db.exec(
+        select(RollupPending.id, RollupPending.order_id, Order.created_at, Order.total_amount, RollupPending.sign)
+        .join(Order, RollupPending.order_id == Order.id)
+        .order_by(RollupPending.id)
+        .limit(batch_size)
+    ).all()
+    if not pending:
+        db.rollback() # Libera el advisory lock
+        return 0
+
+    order_ids = list({order_id for _, order_id, _, _, _ in pending})
+    items = db.exec(
+        select(OrderItem.order_id, OrderItem.product_id, OrderItem.quantity, Product.category)
+        .join(Product, OrderItem.product_id == Product.id)
+        .where(OrderItem.order_id.in_(order_ids))
+    ).all()
+    # Una misma orden puede estar dos veces (alta y cancelación): se suman sus signos
+    signs: Dict[int, int] = defaultdict(int)
+    orders = {}
+    for _, order_id, created_at, total_amount, sign in pending:
+        signs[order_id] += sign
+        orders[order_id] = (created_at, total_amount)
+    rows = _rollup_rows(
+        [(order_id, created_at, total_amount, signs[order_id]) for order_id, (created_at, total_amount) in orders.items()],
+        items
+    )
+
+    try:
+        # Se reclaman las filas borrándolas primero, por id: si otro compactador
+        # ya las tomó, el conteo no cuadra y no se suma nada dos veces
+        pending_ids = [pending_id for pending_id, _, _, _, _ in pending]
+        claimed = db.exec(
+            delete(RollupPending)
+            .where(RollupPending.id.in_(pending_ids))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if claimed != len(pending_ids):
+            db.rollback()
+            return 0
+        for model, model_rows in rows.items():
+            key_columns, sum_columns = ROLLUP_COLUMNS[model]
+            _upsert_add(db, model, model_rows, key_columns, sum_columns)
+            if any(row[column] <= 0 for row in model_rows for column in sum_columns):
+                _delete_empty(db, model, model_rows, key_columns, sum_columns)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return len(pending)
+
+def _pending_sign(order_id_column):
+    """Suma de los signos en rollup_pending de una orden (0 si no tiene filas)."""
+    return (
+        select(func.coalesce(func.sum(RollupPending.sign), 0))
+        .where(RollupPending.order_id == order_id_column)
+        .scalar_subquery()
+    )
+
+def rebuild_rollups(db: Session, start_date: Optional[date] = None, end_date: Optional[date] = None) -> int:
+    """
+    Recalcula los rollups desde las órdenes pagadas (backfill).
+    Sin fechas reconstruye todo. Devuelve los días reconstruidos.
+
+    Corre con el lock de compact_rollups y cuenta cada orden como
+    "pagada (1/0) - lo que aún tiene pendiente en rollup_pending": así una
+    orden confirmada durante la reconstrucción no se suma dos veces (la suma
+    el compactador después).
+    """
+    _lock_rollups(db)
+    paid = [case((Order.status == "Pagada", 1), else_=0) - _pending_sign(Order.id) == 1]
+    rollup_filters = {
+        model: [] for model in (DailySalesRollup, HourlySalesRollup, DailyProductRollup, DailyCategoryRollup)
+    }
+    if start_date:
+        paid.append(Order.created_at >= start_of_day_utc(start_date))
+        for model, filters in rollup_filters.items():
+            filters.append(model.business_date >= start_date)
+    if end_date:
+        paid.append(Order.created_at < start_of_day_utc(end_date + timedelta(days=1)))
+        for model, filters in rollup_filters.items():
+            filters.append(model.business_date <= end_date)
+
+    for model, filters in rollup_filters.items():
+        db.exec(delete(model).where(*filters))
+
+    day = local_date_expr(db, Order.created_at)
+    sales_rows = db.exec(
+        select(day, func.sum(Order.total_amount), func.count(Order.id))
+        .where(*paid)
+        .group_by(day)
+    ).all()
+    hour = local_hour_expr(db, Order.created_at)
+    hourly_rows = db.exec(
+        select(day, hour, func.sum(Order.total_amount), func.count(Order.id))
+        .where(*paid)
+        .group_by(day, hour)
+    ).all()
+    product_rows = db.exec(
+        select(day, OrderItem.product_id, func.sum(OrderItem.quantity))
+        .join(Order, OrderItem.order_id == Order.id)
+        .where(*paid)
+        .group_by(day, OrderItem.product_id)
+    ).all()
+    category_rows = db.exec(
+        select(day, Product.category, func.sum(OrderItem.quantity))
+        .join(OrderItem, OrderItem.product_id == Product.id)
+        .join(Order, OrderItem.order_id == Order.id)
+        .where(*paid)
+        .group_by(day, Product.category)
+    ).all()
+
+    _upsert_add(
+        db, DailySalesRollup,
+        [{"business_date": _as_date(d), "total_sales": total, "order_count": count} for d, total, count in sales_rows],
+        ["business_date"], ["total_sales", "order_count"]
+    )
+    _upsert_add(
+        db, HourlySalesRollup,
+        [
+            {"business_date": _as_date(d), "hour": h, "total_sales": total, "order_count": count}
+            for d, h, total, count in hourly_rows
+        ],
+        ["business_date", "hour"], ["total_sales", "order_count"]
+    )
+    _upsert_add(
+        db, DailyProductRollup,
+        [{"business_date": _as_date(d), "product_id": product_id, "units": units} for d, product_id, units in product_rows],
+        ["business_date", "product_id"], ["units"]
+    )
+    _upsert_add(
+        db, DailyCategoryRollup,
+        [{"business_date": _as_date(d), "category": category, "units": units} for d, category, units in category_rows],
+        ["business_date", "category"], ["units"]
+    )
+    _rebuild_weekly(
+        db,
+        week_start(start_date) if start_date else None,
+        week_start(end_date) + timedelta(days=6) if end_date else None
+    )
+    # Los reportes de rangos cerrados se cachean sin expiración: todos los workers los descartan
+    logic_report_cache.bump_cache_version(db)
+    db.commit()
+    return len(sales_rows)
+
+def _rebuild_weekly(db: Session, first_day: Optional[date], last_day: Optional[date]):
+    """
+    Recalcula los contadores semanales desde los rollups diarios, que ya están
+    al día. Se amplía el rango a semanas completas para no dejar semanas a medias.
+    """
+    daily_filters = {DailySalesRollup: [], DailyProductRollup: []}
+    weekly_filters = {WeeklySalesRollup: [], WeeklyProductRollup: []}
+    if first_day:
+        for model, filters in daily_filters.items():
+            filters.append(model.business_date >= first_day)
+        for model, filters in weekly_filters.items():
+            filters.append(model.week_start >= first_day)
+    if last_day:
+        for model, filters in daily_filters.items():
+            filters.append(model.business_date <= last_day)
+        for model, filters in weekly_filters.items():
+            filters.append(model.week_start <= last_day)
+
+    for model, filters in weekly_filters.items():
+        db.exec(delete(model).where(*filters))
+
+    week = week_start_expr(db, DailySalesRollup.business_date)
+    sales_rows = db.exec(
+        select(week, func.sum(DailySalesRollup.total_sales), func.sum(DailySalesRollup.order_count))
+        .where(*daily_filters[DailySalesRollup])
+        .group_by(week)
+    ).all()
+    week = week_start_expr(db, DailyProductRollup.business_date)
+    product_rows = db.exec(
+        select(week, DailyProductRollup.product_id, func.sum(DailyProductRollup.units))
+        .where(*daily_filters[DailyProductRollup])
+        .group_by(week, DailyProductRollup.product_id)
+    ).all()
+
+    _upsert_add(
+        db, WeeklySalesRollup,
+        [{"week_start": _as_date(w), "total_sales": total, "order_count": count} for w, total, count in sales_rows],
+        ["week_start"], ["total_sales", "order_count"]
+    )
+    _upsert_add(
+        db, WeeklyProductRollup,
+        [{"week_start": _as_date(w), "product_id": product_id, "units": units} for w, product_id, units in product_rows],
+        ["week_start", "product_id"], ["units"]
+    )
+
+def rebuild_rollups_if_empty(db: Session):
+    """Backfill automático al arrancar sobre una BD con órdenes pero sin rollups."""
+    # Basta con que una tabla esté vacía (p. ej. una tabla de rollup nueva)
+    if all(
+        db.exec(select(model).limit(1)).first() is not None
+        for model in (DailySalesRollup, HourlySalesRollup, WeeklySalesRollup)
+    ):
+        return
+    if db.exec(select(Order.id).limit(1)).first() is None:
+        return
+    days = rebuild_rollups(db)
+    print(f"INFO:     Rollups diarios reconstruidos ({days} días).")
+
+def _as_date(value) -> date:
+    # SQLite devuelve 'YYYY-MM-DD' como texto; Postgres devuelve date
+    return value if isinstance(value, date) else date.fromisoformat(value)
+
+# --- Lectura: rollups para días cerrados, órdenes crudas para los días abiertos ---
+
+def first_open_day(db: Session) -> date:
+    """
+    Primer día que los rollups aún no tienen completo: hoy (o ayer, justo
+    después de la medianoche) o el día de la orden pendiente más antigua.
+    Desde ese día se lee de las órdenes crudas.
+    """
+    settled_day = business_date(datetime.utcnow() - timedelta(seconds=ROLLUP_SETTLE_SECONDS))
+    oldest_pending = db.exec(
+        select(func.min(Order.created_at)).join(RollupPending, RollupPending.order_id == Order.id)
+    ).one()
+    if oldest_pending is None:
+        return settled_day
+    return min(settled_day, business_date(oldest_pending))
+
+def split_range(db: Session, start_date: date, end_date: date) -> Tuple[Optional[date], Optional[date]]:
+    """
+    Parte [start_date, end_date] en días cerrados (rollups) y abiertos (órdenes):
+    (último día cerrado o None, primer día abierto o None).
+    """
+    open_day = first_open_day(db)
+    last_closed = min(end_date, open_day - timedelta(days=1))
+    return (
+        last_closed if start_date <= last_closed else None,
+        max(start_date, open_day) if end_date >= open_day else None
+    )
+
+def rollup_period_expr(db: Session, granularity: str):
+    """
+    (etiqueta, tabla) para agrupar los rollups por periodo, con las mismas
+    etiquetas de texto que local_period_expr. 'hour' usa el rollup horario.
+    """
+    sqlite_dialect = db.get_bind().dialect.name == "sqlite"
+    if granularity == "hour":
+        day, hour = HourlySalesRollup.business_date, HourlySalesRollup.hour
+        if sqlite_dialect:
+            return func.printf("%sT%02d:00", day, hour), HourlySalesRollup
+        return func.to_char(cast(day, DateTime) + func.make_interval(0, 0, 0, 0, hour), 'YYYY-MM-DD"T"HH24:00'), HourlySalesRollup
+
+    day = DailySalesRollup.business_date
+    if granularity == "day":
+        label = func.date(day) if sqlite_dialect else func.to_char(day, "YYYY-MM-DD")
+    elif granularity == "week":
+        label = func.date(day, "weekday 0", "-6 days") if sqlite_dialect else func.to_char(func.date_trunc("week", day), "YYYY-MM-DD")
+    else:
+        label = func.strftime("%Y-%m", day) if sqlite_dialect else func.to_char(day, "YYYY-MM")
+    return label, DailySalesRollup
+
+def _open_days_by_weekday_hour(db: Session, first_day: date, last_day: date) -> List[Tuple[int, int, float, int]]:
+    """(día de la semana, hora local, ventas, órdenes) de días abiertos, desde las órdenes crudas."""
+    weekday = weekday_expr(db, local_date_expr(db, Order.created_at))
+    hour = local_hour_expr(db, Order.created_at)
+    return db.exec(
+        select(weekday, hour, func.sum(Order.total_amount), func.count(Order.id))
+        .where(
+            Order.status == "Pagada",
+            Order.created_at >= start_of_day_utc(first_day),
+            Order.created_at < start_of_day_utc(last_day + timedelta(days=1))
+        )
+        .group_by(weekday, hour)
+    ).all()
+
+def weekday_hour_sales(db: Session, start_date: date, end_date: date) -> List[Tuple[int, int, float, int]]:
+    """
+    (día de la semana 0=lunes, hora local, ventas, órdenes) agrupados en SQL.
+    Los días cerrados salen del rollup horario (<= 24 filas por día).
+    """
+    last_closed, first_open = split_range(db, start_date, end_date)
+    rows = []
+    if last_closed:
+        weekday = weekday_expr(db, HourlySalesRollup.business_date)
+        rows += db.exec(
+            select(
+                weekday, HourlySalesRollup.hour,
+                func.sum(HourlySalesRollup.total_sales), func.sum(HourlySalesRollup.order_count)
+            )
+            .where(HourlySalesRollup.business_date >= start_date, HourlySalesRollup.business_date <= last_closed)
+            .group_by(weekday, HourlySalesRollup.hour)
+        ).all()
+    if first_open:
+        rows += _open_days_by_weekday_hour(db, first_open, end_date)
+    return rows
+
+def _pending_in_weeks(first_week: date, last_week: date):
+    """Filtro de las órdenes creadas entre el lunes first_week y el fin de la semana last_week."""
+    return (
+        Order.created_at >= start_of_day_utc(first_week),
+        Order.created_at < start_of_day_utc(last_week + timedelta(days=7))
+    )
+
+def weekly_sales(db: Session, weeks: List[date]) -> Dict[date, Tuple[float, int]]:
+    """
+    {lunes: (ventas, órdenes)} del rollup semanal más las órdenes aún en
+    rollup_pending. Es una sola sentencia: un snapshot consistente aunque el
+    compactador confirme entre medio.
+    """
+    rollup = select(
+        WeeklySalesRollup.week_start.label("week"),
+        WeeklySalesRollup.total_sales.label("total"),
+        WeeklySalesRollup.order_count.label("count")
+    ).where(WeeklySalesRollup.week_start.in_(weeks))
+    pending = select(
+        week_start_expr(db, local_date_expr(db, Order.created_at)),
+        Order.total_amount * RollupPending.sign,
+        RollupPending.sign
+    ).join(Order, RollupPending.order_id == Order.id).where(*_pending_in_weeks(min(weeks), max(weeks)))
+    combined = union_all(rollup, pending).subquery()
+    rows = db.exec(
+        select(combined.c.week, func.sum(combined.c.total), func.sum(combined.c.count)).group_by(combined.c.week)
+    ).all()
+    return {_as_date(week): (total or 0.0, int(count or 0)) for week, total, count in rows}
+
+def weekly_top_products(db: Session, week: date, limit: int) -> List[Product]:
+    """Productos más vendidos (unidades) de la semana, incluidas las órdenes pendientes. Una sola sentencia."""
+    rollup = select(
+        WeeklyProductRollup.product_id.label("product_id"),
+        WeeklyProductRollup.units.label("units")
+    ).where(WeeklyProductRollup.week_start == week)
+    pending = (
+        select(OrderItem.product_id, OrderItem.quantity * RollupPending.sign)
+        .join(Order, OrderItem.order_id == Order.id)
+        .join(RollupPending, RollupPending.order_id == Order.id)
+        .where(*_pending_in_weeks(week, week))
+    )
+    combined = union_all(rollup, pending).subquery()
+    units = func.sum(combined.c.units)
+    return db.exec(
+        select(Product)
+        .join(combined, combined.c.product_id == Product.id)
+        .group_by(Product.id)
+        .having(units > 0)
+        .order_by(units.desc(), Product.id)
+        .limit(limit)
+    ).all()
@@ -0,0 +1,46 @@
+from typing import List
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlmodel import SQLModel
+
+from ..models import User, BusinessSettings
+
+# El proyecto no usa migraciones: create_all crea tablas nuevas pero no agrega
+# columnas a tablas existentes. Cada columna nueva de una tabla vieja va aquí
+# como (modelo, columna, definición SQL) y se agrega al arrancar.
+ADDED_COLUMNS = [
+    (User, "token_version", "INTEGER NOT NULL DEFAULT 0"),
+    (BusinessSettings, "version", "INTEGER NOT NULL DEFAULT 0"),
+    (BusinessSettings, "report_cache_version", "INTEGER NOT NULL DEFAULT 0"),
+]
+
+def upgrade_schema(engine: Engine) -> List[str]:
+    """
+    Agrega las columnas de ADDED_COLUMNS que falten (ALTER TABLE ... ADD COLUMN)
+    y crea los índices declarados en los modelos que no existan.
+    Es idempotente: se llama en cada arranque y desde manage.py upgrade-schema.
+    Devuelve los cambios aplicados.
+    """
+    applied = []
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+        for model, column, definition in ADDED_COLUMNS:
+            table = model.__table__.name
+            if not inspector.has_table(table):
+                continue # create_all la crea completa
+            if column in {c["name"] for c in inspector.get_columns(table)}:
+                continue
+            quoted_table = connection.dialect.identifier_preparer.quote(table)
+            connection.execute(text(f"ALTER TABLE {quoted_table} ADD COLUMN {column} {definition}"))
+            applied.append(f"{table}.{column}")
+
+        # Índices agregados a tablas que ya existían (create_all solo los crea con la tabla)
+        for table in SQLModel.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing:
+                    index.create(connection)
+                    applied.append(index.name)
+    return applied
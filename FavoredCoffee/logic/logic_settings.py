@@ -1,18 +1,61 @@
+import os
+import threading
+import time
+import pytz
+from typing import Optional
 from fastapi import HTTPException
 from sqlmodel import Session, select
+from sqlalchemy import update
 from ..models import BusinessSettings
 from ..schemas import SettingsSchema
 
+# Zona horaria del negocio: define el "día" de ventas en reportes y rollups
+TIMEZONE = pytz.timezone("America/Bogota")
+
+# Cada cuánto un worker compara su copia con la versión guardada en la BD
+SETTINGS_VERSION_CHECK_SECONDS = float(os.environ.get("SETTINGS_VERSION_CHECK_SECONDS", 5))
+
+# Copia en memoria (sin sesión) compartida por todo el proceso
+_cache_lock = threading.Lock()
+_cached_settings: Optional[BusinessSettings] = None
+_last_version_check = 0.0
+
+def _cache_settings(settings: BusinessSettings) -> BusinessSettings:
+    global _cached_settings, _last_version_check
+    snapshot = BusinessSettings(**settings.model_dump())
+    with _cache_lock:
+        _cached_settings = snapshot
+        _last_version_check = time.monotonic()
+    return snapshot
+
 def get_settings(db: Session) -> BusinessSettings:
-    """Obtiene la configuración actual del negocio."""
+    """
+    Obtiene la configuración actual del negocio (copia cacheada).
+    Cada SETTINGS_VERSION_CHECK_SECONDS se consulta solo la columna version
+    para detectar cambios hechos por otros workers.
+    """
+    global _last_version_check
+    with _cache_lock:
+        cached = _cached_settings
+        last_check = _last_version_check
+
+    if cached is not None:
+        if time.monotonic() - last_check < SETTINGS_VERSION_CHECK_SECONDS:
+            return cached
+        version = db.exec(select(BusinessSettings.version).where(BusinessSettings.id == 1)).first()
+        if version == cached.version:
+            with _cache_lock:
+                _last_version_check = time.monotonic()
+            return cached
+
     settings = db.get(BusinessSettings, 1) # ID es siempre 1
     if not settings:
         # Esto es llamado por on_startup, así que debe existir
         settings = create_initial_settings(db)
-    return settings
+    return _cache_settings(settings)
 
 def update_settings(db: Session, settings_data: SettingsSchema) -> BusinessSettings:
-    """Actualiza la configuración del negocio."""
+    """Actualiza la configuración del negocio y sube su versión."""
     settings = db.get(BusinessSettings, 1)
     if not settings:
         raise HTTPException(status_code=404, detail="Configuración no encontrada")
@@ -20,11 +63,19 @@ def update_settings(db: Session, settings_data: SettingsSchema) -> BusinessSetti
     settings_data_dict = settings_data.dict(exclude_unset=True)
     for key, value in settings_data_dict.items():
         setattr(settings, key, value)
-    
     db.add(settings)
+    db.flush()
+
+    # Incremento en SQL: dos workers que guardan a la vez no repiten versión
+    db.exec(
+        update(BusinessSettings)
+        .where(BusinessSettings.id == 1)
+        .values(version=BusinessSettings.version + 1)
+        .execution_options(synchronize_session=False)
+    )
     db.commit()
     db.refresh(settings)
-    return settings
+    return _cache_settings(settings)
 
 def create_initial_settings(db: Session) -> BusinessSettings:
     """Crea la configuración inicial si no existe."""
@@ -35,4 +86,4 @@ def create_initial_settings(db: Session) -> BusinessSettings:
         db.commit()
         db.refresh(settings)
         print("INFO:     Configuración de negocio inicial creada.")
-    return settings
\ No newline at end of file
+    return settings
@@ -0,0 +1,107 @@
+import os
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple
+from fastapi import HTTPException
+from sqlmodel import Session, select, func
+from sqlalchemy import update, insert, delete, literal
+from ..models import Product, StockMovement
+
+# Modo opcional: STOCK_LEDGER=1 evita reescribir las filas "calientes" de Product
+STOCK_LEDGER = os.environ.get("STOCK_LEDGER", "0") == "1"
+STOCK_COMPACT_INTERVAL_SECONDS = float(os.environ.get("STOCK_COMPACT_INTERVAL_SECONDS", 5))
+STOCK_COMPACT_BATCH_SIZE = int(os.environ.get("STOCK_COMPACT_BATCH_SIZE", 5000))
+STOCK_LOCK_KEY = 7007 # Espacio de los advisory locks por producto (Postgres)
+
+def get_pending_deltas(db: Session, product_ids: Iterable[int] = None) -> Dict[int, int]:
+    """Suma de los movimientos aún no consolidados, por producto."""
+    statement = (
+        select(StockMovement.product_id, func.sum(StockMovement.delta))
+        .group_by(StockMovement.product_id)
+    )
+    if product_ids is not None:
+        statement = statement.where(StockMovement.product_id.in_(set(product_ids)))
+    return {product_id: int(total or 0) for product_id, total in db.exec(statement).all()}
+
+def _lock_products(db: Session, product_ids: Iterable[int]):
+    """
+    Serializa las ventas de cada producto hasta el fin de la transacción.
+    En Postgres es un advisory lock por producto (en orden de id, sin
+    deadlocks); en SQLite ya lo hace el lock de escritura del INSERT.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        for product_id in sorted(product_ids):
+            db.exec(select(func.pg_advisory_xact_lock(STOCK_LOCK_KEY, product_id)))
+
+def _available_stock(product_id: int):
+    """Product.stock + movimientos sin consolidar, como subconsulta escalar."""
+    pending = (
+        select(func.coalesce(func.sum(StockMovement.delta), 0))
+        .where(StockMovement.product_id == product_id)
+        .scalar_subquery()
+    )
+    return select(Product.stock + pending).where(Product.id == product_id).scalar_subquery()
+
+def record_sale(db: Session, order_id: int, items: List[Tuple[Product, int]]):
+    """
+    Registra la venta como un movimiento negativo por producto, solo si hay
+    disponible (INSERT ... SELECT ... WHERE disponible >= cantidad). Con el
+    lock por producto, dos órdenes concurrentes no pueden vender el mismo
+    stock. Lanza 400 si no alcanza; el llamador deshace la orden.
+    """
+    needed = defaultdict(int)
+    names = {}
+    for product, quantity in items:
+        needed[product.id] += quantity
+        names[product.id] = product.name
+
+    _lock_products(db, needed.keys())
+    for product_id in sorted(needed):
+        quantity = needed[product_id]
+        result = db.exec(
+            insert(StockMovement).from_select(
+                ["product_id", "delta", "order_id"],
+                select(literal(product_id), literal(-quantity), literal(order_id))
+                .where(_available_stock(product_id) >= quantity)
+            )
+        )
+        if result.rowcount != 1:
+            raise HTTPException(status_code=400, detail=f"Stock insuficiente para '{names[product_id]}'")
+
+def compact_stock_movements(db: Session, batch_size: int = STOCK_COMPACT_BATCH_SIZE) -> int:
+    """
+    Consolida los movimientos pendientes en Product.stock (un UPDATE por
+    producto) y los borra en la misma transacción, para que la tabla no
+    crezca sin límite. Devuelve cuántos movimientos procesó.
+    """
+    movements = db.exec(
+        select(StockMovement.id, StockMovement.product_id, StockMovement.delta)
+        .order_by(StockMovement.id)
+        .limit(batch_size)
+    ).all()
+    if not movements:
+        return 0
+
+    totals = defaultdict(int)
+    for _, product_id, delta in movements:
+        totals[product_id] += delta
+
+    try:
+        for product_id, total in totals.items():
+            db.exec(
+                update(Product)
+                .where(Product.id == product_id)
+                .values(stock=Product.stock + total)
+                .execution_options(synchronize_session=False)
+            )
+        # Se borran por id: un movimiento confirmado después de la lectura no se pierde
+        processed_ids = [movement_id for movement_id, _, _ in movements]
+        db.exec(
+            delete(StockMovement)
+            .where(StockMovement.id.in_(processed_ids))
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return len(movements)
@@ -1,7 +1,8 @@
 from typing import List, Optional
 from sqlmodel import Session, select
+from sqlalchemy import update
 from ..models import User
-from ..security import get_password_hash
+from ..security import get_password_hash, invalidate_user_cache
 from ..schemas import UserCreate, UserUpdate
 from fastapi import HTTPException
 
@@ -14,8 +15,10 @@ def get_users(db: Session) -> List[User]:
     """Obtiene la lista completa de usuarios."""
     return db.exec(select(User)).all()
 
-def create_user(db: Session, user_data: UserCreate) -> User:
-    hashed_password = get_password_hash(user_data.password)
+def create_user(db: Session, user_data: UserCreate, hashed_password: Optional[str] = None) -> User:
+    """Crea un usuario. Los routers envían el hash ya calculado fuera del event loop."""
+    if hashed_password is None:
+        hashed_password = get_password_hash(user_data.password)
     db_user = User(
         email=user_data.email,
         full_name=user_data.full_name,
@@ -28,24 +31,50 @@ def create_user(db: Session, user_data: UserCreate) -> User:
     db.refresh(db_user)
     return db_user
 
-def update_user(db: Session, user_id: int, user_data: UserUpdate) -> User:
-    """Actualiza campos del usuario y cambia la contraseña si se envía."""
+def update_user(db: Session, user_id: int, user_data: UserUpdate, hashed_password: Optional[str] = None) -> User:
+    """
+    Actualiza campos del usuario y cambia la contraseña si se envía.
+    Si se recibe hashed_password (calculado por el router), se usa ese hash.
+    """
     user = db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
 
     data = user_data.dict(exclude_unset=True)
     new_password = data.pop("password", None)
+    previous_email = user.email
+    access_changed = (
+        ("role" in data and data["role"] != user.role) or
+        ("is_active" in data and data["is_active"] != user.is_active)
+    )
 
     for key, value in data.items():
         setattr(user, key, value)
 
-    if new_password:
+    if hashed_password:
+        user.hashed_password = hashed_password
+    elif new_password:
         user.hashed_password = get_password_hash(new_password)
 
     db.add(user)
+
+    # Un cambio de rol o estado revoca los tokens emitidos con la versión anterior.
+    # Incremento en SQL: dos cambios simultáneos no pierden ninguna versión.
+    if access_changed:
+        db.flush()
+        db.exec(
+            update(User)
+            .where(User.id == user_id)
+            .values(token_version=User.token_version + 1)
+            .execution_options(synchronize_session=False)
+        )
+
     db.commit()
     db.refresh(user)
+
+    invalidate_user_cache(previous_email)
+    if user.email != previous_email:
+        invalidate_user_cache(user.email)
     return user
 
 def create_first_admin(session: Session):
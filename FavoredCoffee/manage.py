@@ -0,0 +1,62 @@
+"""
+Comandos de mantenimiento.
+
+    python -m FavoredCoffee.manage upgrade-schema
+    python -m FavoredCoffee.manage rebuild-rollups [--start YYYY-MM-DD] [--end YYYY-MM-DD]
+    python -m FavoredCoffee.manage export-columnar --start YYYY-MM-DD --end YYYY-MM-DD [--format parquet|arrow] [--output DIR]
+"""
+import argparse
+from datetime import date
+from sqlmodel import SQLModel, Session
+from .database import engine
+from .logic.logic_rollups import rebuild_rollups
+from .logic.logic_report_cache import REPORT_CACHE_VERSION_CHECK_SECONDS
+from .logic.logic_schema import upgrade_schema
+from .logic.logic_columnar import export_columnar, COLUMNAR_FORMATS
+
+def _upgrade_schema(args):
+    SQLModel.metadata.create_all(bind=engine)
+    applied = upgrade_schema(engine)
+    for change in applied:
+        print(f"INFO:     Esquema actualizado: {change}")
+    if not applied:
+        print("INFO:     El esquema ya está al día.")
+
+def _rebuild_rollups(args):
+    SQLModel.metadata.create_all(bind=engine) # Crea las tablas de rollups si faltan
+    with Session(engine) as session:
+        days = rebuild_rollups(session, args.start, args.end)
+    print(f"INFO:     Rollups diarios reconstruidos ({days} días).")
+    # rebuild_rollups sube report_cache_version: no hace falta reiniciar la app
+    print(f"INFO:     Los workers descartarán sus reportes cacheados en menos de {REPORT_CACHE_VERSION_CHECK_SECONDS:g}s.")
+
+def _export_columnar(args):
+    with Session(engine) as session:
+        written = export_columnar(session, args.start, args.end, args.format, args.output)
+    for name, info in written.items():
+        print(f"INFO:     {name}: {info['rows']} filas -> {info['path']}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="FavoredCoffee.manage")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    schema = commands.add_parser("upgrade-schema", help="Crea tablas, columnas e índices nuevos en una BD existente")
+    schema.set_defaults(handler=_upgrade_schema)
+
+    rollups = commands.add_parser("rebuild-rollups", help="Recalcula los rollups diarios de ventas")
+    rollups.add_argument("--start", type=date.fromisoformat, help="Primer día local (inclusive)")
+    rollups.add_argument("--end", type=date.fromisoformat, help="Último día local (inclusive)")
+    rollups.set_defaults(handler=_rebuild_rollups)
+
+    columnar = commands.add_parser("export-columnar", help="Exporta orders, order_items y products a Parquet/Arrow")
+    columnar.add_argument("--start", type=date.fromisoformat, required=True, help="Primer día local (inclusive)")
+    columnar.add_argument("--end", type=date.fromisoformat, required=True, help="Último día local (inclusive)")
+    columnar.add_argument("--format", choices=list(COLUMNAR_FORMATS), default="parquet")
+    columnar.add_argument("--output", default="export", help="Directorio de salida")
+    columnar.set_defaults(handler=_export_columnar)
+
+    args = parser.parse_args(argv)
+    args.handler(args)
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
-from datetime import datetime
+from datetime import datetime, date
 from typing import Optional, List
 from sqlmodel import Field, SQLModel, Relationship
+from sqlalchemy import Index
 from pydantic import BaseModel, EmailStr
 import reflex as rx  # Importamos Reflex para los modelos visuales
 
@@ -19,6 +20,11 @@ class BusinessSettings(SQLModel, table=True):
     tax_rate: float = Field(default=12.0)
     currency_symbol: str = Field(default="$")
     low_stock_threshold: int = Field(default=10)
+    # Se incrementa en cada cambio; los workers lo comparan para refrescar su caché
+    version: int = Field(default=0)
+    # Se incrementa al reconstruir rollups o vaciar el caché de reportes: cada
+    # worker lo compara y vacía su caché en memoria
+    report_cache_version: int = Field(default=0)
 
 class User(SQLModel, table=True):
     """Usuario del sistema (Login y relaciones)."""
@@ -28,6 +34,8 @@ class User(SQLModel, table=True):
     full_name: Optional[str] = None
     role: str = Field(default="Vendedor") # Admin, Vendedor, Bodeguero
     is_active: bool = Field(default=True)
+    # Se incrementa al cambiar rol o estado: invalida tokens y caché de sesión
+    token_version: int = Field(default=0)
     
     # Relaciones
     orders: List["Order"] = Relationship(back_populates="user")
@@ -47,6 +55,9 @@ class Product(SQLModel, table=True):
 
 class Order(SQLModel, table=True):
     """Cabecera de las órdenes de venta."""
+    # Paginación por cursor (created_at, id) en los reportes detallados
+    __table_args__ = (Index("ix_order_created_at_id", "created_at", "id"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     created_at: datetime = Field(default_factory=datetime.utcnow)
     status: str = Field(default="Pagada") # Pagada, Cancelada
@@ -74,6 +85,109 @@ class OrderItem(SQLModel, table=True):
     product_id: Optional[int] = Field(default=None, foreign_key="product.id")
     product: Optional[Product] = Relationship(back_populates="order_items")
 
+class RefreshToken(SQLModel, table=True):
+    """Refresh token rotativo. Solo se guarda el hash SHA-256 del token."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    token_hash: str = Field(unique=True, index=True)
+    user_id: int = Field(foreign_key="user.id", index=True)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    expires_at: datetime = Field(index=True)
+    revoked_at: Optional[datetime] = None
+    replaced_by_id: Optional[int] = None # Token emitido al rotar este
+
+class StockMovement(SQLModel, table=True):
+    """
+    Movimiento de stock (solo se agregan filas). Con STOCK_LEDGER=1 las
+    órdenes escriben aquí en vez de actualizar Product.stock; un proceso
+    en segundo plano consolida los movimientos y los borra, así que la
+    tabla solo guarda lo pendiente.
+    """
+    # Todas las filas son pendientes (se borran al consolidar): basta un índice por producto
+    __table_args__ = (Index("ix_stockmovement_pending_product", "product_id"),)
+    id: Optional[int] = Field(default=None, primary_key=True)
+    product_id: int = Field(foreign_key="product.id")
+    delta: int # Negativo para ventas
+    order_id: Optional[int] = Field(default=None, foreign_key="order.id")
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class IdempotencyKey(SQLModel, table=True):
+    """Respuesta guardada de una orden creada con cabecera Idempotency-Key."""
+    key: str = Field(primary_key=True, max_length=255)
+    user_id: int = Field(foreign_key="user.id")
+    response_json: str # OrderResponse serializado
+    request_hash: str = Field(max_length=64) # SHA-256 del cuerpo de la orden
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    expires_at: datetime = Field(index=True)
+
+class ReportJob(SQLModel, table=True):
+    """Reporte pesado calculado en segundo plano; el resultado queda en disco."""
+    __tablename__ = "report_job"
+    id: str = Field(primary_key=True, max_length=36) # uuid4
+    kind: str = Field(default="sales_report")
+    params_json: str # Parámetros del reporte serializados
+    status: str = Field(default="Pendiente", index=True) # Pendiente, En proceso, Completado, Fallido
+    progress: int = Field(default=0) # 0-100
+    result_path: Optional[str] = None
+    error: Optional[str] = None
+    user_id: int = Field(foreign_key="user.id")
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+class DailySalesRollup(SQLModel, table=True):
+    """Totales de ventas pagadas por día de negocio (fecha local en TIMEZONE)."""
+    __tablename__ = "daily_sales_rollup"
+    business_date: date = Field(primary_key=True)
+    total_sales: float = Field(default=0.0)
+    order_count: int = Field(default=0)
+
+class HourlySalesRollup(SQLModel, table=True):
+    """Totales de ventas pagadas por día de negocio y hora local (0-23)."""
+    __tablename__ = "hourly_sales_rollup"
+    business_date: date = Field(primary_key=True)
+    hour: int = Field(primary_key=True)
+    total_sales: float = Field(default=0.0)
+    order_count: int = Field(default=0)
+
+class DailyProductRollup(SQLModel, table=True):
+    """Unidades vendidas por producto y día de negocio."""
+    __tablename__ = "daily_product_rollup"
+    business_date: date = Field(primary_key=True)
+    product_id: int = Field(primary_key=True, foreign_key="product.id")
+    units: int = Field(default=0)
+
+class DailyCategoryRollup(SQLModel, table=True):
+    """Unidades vendidas por categoría y día de negocio."""
+    __tablename__ = "daily_category_rollup"
+    business_date: date = Field(primary_key=True)
+    category: str = Field(primary_key=True)
+    units: int = Field(default=0)
+
+class WeeklySalesRollup(SQLModel, table=True):
+    """Contadores de ventas pagadas por semana (lunes local). Los lee el dashboard."""
+    __tablename__ = "weekly_sales_rollup"
+    week_start: date = Field(primary_key=True)
+    total_sales: float = Field(default=0.0)
+    order_count: int = Field(default=0)
+
+class WeeklyProductRollup(SQLModel, table=True):
+    """Unidades vendidas por producto y semana (lunes local)."""
+    __tablename__ = "weekly_product_rollup"
+    week_start: date = Field(primary_key=True)
+    product_id: int = Field(primary_key=True, foreign_key="product.id")
+    units: int = Field(default=0)
+
+class RollupPending(SQLModel, table=True):
+    """
+    Orden que todavía no se sumó a los rollups (sign=-1: se resta). La
+    transacción de la orden solo agrega esta fila; compact_rollups la
+    consolida en segundo plano y la borra.
+    """
+    __tablename__ = "rollup_pending"
+    id: Optional[int] = Field(default=None, primary_key=True)
+    order_id: int = Field(foreign_key="order.id", index=True)
+    sign: int = Field(default=1)
+
 
 # ==========================================
 # 2. MODELOS DE UI / LÓGICA (FRONTEND)
@@ -126,6 +240,7 @@ class SalesReport(rx.Model):
     """Estructura completa del reporte de ventas."""
     start_date: str=""
     end_date: str=""
+    granularity: str = "week"
     total_revenue: float = 0.0
     total_orders: int = 0
     average_ticket: float = 0.0
@@ -134,9 +249,6 @@ class SalesReport(rx.Model):
     top_products: List[ReportItem] = []
     sales_by_category: List[ReportItem] = []
     sales_over_time: List[SalesTimePoint] = []
-    
-    # Tabla de detalles
-    detailed_sales: List[OrderDetail] = []
 
 class SettingsModel(rx.Model):
     """Modelo de configuración utilizado por el estado del POS."""
@@ -26,7 +26,16 @@ def stat_card(title: str, value: str, icon: str, color: str) -> rx.Component:
 
 def dashboard_content() -> rx.Component:
     return rx.vstack(
-        rx.heading("Resumen General", size="7", margin_bottom="0.5em"),
+        rx.hstack(
+            rx.heading("Resumen General", size="7"),
+            rx.cond(
+                DashboardState.live,
+                rx.badge(rx.icon("radio", size=14), "En vivo", color_scheme="green", variant="soft"),
+            ),
+            align="center",
+            spacing="3",
+            margin_bottom="0.5em"
+        ),
         
         # Grid de KPIs
         rx.grid(
@@ -61,6 +61,23 @@ def cart_item(item: rx.Var) -> rx.Component:
         border_bottom="1px solid #eee"
     )
 
+def rejected_order_row(order) -> rx.Component:
+    """Venta rechazada: solo un admin puede reintentarla o descartarla."""
+    return rx.hstack(
+        rx.text(f"#{order['number']} · {order['created_at']} · ${order['total']} · {order['reason']}", size="1"),
+        rx.spacer(),
+        rx.cond(
+            POSState.is_admin,
+            rx.hstack(
+                rx.button("Reintentar", size="1", variant="soft", on_click=POSState.retry_rejected_order(order["key"])),
+                rx.button("Descartar", size="1", variant="soft", color_scheme="red", on_click=POSState.discard_rejected_order(order["key"])),
+                spacing="1"
+            ),
+        ),
+        width="100%",
+        align="center"
+    )
+
 def pos_content() -> rx.Component:
     return rx.grid(
         # --- COLUMNA IZQUIERDA: Productos ---
@@ -134,6 +151,40 @@ def pos_content() -> rx.Component:
                     color_scheme="green",
                     on_click=POSState.process_payment
                 ),
+                # Recibo provisional y ventas pendientes de sincronizar
+                rx.cond(
+                    POSState.last_receipt.contains("number"),
+                    rx.callout(
+                        f"Recibo provisional #{POSState.last_receipt['number']} · "
+                        f"${POSState.last_receipt['total']} · {POSState.last_receipt['items_summary']}",
+                        icon="receipt",
+                        size="1",
+                        width="100%"
+                    ),
+                ),
+                rx.cond(
+                    POSState.pending_orders_count > 0,
+                    rx.badge(
+                        f"{POSState.pending_orders_count} venta(s) pendiente(s) de sincronizar",
+                        color_scheme="orange",
+                        width="100%"
+                    ),
+                ),
+                rx.cond(
+                    POSState.rejected_orders.length() > 0,
+                    rx.callout(
+                        rx.vstack(
+                            rx.text("Ventas cobradas rechazadas por el servidor", weight="bold"),
+                            rx.foreach(POSState.rejected_orders, rejected_order_row),
+                            spacing="2",
+                            width="100%"
+                        ),
+                        icon="triangle_alert",
+                        color_scheme="red",
+                        size="1",
+                        width="100%"
+                    ),
+                ),
                 spacing="4",
                 height="100%",
                 justify="between"
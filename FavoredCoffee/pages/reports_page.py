@@ -23,6 +23,67 @@ def summary_card(title: str, value: str, icon: str, color: str) -> rx.Component:
         size="2"
     )
 
+def sale_row(order) -> rx.Component:
+    return rx.table.row(
+        rx.table.cell(f"#{order.id}"),
+        rx.table.cell(order.created_at),
+        rx.table.cell(order.user_name),
+        rx.table.cell(order.items_summary),
+        rx.table.cell(f"${order.total_amount:,.2f}"),
+    )
+
+def heatmap_cell(cell) -> rx.Component:
+    return rx.box(
+        rx.text(cell["text"], size="1", color_scheme="gray"),
+        background=cell["bg"],
+        title=cell["title"],
+        min_height="22px",
+        border_radius="3px",
+        display="flex",
+        align_items="center",
+        justify_content="center",
+    )
+
+def sales_heatmap() -> rx.Component:
+    return rx.card(
+        rx.heading("Horas Pico (ventas por día y hora)", size="4", margin_bottom="1em"),
+        rx.grid(
+            rx.foreach(ReportsState.heatmap_cells, heatmap_cell),
+            columns="25", spacing="1", width="100%"
+        ),
+        width="100%"
+    )
+
+def detailed_sales_table() -> rx.Component:
+    return rx.card(
+        rx.heading("Detalle de Ventas", size="4", margin_bottom="1em"),
+        rx.table.root(
+            rx.table.header(
+                rx.table.row(
+                    rx.table.column_header_cell("Orden"),
+                    rx.table.column_header_cell("Fecha"),
+                    rx.table.column_header_cell("Cajero"),
+                    rx.table.column_header_cell("Productos"),
+                    rx.table.column_header_cell("Total"),
+                )
+            ),
+            rx.table.body(rx.foreach(ReportsState.detailed_sales, sale_row)),
+            width="100%"
+        ),
+        rx.cond(
+            ReportsState.has_more_sales,
+            rx.center(
+                rx.button(
+                    "Cargar más",
+                    on_click=ReportsState.load_more_sales,
+                    variant="soft"
+                ),
+                margin_top="1em"
+            )
+        ),
+        width="100%"
+    )
+
 def reports_content() -> rx.Component:
     return rx.vstack(
         rx.heading("Reportes y Estadísticas", size="7"),
@@ -40,6 +101,22 @@ def reports_content() -> rx.Component:
                     rx.input(type="date", value=ReportsState.end_date, on_change=ReportsState.set_end_date),
                     align="start", spacing="1"
                 ),
+                rx.vstack(
+                    rx.text("Agrupar por", size="1", weight="bold"),
+                    rx.select.root(
+                        rx.select.trigger(),
+                        rx.select.content(
+                            rx.select.item("Automático", value="auto"),
+                            rx.select.item("Hora", value="hour"),
+                            rx.select.item("Día", value="day"),
+                            rx.select.item("Semana", value="week"),
+                            rx.select.item("Mes", value="month"),
+                        ),
+                        value=ReportsState.granularity,
+                        on_change=ReportsState.set_granularity,
+                    ),
+                    align="start", spacing="1"
+                ),
                 rx.spacer(),
                 rx.button("Generar Reporte", on_click=ReportsState.get_report, size="3", variant="solid"),
                 align="end", width="100%", spacing="4"
@@ -47,60 +124,88 @@ def reports_content() -> rx.Component:
             width="100%"
         ),
 
-        # --- KPIs ---
-        rx.grid(
-            summary_card("Ingresos Totales", f"${ReportsState.report.total_revenue:,.2f}", "dollar-sign", "#6A3587"),
-            summary_card("Total Órdenes", f"{ReportsState.report.total_orders}", "shopping-bag", "#D94A8A"),
-            summary_card("Ticket Promedio", f"${ReportsState.report.average_ticket:,.2f}", "bar-chart-2", "#EB7A74"),
-            columns="3", spacing="4", width="100%"
+        # --- Avance del job (rangos largos) ---
+        rx.cond(
+            ReportsState.job_id != "",
+            rx.card(
+                rx.hstack(
+                    rx.spinner(),
+                    rx.text(f"Calculando reporte ({ReportsState.job_status})...", size="2"),
+                    rx.spacer(),
+                    rx.text(f"{ReportsState.job_progress}%", size="2", weight="bold"),
+                    align="center", width="100%"
+                ),
+                rx.progress(value=ReportsState.job_progress, margin_top="0.5em"),
+                width="100%"
+            )
+        ),
+
+        # --- KPIs (ocultos mientras el job calcula: la tarjeta de avance hace de placeholder) ---
+        rx.cond(
+            ReportsState.job_id == "",
+            rx.grid(
+                summary_card("Ingresos Totales", f"${ReportsState.report.total_revenue:,.2f}", "dollar-sign", "#6A3587"),
+                summary_card("Total Órdenes", f"{ReportsState.report.total_orders}", "shopping-bag", "#D94A8A"),
+                summary_card("Ticket Promedio", f"${ReportsState.report.average_ticket:,.2f}", "bar-chart-2", "#EB7A74"),
+                columns="3", spacing="4", width="100%"
+            )
         ),
 
         # --- Gráficos ---
-        rx.grid(
-            # Gráfico 1: Ventas en el Tiempo
-            rx.card(
-                rx.heading("Ventas en el Tiempo", size="4", margin_bottom="1em"),
-                rx.recharts.area_chart(
-                    rx.recharts.area(
-                        data_key="total_sales",
-                        stroke="#6A3587",
-                        fill="#6A3587",
-                        fill_opacity=0.3
+        rx.cond(
+            ReportsState.job_id == "",
+            rx.grid(
+                # Gráfico 1: Ventas en el Tiempo
+                rx.card(
+                    rx.heading("Ventas en el Tiempo", size="4", margin_bottom="1em"),
+                    rx.recharts.area_chart(
+                        rx.recharts.area(
+                            data_key="total_sales",
+                            stroke="#6A3587",
+                            fill="#6A3587",
+                            fill_opacity=0.3
+                        ),
+                        rx.recharts.x_axis(data_key="period"),
+                        rx.recharts.y_axis(),
+                        rx.recharts.cartesian_grid(stroke_dasharray="3 3"),
+                        rx.recharts.tooltip(),
+                        # 👇 EL CAMBIO CLAVE: Usamos la variable computada
+                        data=ReportsState.sales_chart_data, 
+                        height=300,
+                        width="100%"
                     ),
-                    rx.recharts.x_axis(data_key="period"),
-                    rx.recharts.y_axis(),
-                    rx.recharts.cartesian_grid(stroke_dasharray="3 3"),
-                    rx.recharts.tooltip(),
-                    # 👇 EL CAMBIO CLAVE: Usamos la variable computada
-                    data=ReportsState.sales_chart_data, 
-                    height=300,
                     width="100%"
                 ),
-                width="100%"
-            ),
             
-            # Gráfico 2: Top Productos
-            rx.card(
-                rx.heading("Top Productos", size="4", margin_bottom="1em"),
-                rx.recharts.bar_chart(
-                    rx.recharts.bar(
-                        data_key="units",
-                        stroke="#D94A8A",
-                        fill="#D94A8A",
+                # Gráfico 2: Top Productos
+                rx.card(
+                    rx.heading("Top Productos", size="4", margin_bottom="1em"),
+                    rx.recharts.bar_chart(
+                        rx.recharts.bar(
+                            data_key="units",
+                            stroke="#D94A8A",
+                            fill="#D94A8A",
+                        ),
+                        rx.recharts.x_axis(data_key="name"),
+                        rx.recharts.y_axis(),
+                        rx.recharts.cartesian_grid(stroke_dasharray="3 3"),
+                        rx.recharts.tooltip(),
+                        # 👇 EL CAMBIO CLAVE: Usamos la variable computada
+                        data=ReportsState.top_products_chart_data,
+                        height=300,
+                        width="100%"
                     ),
-                    rx.recharts.x_axis(data_key="name"),
-                    rx.recharts.y_axis(),
-                    rx.recharts.cartesian_grid(stroke_dasharray="3 3"),
-                    rx.recharts.tooltip(),
-                    # 👇 EL CAMBIO CLAVE: Usamos la variable computada
-                    data=ReportsState.top_products_chart_data,
-                    height=300,
                     width="100%"
                 ),
-                width="100%"
-            ),
-            columns="2", spacing="4", width="100%"
+                columns="2", spacing="4", width="100%"
+            )
         ),
+
+        # --- Mapa de calor ---
+        sales_heatmap(),
+
+        # --- Detalle (paginado) ---
+        detailed_sales_table(),
         spacing="5", width="100%", align="start"
     )
 
@@ -1,27 +1,37 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlmodel import Session, select
-from ..database import get_session
+from ..database import get_db, run_db
 from ..models import User
-from ..schemas import Token, User as UserSchema
+from ..logic.logic_users import get_user_by_email
+from ..logic import logic_auth
+from ..schemas import Token, RefreshRequest, User as UserSchema
 from ..security import (
-    create_access_token, verify_password, get_current_user
+    create_access_token, verify_password_async, get_current_user, get_current_admin_user
 )
+from ..throttling import check_login_rate, get_login_throttle_metrics
 from typing import Annotated
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
 
+def _access_token_for(user: User) -> str:
+    return create_access_token(
+        data={"sub": user.email, "role": user.role, "ver": user.token_version} # <-- "sub" es el email
+    )
+
 @router.post("/login", response_model=Token)
 async def login_for_access_token(
+    request: Request,
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
-    session: Session = Depends(get_session)
+    session = Depends(get_db)
 ):
+    # Límite por email e IP: se rechaza antes de tocar la BD o bcrypt
+    check_login_rate(request, form_data.username)
+
     # Nota: form_data.username contendrá el EMAIL enviado por el frontend
-    user = session.exec(
-        select(User).where(User.email == form_data.username)
-    ).first()
+    user = await run_db(session, get_user_by_email, form_data.username)
     
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    # bcrypt corre en un pool de hilos: el resto de peticiones sigue respondiendo
+    if not user or not await verify_password_async(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Email o contraseña incorrectos",
@@ -30,13 +40,45 @@ async def login_for_access_token(
     if not user.is_active:
         raise HTTPException(status_code=400, detail="Usuario inactivo")
         
-    access_token = create_access_token(
-        data={"sub": user.email, "role": user.role} # <-- "sub" es el email
-    )
-    return {"access_token": access_token, "token_type": "bearer"}
+    refresh_token = await run_db(session, logic_auth.issue_refresh_token, user)
+    return {
+        "access_token": _access_token_for(user),
+        "token_type": "bearer",
+        "refresh_token": refresh_token
+    }
+
+@router.post("/refresh", response_model=Token)
+async def refresh_access_token(
+    body: RefreshRequest,
+    session = Depends(get_db)
+):
+    """
+    Emite un access token nuevo y rota el refresh token.
+    Solo cuesta una búsqueda por índice: nunca se vuelve a calcular bcrypt.
+    """
+    user, refresh_token = await run_db(session, logic_auth.rotate_refresh_token, body.refresh_token)
+    return {
+        "access_token": _access_token_for(user),
+        "token_type": "bearer",
+        "refresh_token": refresh_token
+    }
+
+@router.post("/logout")
+async def logout(
+    body: RefreshRequest,
+    session = Depends(get_db)
+):
+    """Revoca el refresh token de la sesión."""
+    await run_db(session, logic_auth.revoke_refresh_token, body.refresh_token)
+    return {"status": "success"}
 
 @router.get("/me", response_model=UserSchema)
 async def read_users_me(
     current_user: Annotated[User, Depends(get_current_user)]
 ):
-    return current_user
\ No newline at end of file
+    return current_user
+
+@router.get("/throttle/metrics", dependencies=[Depends(get_current_admin_user)])
+async def read_login_throttle_metrics():
+    """Rechazos y ocupación de los buckets de login (solo Admins)."""
+    return get_login_throttle_metrics()
@@ -1,6 +1,5 @@
 from fastapi import APIRouter, Depends
-from sqlmodel import Session
-from ..database import get_session
+from ..database import get_db, run_db
 from ..security import get_current_admin_user
 from ..logic import logic_dashboard
 
@@ -11,9 +10,9 @@ router = APIRouter(
 )
 
 @router.get("/stats")
-def get_dashboard_statistics(db: Session = Depends(get_session)):
+async def get_dashboard_statistics(db = Depends(get_db)):
     """
     Endpoint para el Dashboard Principal.
     Calcula ventas, órdenes, % de cambio, stock bajo y top productos.
     """
-    return logic_dashboard.get_dashboard_stats(db)
\ No newline at end of file
+    return await run_db(db, logic_dashboard.get_dashboard_stats)
\ No newline at end of file
@@ -1,7 +1,6 @@
 from fastapi import APIRouter, Depends, File, UploadFile, HTTPException
-from sqlmodel import Session
 
-from ..database import get_session
+from ..database import run_in_sync_session
 from ..security import get_current_warehouse_user # <-- Rol de Bodeguero
 from ..schemas import InventoryUploadResponse
 from ..logic.logic_inventory import process_inventory_file
@@ -15,8 +14,7 @@ router = APIRouter(
 
 @router.post("/upload", response_model=InventoryUploadResponse)
 async def upload_inventory_file(
-    file: UploadFile = File(...),
-    session: Session = Depends(get_session)
+    file: UploadFile = File(...)
 ):
     """
     Endpoint para carga masiva de inventario (CSV o Excel).
@@ -26,8 +24,9 @@ async def upload_inventory_file(
 
     file_content = await file.read()
     
-    result = process_inventory_file(
-        db=session, 
+    # Leer el Excel/CSV es trabajo de CPU: va al threadpool con su propia sesión
+    result = await run_in_sync_session(
+        process_inventory_file,
         file_content=file_content, 
         file_type=file.content_type
     )
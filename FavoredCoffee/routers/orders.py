@@ -1,12 +1,12 @@
-from typing import Annotated
-from fastapi import APIRouter, Depends
-from sqlmodel import Session
+from typing import Annotated, List, Optional
+from fastapi import APIRouter, Depends, Header
 
-from ..database import get_session
-from ..security import get_current_seller_user # <-- Usamos el rol de Vendedor
-from ..schemas import OrderRequest, OrderResponse
+from ..database import get_db, run_db
+from ..security import get_current_seller_user, get_current_admin_user # <-- Usamos el rol de Vendedor
+from ..schemas import OrderRequest, OrderResponse, OrderBatchResult
 from ..models import User
-from ..logic.logic_orders import create_new_order
+from ..logic.logic_orders import create_new_order, create_orders_batch
+from ..logic.logic_group_commit import ORDER_GROUP_COMMIT, group_commit_writer
 
 router = APIRouter(
     prefix="/orders",
@@ -14,22 +14,52 @@ router = APIRouter(
 )
 
 @router.post("/create", response_model=OrderResponse)
-def create_order(
+async def create_order(
     order_request: OrderRequest,
     # Cambiamos get_current_active_user por get_current_seller_user
     # Esto permite que tanto Vendedores como Admins creen órdenes
     current_user: Annotated[User, Depends(get_current_seller_user)],
-    session: Session = Depends(get_session)
+    session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(default=None, max_length=255)
 ):
     """
     Crea una nueva orden. Accesible por Vendedores y Admins.
+    Con la cabecera Idempotency-Key, un reintento devuelve la misma orden.
     """
-    new_order = create_new_order(
-        db=session, 
+    if ORDER_GROUP_COMMIT:
+        # Modo group commit: la orden se confirma junto con las concurrentes
+        return await group_commit_writer.submit_async(order_request, current_user, idempotency_key)
+
+    new_order = await run_db(
+        session,
+        create_new_order,
         order_request=order_request, 
-        user=current_user
+        user=current_user,
+        idempotency_key=idempotency_key
     )
     return new_order
 
+@router.post("/batch", response_model=List[OrderBatchResult])
+async def create_orders_in_batch(
+    order_requests: List[OrderRequest],
+    current_user: Annotated[User, Depends(get_current_seller_user)],
+    session = Depends(get_db)
+):
+    """
+    Crea varias órdenes en una sola transacción (sincronización de terminales).
+    Devuelve un resultado por orden, en el mismo orden del lote.
+    """
+    return await run_db(
+        session,
+        create_orders_batch,
+        order_requests=order_requests,
+        user=current_user
+    )
+
+@router.get("/group-commit/metrics", dependencies=[Depends(get_current_admin_user)])
+async def read_group_commit_metrics():
+    """Tamaño y latencia de los lotes del modo group commit (solo Admins)."""
+    return group_commit_writer.get_metrics()
+
 # Nota: El endpoint de daily_summary se movió a routers/dashboard.py y routers/reports.py
 # por lo que ya no es necesario aquí.
\ No newline at end of file
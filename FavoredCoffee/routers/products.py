@@ -1,10 +1,9 @@
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import Session, select
-from ..database import get_session
+from fastapi import APIRouter, Depends
+from ..database import get_db, run_db
 from ..security import get_current_warehouse_user, get_current_admin_user
-from ..models import Product
 from ..schemas import Product as ProductSchema, ProductCreate
+from ..logic import logic_products
 
 router = APIRouter(
     prefix="/products",
@@ -14,21 +13,13 @@ router = APIRouter(
 )
 
 @router.post("/", response_model=ProductSchema, status_code=201, dependencies=[Depends(get_current_admin_user)])
-def create_product(product_data: ProductCreate, db: Session = Depends(get_session)):
+async def create_product(product_data: ProductCreate, db = Depends(get_db)):
     # Solo Admins pueden crear
-    db_product = db.exec(select(Product).where(Product.sku == product_data.sku)).first()
-    if db_product:
-        raise HTTPException(status_code=400, detail="SKU ya registrado")
-    
-    new_product = Product.from_orm(product_data)
-    db.add(new_product)
-    db.commit()
-    db.refresh(new_product)
-    return new_product
+    return await run_db(db, logic_products.create_product, product_data)
 
 @router.get("/", response_model=List[ProductSchema])
-def read_products(db: Session = Depends(get_session)):
+async def read_products(db = Depends(get_db)):
     # Bodegueros y Admins pueden leer
-    return db.exec(select(Product)).all()
+    return await run_db(db, logic_products.get_products)
 
-# ... (Aquí irían los endpoints PUT /{id} y DELETE /{id} para Admins) ...
\ No newline at end of file
+# ... (Aquí irían los endpoints PUT /{id} y DELETE /{id} para Admins) ...
@@ -1,9 +1,14 @@
 from fastapi import APIRouter, Depends, Query
-from sqlmodel import Session
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.background import BackgroundTask
+import shutil
 from datetime import date
-from ..database import get_session
+from typing import Literal, Optional
+from ..database import get_db, run_db, run_in_sync_session
 from ..security import get_current_admin_user
-from ..logic import logic_reports
+from ..models import User
+from ..logic import logic_reports, logic_report_cache, logic_columnar, logic_report_jobs
+from ..schemas import SalesReport, SalesHeatmap, DetailedSalesPage, ReportJobRequest, ReportJobStatus
 
 router = APIRouter(
     prefix="/reports",
@@ -11,14 +16,110 @@ router = APIRouter(
     dependencies=[Depends(get_current_admin_user)] # Protegido
 )
 
-@router.get("/sales")
-def get_sales_report(
-    db: Session = Depends(get_session),
+@router.get("/sales", response_model=SalesReport)
+async def get_sales_report(
+    db = Depends(get_db),
     start_date: date = Query(..., description="Fecha de inicio (YYYY-MM-DD)"),
-    end_date: date = Query(..., description="Fecha de fin (YYYY-MM-DD)")
+    end_date: date = Query(..., description="Fecha de fin (YYYY-MM-DD)"),
+    granularity: Literal["auto", "hour", "day", "week", "month"] = Query(
+        "week", description="Bucket de sales_over_time ('auto' según el largo del rango)"
+    )
 ):
     """
     Endpoint principal de Reportes.
     Genera un reporte completo de ventas basado en un rango de fechas.
     """
-    return logic_reports.get_sales_report(db, start_date, end_date)
\ No newline at end of file
+    return await run_db(db, logic_reports.get_sales_report, start_date, end_date, granularity)
+
+@router.get("/heatmap", response_model=SalesHeatmap)
+async def get_sales_heatmap(
+    db = Depends(get_db),
+    start_date: date = Query(..., description="Fecha de inicio (YYYY-MM-DD)"),
+    end_date: date = Query(..., description="Fecha de fin (YYYY-MM-DD)")
+):
+    """Ingresos y órdenes por día de la semana y hora local (matriz 7x24)."""
+    return await run_db(db, logic_reports.get_sales_heatmap, start_date, end_date)
+
+@router.get("/sales/detail", response_model=DetailedSalesPage)
+async def get_detailed_sales(
+    db = Depends(get_db),
+    start_date: date = Query(..., description="Fecha de inicio (YYYY-MM-DD)"),
+    end_date: date = Query(..., description="Fecha de fin (YYYY-MM-DD)"),
+    cursor: Optional[str] = Query(None, description="Cursor devuelto por la página anterior"),
+    limit: int = Query(50, ge=1, le=logic_reports.DETAILED_SALES_MAX_LIMIT)
+):
+    """
+    Detalle de ventas paginado por cursor.
+    Usa `next_cursor` de la respuesta para pedir la página siguiente.
+    """
+    return await run_db(db, logic_reports.get_detailed_sales, start_date, end_date, cursor, limit)
+
+@router.get("/sales/export")
+async def export_sales(
+    start_date: date = Query(..., description="Fecha de inicio (YYYY-MM-DD)"),
+    end_date: date = Query(..., description="Fecha de fin (YYYY-MM-DD)"),
+    export_format: Literal["csv", "ndjson"] = Query("csv", alias="format")
+):
+    """
+    Exporta las ventas del rango (una fila por item) en streaming.
+    La memoria no crece con el rango: las filas salen del cursor por bloques.
+    """
+    logic_reports._utc_range(start_date, end_date) # Valida antes de empezar a responder
+    media_type = "text/csv" if export_format == "csv" else "application/x-ndjson"
+    filename = f"ventas_{start_date.isoformat()}_{end_date.isoformat()}.{export_format}"
+    return StreamingResponse(
+        logic_reports.stream_sales_export(start_date, end_date, export_format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.get("/export/columnar")
+async def export_columnar(
+    start_date: date = Query(..., description="Fecha de inicio (YYYY-MM-DD)"),
+    end_date: date = Query(..., description="Fecha de fin (YYYY-MM-DD)"),
+    export_format: Literal["parquet", "arrow"] = Query("parquet", alias="format")
+):
+    """
+    Extracto columnar (orders, order_items, products) en un zip de Parquet o Arrow IPC.
+    Para extractos grandes conviene el comando `python -m FavoredCoffee.manage export-columnar`.
+    """
+    zip_path, work_dir = await run_in_sync_session(
+        logic_columnar.export_columnar_zip, start_date, end_date, export_format
+    )
+    return FileResponse(
+        zip_path,
+        media_type="application/zip",
+        filename=f"ventas_{start_date.isoformat()}_{end_date.isoformat()}_{export_format}.zip",
+        background=BackgroundTask(shutil.rmtree, work_dir, ignore_errors=True)
+    )
+
+@router.post("/jobs", response_model=ReportJobStatus, status_code=202)
+async def create_report_job(
+    request: ReportJobRequest,
+    db = Depends(get_db),
+    current_user: User = Depends(get_current_admin_user)
+):
+    """
+    Encola un reporte de ventas largo (p. ej. varios años) y responde de inmediato.
+    Consultar el avance y el resultado con GET /reports/jobs/{id}.
+    """
+    job = await run_db(db, logic_report_jobs.enqueue_report_job, request, current_user)
+    return ReportJobStatus(id=job.id, status=job.status, progress=job.progress, created_at=job.created_at)
+
+@router.get("/jobs/{job_id}", response_model=ReportJobStatus)
+async def read_report_job(job_id: str, db = Depends(get_db)):
+    """Estado y avance del job; incluye el reporte cuando está Completado."""
+    return await run_db(db, logic_report_jobs.get_report_job, job_id)
+
+@router.get("/cache/metrics")
+async def read_report_cache_metrics():
+    """Aciertos, fallos y ocupación del caché de reportes."""
+    return logic_report_cache.get_report_cache_metrics()
+
+@router.delete("/cache")
+async def purge_report_cache(db = Depends(get_db)):
+    """
+    Vacía el caché de reportes (p. ej. tras corregir órdenes de días pasados).
+    Este worker lo vacía ya; los demás, en su próxima verificación de versión.
+    """
+    return {"purged": await run_db(db, logic_report_cache.purge_all_report_caches)}
@@ -1,6 +1,5 @@
 from fastapi import APIRouter, Depends
-from sqlmodel import Session
-from ..database import get_session
+from ..database import get_db, run_db
 from ..security import get_current_admin_user
 from ..schemas import SettingsSchema
 from ..logic import logic_settings
@@ -12,9 +11,9 @@ router = APIRouter(
 )
 
 @router.get("/", response_model=SettingsSchema)
-def read_settings(db: Session = Depends(get_session)):
-    return logic_settings.get_settings(db)
+async def read_settings(db = Depends(get_db)):
+    return await run_db(db, logic_settings.get_settings)
 
 @router.put("/", response_model=SettingsSchema)
-def write_settings(settings_data: SettingsSchema, db: Session = Depends(get_session)):
-    return logic_settings.update_settings(db=db, settings_data=settings_data)
\ No newline at end of file
+async def write_settings(settings_data: SettingsSchema, db = Depends(get_db)):
+    return await run_db(db, logic_settings.update_settings, settings_data=settings_data)
\ No newline at end of file
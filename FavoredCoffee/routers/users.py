@@ -1,8 +1,7 @@
 from typing import List
 from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import Session
-from ..database import get_session
-from ..security import get_current_admin_user
+from ..database import get_db, run_db
+from ..security import get_current_admin_user, get_password_hash_async
 from ..schemas import User as UserSchema, UserCreate, UserUpdate
 from ..logic import logic_users
 
@@ -13,16 +12,20 @@ router = APIRouter(
 )
 
 @router.post("/", response_model=UserSchema, status_code=201)
-def create_user(user_data: UserCreate, db: Session = Depends(get_session)):
-    db_user = logic_users.get_user_by_email(db, email=user_data.email)
+async def create_user(user_data: UserCreate, db = Depends(get_db)):
+    db_user = await run_db(db, logic_users.get_user_by_email, email=user_data.email)
     if db_user:
         raise HTTPException(status_code=400, detail="Email ya registrado")
-    return logic_users.create_user(db=db, user_data=user_data)
+    hashed_password = await get_password_hash_async(user_data.password)
+    return await run_db(db, logic_users.create_user, user_data=user_data, hashed_password=hashed_password)
 
 @router.get("/", response_model=List[UserSchema])
-def read_users(db: Session = Depends(get_session)):
-    return logic_users.get_users(db)
+async def read_users(db = Depends(get_db)):
+    return await run_db(db, logic_users.get_users)
 
 @router.put("/{user_id}", response_model=UserSchema)
-def update_user(user_id: int, user_data: UserUpdate, db: Session = Depends(get_session)):
-    return logic_users.update_user(db=db, user_id=user_id, user_data=user_data)
\ No newline at end of file
+async def update_user(user_id: int, user_data: UserUpdate, db = Depends(get_db)):
+    hashed_password = await get_password_hash_async(user_data.password) if user_data.password else None
+    return await run_db(
+        db, logic_users.update_user, user_id=user_id, user_data=user_data, hashed_password=hashed_password
+    )
\ No newline at end of file
@@ -1,11 +1,15 @@
 from pydantic import BaseModel, Field, EmailStr
-from typing import List, Optional
+from typing import List, Literal, Optional
 from datetime import datetime, date
 
 # --- Schemas de Autenticación ---
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 class TokenData(BaseModel):
     email: Optional[str] = None
@@ -71,6 +75,9 @@ class OrderItemRequest(BaseModel):
 class OrderRequest(BaseModel):
     items: List[OrderItemRequest]
     payment_method: str = Field(default="Efectivo")
+    # Hora real de una venta encolada sin conexión (con zona; sin zona se toma UTC).
+    # Se acepta dentro de ORDER_MAX_BACKDATE_HOURS; si falta, la hora es la del servidor.
+    sold_at: Optional[datetime] = None
 
 class OrderItemResponse(BaseModel):
     product_id: int
@@ -95,6 +102,12 @@ class OrderResponse(BaseModel):
     
     class Config:
         from_attributes = True # Corrección V2
+
+class OrderBatchResult(BaseModel):
+    index: int # Posición de la orden dentro del lote
+    success: bool
+    order: Optional[OrderResponse] = None
+    detail: Optional[str] = None
         
 # --- Schemas de Dashboard ---
 class DashboardStats(BaseModel):
@@ -104,6 +117,8 @@ class DashboardStats(BaseModel):
     orders_last_week: int
     low_stock_items_count: int
     top_products: List[Product]
+    event_source: str # Proceso que respondió (ver logic_events)
+    event_seq: int # Secuencia de eventos ya incluida en estos totales
 
 # --- Schemas de Reportes ---
 class ReportItem(BaseModel):
@@ -113,10 +128,36 @@ class ReportItem(BaseModel):
 class SalesReport(BaseModel):
     start_date: str # Enviamos strings ISO para simplificar
     end_date: str
+    granularity: str # hour, day, week o month (ya resuelto si se pidió 'auto')
     total_revenue: float
     total_orders: int
     average_ticket: float
     top_products: List[ReportItem]
     sales_by_category: List[ReportItem]
     sales_over_time: List[dict] # Lista de dicts simple
-    detailed_sales: List[OrderResponse]
\ No newline at end of file
+
+class SalesHeatmap(BaseModel):
+    start_date: str
+    end_date: str
+    weekdays: List[str] # Filas: lunes..domingo
+    hours: List[int] # Columnas: 0..23 (hora local)
+    revenue: List[List[float]]
+    orders: List[List[int]]
+
+class DetailedSalesPage(BaseModel):
+    items: List[OrderResponse]
+    next_cursor: Optional[str] = None # None cuando no hay más páginas
+
+class ReportJobRequest(BaseModel):
+    start_date: date
+    end_date: date
+    granularity: Literal["auto", "hour", "day", "week", "month"] = "auto"
+
+class ReportJobStatus(BaseModel):
+    id: str
+    status: str # Pendiente, En proceso, Completado, Fallido
+    progress: int
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
+    result: Optional[SalesReport] = None # Solo cuando status == "Completado"
@@ -1,24 +1,40 @@
 
+import asyncio
 import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Annotated
+from typing import Annotated, Optional, Tuple
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from sqlmodel import Session, select
 
-from .database import get_session
+from .database import get_db, run_db
 from .models import User
 
 # --- Configuración (sin cambios) ---
 SECRET_KEY = os.environ.get("JWT_SECRET_KEY", "unaclavesecretav3-muy-dificil")
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 8
+# Access token corto; la sesión del turno se mantiene con refresh tokens rotativos
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.environ.get("ACCESS_TOKEN_EXPIRE_MINUTES", 15))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.environ.get("REFRESH_TOKEN_EXPIRE_DAYS", 7))
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
+# Pool acotado para bcrypt: el hash (~100-300 ms) nunca corre en el event loop.
+# bcrypt libera el GIL, así que los hilos trabajan en paralelo; el tamaño del
+# pool es el límite de hashes simultáneos (el resto espera en cola).
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+_password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+
+# Caché token -> usuario: evita consultar la tabla User en cada petición
+USER_CACHE_TTL_SECONDS = int(os.environ.get("USER_CACHE_TTL_SECONDS", 60))
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", 1024))
+
 # --- Funciones Hashing/JWT (sin cambios) ---
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -26,6 +42,16 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+async def verify_password_async(plain_password, hashed_password) -> bool:
+    """verify_password ejecutado en el pool de bcrypt."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_password_executor, verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password) -> str:
+    """get_password_hash ejecutado en el pool de bcrypt."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_password_executor, get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
     if expires_delta:
@@ -35,10 +61,50 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
+# --- Caché de usuarios autenticados ---
+# (email, token_version) -> (expira_en, copia del usuario sin sesión ni hash)
+_user_cache: "OrderedDict[Tuple[str, int], Tuple[float, User]]" = OrderedDict()
+_user_cache_lock = threading.Lock()
+
+def _get_cached_user(key: Tuple[str, int]) -> Optional[User]:
+    with _user_cache_lock:
+        cached = _user_cache.get(key)
+        if not cached:
+            return None
+        expires_at, user = cached
+        if expires_at <= time.monotonic():
+            del _user_cache[key]
+            return None
+        _user_cache.move_to_end(key)
+        return user
+
+def _cache_user(key: Tuple[str, int], user: User) -> User:
+    snapshot = User(
+        id=user.id,
+        email=user.email,
+        full_name=user.full_name,
+        role=user.role,
+        is_active=user.is_active,
+        token_version=user.token_version,
+        hashed_password=""
+    )
+    with _user_cache_lock:
+        _user_cache[key] = (time.monotonic() + USER_CACHE_TTL_SECONDS, snapshot)
+        _user_cache.move_to_end(key)
+        while len(_user_cache) > USER_CACHE_SIZE:
+            _user_cache.popitem(last=False)
+    return snapshot
+
+def invalidate_user_cache(email: str):
+    """Elimina de la caché todas las entradas del usuario (en este proceso)."""
+    with _user_cache_lock:
+        for key in [k for k in _user_cache if k[0] == email]:
+            del _user_cache[key]
+
 # --- Dependencia de Usuario Actual (Actualizada) ---
 async def get_current_user(
     token: Annotated[str, Depends(oauth2_scheme)],
-    session: Session = Depends(get_session)
+    session = Depends(get_db)
 ):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -48,16 +114,25 @@ async def get_current_user(
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub") # <-- Cambiado de username a email
+        token_version: int = payload.get("ver", 0)
         if email is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
     
-    user = session.exec(select(User).where(User.email == email)).first() # <-- Query por email
+    # Caso común: el usuario ya está en caché, sin ir a la base de datos
+    cache_key = (email, token_version)
+    user = _get_cached_user(cache_key)
+    if user is not None:
+        return user
+
+    # Import local: logic_users importa este módulo (hash de contraseñas, caché)
+    from .logic.logic_users import get_user_by_email
+    user = await run_db(session, get_user_by_email, email) # <-- Query por email (sin bloquear el loop)
     
-    if user is None or not user.is_active:
+    if user is None or not user.is_active or user.token_version != token_version:
         raise credentials_exception
-    return user
+    return _cache_user(cache_key, user)
 
 # --- Dependencias de Roles (Actualizadas) ---
 async def get_current_admin_user(
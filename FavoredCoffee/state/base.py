@@ -1,8 +1,11 @@
 import reflex as rx
 import httpx
-from typing import Optional, Dict, Any
+import asyncio
+import time
+from typing import Optional, Dict, Any, Tuple
 # Asegúrate de que User esté en models.py
 from ..models import User
+from ..throttling import resolve_client_ip
 from reflex.config import get_config
 
 # ======================================================
@@ -19,12 +22,62 @@ _base = config.api_url or "http://localhost:8000"
 # ⚠️ IMPORTANTE: Agregamos "/api" porque ahí montamos tu backend
 BASE_API_URL = f"{_base}/api"
 
+# Renovaciones serializadas por refresh token: las pestañas y tareas en segundo
+# plano del mismo navegador comparten el token y no deben rotarlo en paralelo.
+# Quien llega después reutiliza el resultado en vez de mandar el token viejo.
+REFRESH_RESULT_TTL_SECONDS = 30
+_refresh_locks: Dict[str, asyncio.Lock] = {}
+_recent_refreshes: Dict[str, Tuple[float, Dict[str, str]]] = {} # token viejo -> (vence, respuesta)
+
+def _fetch_recent_refresh(refresh_token: str) -> Optional[Dict[str, str]]:
+    cached = _recent_refreshes.get(refresh_token)
+    if cached is None or cached[0] < time.monotonic():
+        return None
+    return cached[1]
+
+def _remember_refresh(refresh_token: str, data: Dict[str, str]):
+    now = time.monotonic()
+    for token in [t for t, (expires, _) in _recent_refreshes.items() if expires < now]:
+        del _recent_refreshes[token]
+    _recent_refreshes[refresh_token] = (now + REFRESH_RESULT_TTL_SECONDS, data)
+
+async def _request_refresh(old_refresh_token: str) -> Optional[Dict[str, str]]:
+    """
+    POST /auth/refresh serializado por token. Devuelve la respuesta (tokens nuevos)
+    o None si no se pudo renovar. No toca el estado: sirve dentro y fuera de `async with self`.
+    """
+    if not old_refresh_token:
+        return None
+    lock = _refresh_locks.setdefault(old_refresh_token, asyncio.Lock())
+    try:
+        async with lock:
+            data = _fetch_recent_refresh(old_refresh_token)
+            if data is None:
+                try:
+                    async with httpx.AsyncClient() as client:
+                        response = await client.post(
+                            f"{BASE_API_URL}/auth/refresh",
+                            json={"refresh_token": old_refresh_token}
+                        )
+                except httpx.RequestError:
+                    return None
+                if response.status_code != 200:
+                    return None
+                data = response.json()
+                _remember_refresh(old_refresh_token, data)
+    finally:
+        if not lock.locked():
+            _refresh_locks.pop(old_refresh_token, None)
+    return data
+
 class State(rx.State):
     """
     Estado base v3. Maneja autenticación y llamadas a la API unificada.
     """
     
     token: str = rx.LocalStorage("")
+    # Renueva el access token (corto) sin volver a pedir la contraseña
+    refresh_token: str = rx.LocalStorage("")
     current_user: User = User()
     
     is_loading: bool = False
@@ -70,11 +123,13 @@ class State(rx.State):
                 
                 response = await client.post(
                     f"{BASE_API_URL}/auth/login",
-                    data=login_data 
+                    data=login_data,
+                    headers=self._get_client_ip_headers()
                 )
             
             if response.status_code == 200:
                 self.token = response.json()["access_token"]
+                self.refresh_token = response.json().get("refresh_token") or ""
                 # Obtenemos info del usuario inmediatamente
                 await self.get_user_info_from_token()
                 return rx.redirect("/") # Al Dashboard
@@ -87,11 +142,37 @@ class State(rx.State):
         finally:
             self.is_loading = False
 
-    def logout(self):
-        """Cierra la sesión localmente."""
+    async def logout(self):
+        """Cierra la sesión y revoca el refresh token en el backend."""
+        if self.refresh_token:
+            try:
+                async with httpx.AsyncClient() as client:
+                    await client.post(
+                        f"{BASE_API_URL}/auth/logout",
+                        json={"refresh_token": self.refresh_token}
+                    )
+            except httpx.RequestError:
+                pass # La sesión local se cierra igual
+        self._clear_session()
+        return rx.redirect("/")
+
+    def _clear_session(self):
         self.token = ""
+        self.refresh_token = ""
         self.current_user = User() # Reinicia usuario vacío
-        return rx.redirect("/")
+
+    async def _refresh_access_token(self) -> bool:
+        """
+        Pide un access token nuevo con el refresh token (rotativo).
+        Devuelve False si no se pudo renovar (hay que volver a iniciar sesión).
+        """
+        old_refresh_token = self.refresh_token
+        data = await _request_refresh(old_refresh_token)
+        if data is None:
+            return False
+        self.token = data["access_token"]
+        self.refresh_token = data.get("refresh_token") or old_refresh_token
+        return True
 
     # --- Helpers de API y Token ---
 
@@ -111,7 +192,7 @@ class State(rx.State):
             
         except Exception as e:
             print(f"Error obteniendo usuario: {e}")
-            self.logout()
+            self._clear_session()
 
     def _get_auth_headers(self) -> Dict[str, str]:
         if not self.token:
@@ -120,6 +201,19 @@ class State(rx.State):
             return {} 
         return {"Authorization": f"Bearer {self.token}"}
 
+    def _get_client_ip_headers(self) -> Dict[str, str]:
+        """
+        La API recibe todas las llamadas desde el backend de Reflex (127.0.0.1);
+        se reenvía la IP del navegador para que el límite por IP sea por cliente.
+        Se parte del peer del websocket, no de router.session.client_ip: Reflex
+        lo toma del primer X-Forwarded-For, que el navegador puede inventar.
+        """
+        raw_headers = self.router.headers.raw_headers
+        peer = raw_headers.get("asgi-scope-client")
+        if not peer:
+            return {}
+        return {"X-Real-IP": resolve_client_ip(peer, raw_headers)}
+
     async def _api_call(self, method: str, endpoint: str, **kwargs) -> Optional[httpx.Response]:
         """
         Helper unificado para llamadas API.
@@ -129,22 +223,24 @@ class State(rx.State):
         self.error_message = ""
         
         try:
-            headers = self._get_auth_headers()
-            # Si pasaron headers extra, los combinamos
-            if "headers" in kwargs:
-                headers.update(kwargs.pop("headers"))
+            extra_headers = kwargs.pop("headers", {})
+            # Construimos la URL completa: BASE + endpoint
+            full_url = f"{BASE_API_URL}{endpoint}"
             
             async with httpx.AsyncClient() as client:
-                # Construimos la URL completa: BASE + endpoint
-                full_url = f"{BASE_API_URL}{endpoint}"
-                
                 response = await client.request(
-                    method, full_url, headers=headers, **kwargs
+                    method, full_url, headers={**self._get_client_ip_headers(), **self._get_auth_headers(), **extra_headers}, **kwargs
                 )
+                
+                if response.status_code == 401 and await self._refresh_access_token():
+                    # Access token vencido: se renovó, reintentamos una vez
+                    response = await client.request(
+                        method, full_url, headers={**self._get_client_ip_headers(), **self._get_auth_headers(), **extra_headers}, **kwargs
+                    )
             
             if response.status_code == 401:
-                # Token vencido o inválido
-                self.logout()
+                # Token inválido y sin refresh posible
+                self._clear_session()
                 return None
 
             response.raise_for_status() 
@@ -165,6 +261,57 @@ class State(rx.State):
         
         return None
 
+    async def _background_refresh_access_token(self, used_token: str) -> bool:
+        """
+        _refresh_access_token para eventos en segundo plano (fuera de `async with self`):
+        el POST a /auth/refresh no retiene el lock. `used_token` es el access token
+        que recibió el 401; si otro evento ya lo renovó, no se vuelve a rotar.
+        """
+        async with self:
+            if self.token != used_token:
+                return bool(self.token)
+            old_refresh_token = self.refresh_token
+        data = await _request_refresh(old_refresh_token)
+        if data is None:
+            return False
+        async with self:
+            # Otro evento pudo haber rotado el token mientras tanto
+            if self.refresh_token == old_refresh_token:
+                self.token = data["access_token"]
+                self.refresh_token = data.get("refresh_token") or old_refresh_token
+        return True
+
+    async def _background_api_call(self, method: str, endpoint: str, **kwargs) -> Optional[httpx.Response]:
+        """
+        Versión de _api_call para eventos en segundo plano: se llama FUERA de
+        `async with self` y solo toma el lock para leer/guardar tokens, así la
+        petición HTTP no bloquea los demás eventos del estado.
+        Devuelve None si falla (red, sesión vencida o error de la API).
+        """
+        extra_headers = kwargs.pop("headers", {})
+        full_url = f"{BASE_API_URL}{endpoint}"
+        async with self:
+            headers = {**self._get_client_ip_headers(), **self._get_auth_headers()}
+            used_token = self.token
+
+        try:
+            async with httpx.AsyncClient() as client:
+                response = await client.request(method, full_url, headers={**headers, **extra_headers}, **kwargs)
+                if response.status_code == 401 and await self._background_refresh_access_token(used_token):
+                    async with self:
+                        headers = {**self._get_client_ip_headers(), **self._get_auth_headers()}
+                    response = await client.request(method, full_url, headers={**headers, **extra_headers}, **kwargs)
+        except httpx.RequestError:
+            return None
+
+        if response.status_code == 401:
+            async with self:
+                self._clear_session()
+            return None
+        if response.is_error:
+            return None
+        return response
+
     # --- Helpers de Protección de Rutas ---
     
     async def check_auth(self):
@@ -1,11 +1,28 @@
 import reflex as rx
 import datetime
+import time
+import uuid
 from .base import State
 from ..models import DashboardStats
+from ..logic import logic_events
+from ..logic.logic_rollups import today, week_start
+
+# Recarga completa de /dashboard/stats: como mucho una cada N segundos por cliente.
+# Entre recargas, los contadores se actualizan con los deltas de cada orden.
+DASHBOARD_REFRESH_SECONDS = 10.0
+DASHBOARD_LIVE_MAX_MINUTES = 120 # La suscripción termina sola; recargar la página la renueva
+DASHBOARD_ROUTE = "/dashboard"
 
 class DashboardState(State):
     """Estado para la página del Dashboard (Panel de Control)."""    
     stats: DashboardStats = DashboardStats()
+    live: bool = False # Recibiendo deltas en vivo
+
+    # Solo backend (no se envían al navegador)
+    _live_session: str = ""
+    _stats_week: str = ""
+    _stats_seq: int = 0 # Deltas con seq <= este valor ya vienen en `stats`
+    _last_refresh: float = 0.0
 
     # --- Propiedades Computadas para la UI ---
 
@@ -46,16 +63,98 @@ class DashboardState(State):
     async def load_dashboard(self):
         """
         Se ejecuta al cargar la página (on_mount).
-        Primero valida el login, luego carga las estadísticas.
+        Primero valida el login; las estadísticas las carga live_updates
+        después de suscribirse, para no perder órdenes entre carga y suscripción.
         """
         # Validar que sea Admin (el backend lo protege, pero es buena práctica)
         await self.check_admin_auth()
         if not self.is_admin:
              return
-        
-        response = await self.super()._api_call("GET", "/dashboard/stats")
-        if response and response.status_code == 200:
-            self.stats = DashboardStats(**response.json())
-        else:
-            # El error ya se maneja en _api_call
-            pass
\ No newline at end of file
+
+        # Una sola suscripción viva por cliente: la anterior se retira sola
+        self._live_session = str(uuid.uuid4())
+        return DashboardState.live_updates
+
+    def _owns_live_session(self, session_id: str) -> bool:
+        """False si otra pestaña/recarga tomó el relevo o el usuario salió del dashboard."""
+        return self._live_session == session_id and self.router.url.path.rstrip("/") == DASHBOARD_ROUTE
+
+    def _apply_stats(self, data: dict) -> bool:
+        """
+        Guarda una recarga completa. Devuelve False si la respondió otro proceso:
+        su secuencia no es comparable y sus órdenes no llegan a este bus de eventos.
+        """
+        source = data.pop("event_source", None)
+        seq = data.pop("event_seq", 0)
+        self.stats = DashboardStats(**data)
+        self._stats_week = week_start(today()).isoformat()
+        self._last_refresh = time.monotonic()
+        same_process = source == logic_events.EVENTS_SOURCE
+        # Sin secuencia comparable se da por incluido lo publicado hasta ahora
+        self._stats_seq = seq if same_process else logic_events.current_sequence()
+        return same_process
+
+    @rx.event(background=True)
+    async def live_updates(self):
+        """
+        Recibe por el websocket de Reflex los deltas de cada orden confirmada
+        (ventas + X, órdenes + 1). Top productos, stock bajo y las órdenes de
+        otros procesos llegan con una recarga completa, cada DASHBOARD_REFRESH_SECONDS.
+        Las llamadas a la API van fuera de `async with self`.
+        """
+        async with self:
+            session_id = self._live_session
+            self.live = True
+        # Suscribirse ANTES de la primera carga: lo que llegue en medio queda en
+        # cola y se descarta por secuencia si la carga ya lo incluye
+        subscription = logic_events.subscribe()
+        deadline = time.monotonic() + DASHBOARD_LIVE_MAX_MINUTES * 60
+        stale = True
+        try:
+            while time.monotonic() < deadline:
+                async with self:
+                    if not self._owns_live_session(session_id):
+                        return
+                    # Eventos perdidos o cambio de semana: solo una recarga completa lo corrige
+                    if subscription.lagged or self._stats_week != week_start(today()).isoformat():
+                        stale = True
+                    wait = self._last_refresh + DASHBOARD_REFRESH_SECONDS - time.monotonic()
+
+                if stale and wait <= 0:
+                    # Se limpia antes de leer el corte: lo que se pierda desde aquí pide otra recarga
+                    subscription.lagged = False
+                    response = await self._background_api_call("GET", "/dashboard/stats")
+                    async with self:
+                        if not self._owns_live_session(session_id):
+                            return
+                        if response:
+                            # De otro proceso: se vuelve a recargar tras el intervalo
+                            stale = not self._apply_stats(response.json())
+                        else:
+                            self._last_refresh = time.monotonic() # Reintenta tras el intervalo
+                    continue
+
+                event = await subscription.get(timeout=wait if stale else DASHBOARD_REFRESH_SECONDS)
+                if not event:
+                    # Las órdenes de otros workers/procesos no pasan por este bus:
+                    # sin eventos, igual se recarga cada DASHBOARD_REFRESH_SECONDS
+                    stale = True
+                    continue
+                async with self:
+                    if not self._owns_live_session(session_id):
+                        return
+                    if event["seq"] <= self._stats_seq:
+                        continue # Ya incluido en la última recarga
+                    if event["week_start"] == self._stats_week:
+                        self.stats = self.stats.model_copy(update={
+                            "sales_this_week": self.stats.sales_this_week + event["total_sales"],
+                            "orders_this_week": self.stats.orders_this_week + event["order_count"],
+                        })
+                    # Un delta publicado durante la recarga puede venir ya incluido:
+                    # la siguiente recarga deja los totales exactos
+                    stale = True
+        finally:
+            subscription.close()
+            async with self:
+                if self._live_session == session_id:
+                    self.live = False
@@ -1,7 +1,18 @@
 import reflex as rx
+import asyncio
+import httpx
+import json
+import uuid
+from datetime import datetime
 from typing import List, Dict, Any
-from .base import State
+from .base import State, BASE_API_URL
 from ..models import Product, CartItem, SettingsModel
+from ..logic.logic_settings import TIMEZONE
+
+# Espera máxima entre reintentos al sincronizar ventas encoladas
+ORDER_QUEUE_MAX_BACKOFF_SECONDS = 60
+# Errores 5xx seguidos antes de apartar la venta (para no bloquear la cola)
+ORDER_QUEUE_MAX_SERVER_ERRORS = 5
 
 class POSState(State):
     
@@ -18,6 +29,15 @@ class POSState(State):
     show_payment_modal: bool = False
     selected_payment_method: str = "Efectivo"
     
+    # --- Cola offline de ventas ---
+    # Las ventas se registran primero en el navegador y se envían en segundo
+    # plano. Cada una lleva su Idempotency-Key, así los reintentos no duplican.
+    order_queue_json: str = rx.LocalStorage("[]", name="pos_order_queue")
+    is_flushing_queue: bool = False
+    last_receipt: Dict[str, str] = {}
+    # Ventas ya cobradas que el backend rechazó: no se borran, las resuelve un admin
+    rejected_orders_json: str = rx.LocalStorage("[]", name="pos_rejected_orders")
+    
     # --- Setters ---
     def set_search_term(self, value):
         self.search_term = value
@@ -48,6 +68,79 @@ class POSState(State):
     @rx.var
     def cart_total(self) -> float:
         return self.cart_subtotal 
+
+    @rx.var
+    def pending_orders_count(self) -> int:
+        try:
+            return len(json.loads(self.order_queue_json or "[]"))
+        except ValueError:
+            return 0
+
+    @rx.var
+    def rejected_orders(self) -> List[Dict[str, str]]:
+        try:
+            rejected = json.loads(self.rejected_orders_json or "[]")
+        except ValueError:
+            return []
+        return [
+            {
+                "key": entry["key"],
+                "number": entry["key"][:8].upper(),
+                "created_at": entry["created_at"][:19].replace("T", " "),
+                "total": f"{entry['total']:,.0f}",
+                "reason": entry.get("reason", ""),
+            }
+            for entry in rejected
+        ]
+
+    # --- Helpers de la cola ---
+    def _get_order_queue(self) -> List[Dict[str, Any]]:
+        try:
+            return json.loads(self.order_queue_json or "[]")
+        except ValueError:
+            return []
+
+    def _set_order_queue(self, queue: List[Dict[str, Any]]):
+        self.order_queue_json = json.dumps(queue)
+
+    def _remove_from_order_queue(self, key: str):
+        self._set_order_queue([entry for entry in self._get_order_queue() if entry["key"] != key])
+
+    def _get_rejected_orders(self) -> List[Dict[str, Any]]:
+        try:
+            return json.loads(self.rejected_orders_json or "[]")
+        except ValueError:
+            return []
+
+    def _reject_order(self, entry: Dict[str, Any], reason: str):
+        """Saca la venta de la cola y la guarda como rechazada, con el motivo."""
+        self._remove_from_order_queue(entry["key"])
+        rejected = self._get_rejected_orders()
+        rejected.append({**entry, "reason": reason, "rejected_at": datetime.now().isoformat(timespec="seconds")})
+        self.rejected_orders_json = json.dumps(rejected)
+
+    # --- Ventas rechazadas (solo admin) ---
+    def retry_rejected_order(self, key: str):
+        """Devuelve la venta a la cola (p. ej. tras reponer stock)."""
+        if not self.is_admin:
+            return rx.toast("Solo un administrador puede resolver ventas rechazadas", status="error")
+        rejected = self._get_rejected_orders()
+        entry = next((e for e in rejected if e["key"] == key), None)
+        if not entry:
+            return
+        self.rejected_orders_json = json.dumps([e for e in rejected if e["key"] != key])
+        for field in ("reason", "rejected_at"):
+            entry.pop(field, None)
+        queue = self._get_order_queue()
+        queue.append({**entry, "attempts": 0, "server_errors": 0})
+        self._set_order_queue(queue)
+        return POSState.flush_order_queue
+
+    def discard_rejected_order(self, key: str):
+        """Descarta la venta (p. ej. tras devolver el dinero al cliente)."""
+        if not self.is_admin:
+            return rx.toast("Solo un administrador puede resolver ventas rechazadas", status="error")
+        self.rejected_orders_json = json.dumps([e for e in self._get_rejected_orders() if e["key"] != key])
     
     # --- API ---
     async def load_products(self):
@@ -66,26 +159,158 @@ class POSState(State):
         
         await self.load_products()
 
-    async def process_payment(self):
+        # Ventas que quedaron pendientes de una sesión anterior
+        if self._get_order_queue():
+            return POSState.flush_order_queue
+
+    def process_payment(self):
+        """
+        Registra la venta en la cola local y emite un recibo provisional.
+        El envío al backend ocurre en segundo plano (flush_order_queue),
+        así el cobro no depende de la latencia ni la disponibilidad de la API.
+        """
         if not self.cart:
             return rx.toast("El carrito está vacío", status="warning")
             
-        order_data = {
+        entry = {
+            "key": str(uuid.uuid4()),
+            # Hora de la venta con zona: el backend la guarda como hora de la orden
+            "created_at": datetime.now(TIMEZONE).isoformat(timespec="seconds"),
             "items": [{"product_id": item.product_id, "quantity": item.qty} for item in self.cart.values()],
-            "payment_method": self.selected_payment_method
+            "payment_method": self.selected_payment_method,
+            "total": self.cart_total,
+            "attempts": 0,
+            "server_errors": 0
         }
-        
-        response = await self.super()._api_call("POST", "/orders/create", json=order_data)
-        
-        if response and response.status_code == 200:
-            order_id = response.json().get("id")
-            self.cart = {}
-            self.show_payment_modal = False
-            self.selected_payment_method = "Efectivo"
-            await self.load_products() 
-            return rx.toast(f"¡Orden #{order_id} creada con éxito!", status="success")
-        else:
-            return rx.toast("Error al procesar la orden", status="error")
+        queue = self._get_order_queue()
+        queue.append(entry)
+        self._set_order_queue(queue)
+
+        # Reflejar la venta en el stock mostrado mientras se sincroniza
+        sold = {item.product_id: item.qty for item in self.cart.values()}
+        for product in self.products:
+            if product.id in sold:
+                product.stock -= sold[product.id]
+
+        receipt_number = entry["key"][:8].upper()
+        self.last_receipt = {
+            "number": receipt_number,
+            "created_at": entry["created_at"][:19].replace("T", " "),
+            "total": f"{entry['total']:,.0f}",
+            "items_summary": ", ".join(f"{item.qty}x {item.name}" for item in self.cart_items),
+            "payment_method": entry["payment_method"]
+        }
+        self.cart = {}
+        self.show_payment_modal = False
+        self.selected_payment_method = "Efectivo"
+        return [
+            rx.toast(f"Venta registrada (recibo provisional #{receipt_number})", status="success"),
+            POSState.flush_order_queue
+        ]
+
+    @rx.event(background=True)
+    async def flush_order_queue(self):
+        """
+        Envía las ventas encoladas en orden, una a una, con reintentos y
+        backoff exponencial ante errores de red o del servidor.
+        """
+        async with self:
+            if self.is_flushing_queue:
+                return
+            self.is_flushing_queue = True
+
+        synced = 0
+        try:
+            while True:
+                async with self:
+                    queue = self._get_order_queue()
+                    token = self.token
+                if not queue or not token:
+                    break
+                entry = queue[0]
+
+                try:
+                    async with httpx.AsyncClient() as client:
+                        response = await client.post(
+                            f"{BASE_API_URL}/orders/create",
+                            json={
+                                "items": entry["items"],
+                                "payment_method": entry["payment_method"],
+                                # Sin esto la venta quedaría con la hora de sincronización
+                                "sold_at": entry["created_at"]
+                            },
+                            headers={"Authorization": f"Bearer {token}", "Idempotency-Key": entry["key"]},
+                            timeout=10.0
+                        )
+                except httpx.RequestError:
+                    response = None
+
+                if response is not None and response.status_code == 200:
+                    async with self:
+                        self._remove_from_order_queue(entry["key"])
+                    synced += 1
+                    continue
+
+                if response is not None and response.status_code == 401:
+                    # La renovación (HTTP) va fuera del lock del estado
+                    if await self._background_refresh_access_token(token):
+                        continue
+                    # Sesión vencida: se reintenta cuando el usuario vuelva a entrar
+                    break
+
+                if response is not None and response.status_code in (400, 404, 422):
+                    # Rechazo definitivo (p. ej. stock insuficiente): la venta ya se
+                    # cobró, así que se aparta para que un admin la resuelva
+                    try:
+                        detail = response.json().get("detail", response.text)
+                    except ValueError:
+                        detail = response.text
+                    async with self:
+                        self._reject_order(entry, str(detail))
+                    yield rx.toast(
+                        f"La venta #{entry['key'][:8].upper()} fue rechazada: {detail}. "
+                        "Quedó pendiente de revisión por un administrador.",
+                        status="error"
+                    )
+                    continue
+
+                server_errors = entry.get("server_errors", 0)
+                if response is not None and response.status_code >= 500:
+                    server_errors += 1
+                    if server_errors >= ORDER_QUEUE_MAX_SERVER_ERRORS:
+                        # Error persistente del servidor: se aparta y sigue la cola
+                        async with self:
+                            self._reject_order(
+                                entry, f"Error del servidor (HTTP {response.status_code}) tras {server_errors} intentos"
+                            )
+                        yield rx.toast(
+                            f"La venta #{entry['key'][:8].upper()} no se pudo sincronizar. "
+                            "Quedó pendiente de revisión por un administrador.",
+                            status="error"
+                        )
+                        continue
+
+                # Error de red o del servidor: reintento con backoff exponencial.
+                # Sin conexión se reintenta indefinidamente (para eso es la cola).
+                attempts = entry.get("attempts", 0) + 1
+                async with self:
+                    queue = self._get_order_queue()
+                    for queued in queue:
+                        if queued["key"] == entry["key"]:
+                            queued["attempts"] = attempts
+                            queued["server_errors"] = server_errors
+                    self._set_order_queue(queue)
+                await asyncio.sleep(min(2 ** attempts, ORDER_QUEUE_MAX_BACKOFF_SECONDS))
+        finally:
+            async with self:
+                self.is_flushing_queue = False
+
+        if synced:
+            # La petición HTTP va fuera del lock del estado (renueva el token si hace falta)
+            response = await self._background_api_call("GET", "/products")
+            if response:
+                async with self:
+                    self.products = [Product(**p) for p in response.json()]
 
     # --- Lógica Carrito ---
     def add_to_cart(self, product: Product):
@@ -1,17 +1,37 @@
+import asyncio
 import reflex as rx
 from typing import List, Dict, Any
 from .base import State
-from ..models import SalesReport
+from ..models import SalesReport, OrderDetail
+from ..logic.logic_rollups import local_datetime
 from datetime import datetime, timedelta
 
+# Rangos más largos se calculan como job en segundo plano (no bloquean la petición)
+REPORT_JOB_MIN_DAYS = 366
+REPORT_JOB_POLL_SECONDS = 1.0
+
 class ReportsState(State):
     # Fechas por defecto
     start_date: str = (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d")
     end_date: str = datetime.now().strftime("%Y-%m-%d")
+    granularity: str = "auto" # auto, hour, day, week, month
     
     # Datos del reporte (Objeto complejo)
     report: SalesReport = SalesReport()
 
+    # Detalle de ventas paginado (se carga por páginas, no todo el rango)
+    detailed_sales: List[OrderDetail] = []
+    detail_cursor: str = ""
+    has_more_sales: bool = False
+
+    # Heatmap día x hora, aplanado a celdas para una grilla de 25 columnas
+    heatmap_cells: List[Dict[str, str]] = []
+
+    # Job en segundo plano para rangos largos
+    job_id: str = ""
+    job_status: str = ""
+    job_progress: int = 0
+
     # --- Setters Explícitos ---
     def set_start_date(self, value: str):
         self.start_date = value
@@ -19,6 +39,9 @@ class ReportsState(State):
     def set_end_date(self, value: str):
         self.end_date = value
 
+    def set_granularity(self, value: str):
+        self.granularity = value
+
     # --- PUENTES PARA GRÁFICOS (La Solución al Error) ---
     # Convertimos los objetos Pydantic a diccionarios simples que Recharts entiende
     
@@ -35,12 +58,128 @@ class ReportsState(State):
         return [item.dict() for item in self.report.top_products]
 
     # --- API ---
+    def _is_long_range(self) -> bool:
+        try:
+            start = datetime.strptime(self.start_date, "%Y-%m-%d")
+            end = datetime.strptime(self.end_date, "%Y-%m-%d")
+        except ValueError:
+            return False
+        return (end - start).days + 1 > REPORT_JOB_MIN_DAYS
+
     async def get_report(self):
         await self.check_auth()
-        url = f"/reports/sales?start_date={self.start_date}&end_date={self.end_date}"
+
+        # Solo la primera página del detalle
+        self.detailed_sales = []
+        self.detail_cursor = ""
+
+        if self._is_long_range():
+            response = await self.super()._api_call("POST", "/reports/jobs", json={
+                "start_date": self.start_date,
+                "end_date": self.end_date,
+                "granularity": self.granularity
+            })
+            if not response or response.status_code != 202:
+                return rx.toast("Error al encolar el reporte", status="error")
+            job = response.json()
+            # El reporte anterior es de otro rango: no se muestra mientras se genera el nuevo
+            self.report = SalesReport()
+            self.job_id = job["id"]
+            self.job_status = job["status"]
+            self.job_progress = job["progress"]
+            return [ReportsState.poll_report_job, ReportsState.load_more_sales, ReportsState.load_heatmap]
+
+        url = f"/reports/sales?start_date={self.start_date}&end_date={self.end_date}&granularity={self.granularity}"
         response = await self.super()._api_call("GET", url)
         
         if response and response.status_code == 200:
             self.report = SalesReport(**response.json())
         else:
-            return rx.toast("Error al cargar reportes", status="error")
\ No newline at end of file
+            return rx.toast("Error al cargar reportes", status="error")
+
+        return [ReportsState.load_more_sales, ReportsState.load_heatmap]
+
+    async def load_heatmap(self):
+        url = f"/reports/heatmap?start_date={self.start_date}&end_date={self.end_date}"
+        response = await self.super()._api_call("GET", url)
+        if not response or response.status_code != 200:
+            return rx.toast("Error al cargar el mapa de calor", status="error")
+
+        data = response.json()
+        peak = max((value for row in data["revenue"] for value in row), default=0.0) or 1.0
+        cells = [{"text": "", "bg": "transparent", "title": ""}]
+        cells += [{"text": str(hour), "bg": "transparent", "title": ""} for hour in data["hours"]]
+        for day, revenue_row, orders_row in zip(data["weekdays"], data["revenue"], data["orders"]):
+            cells.append({"text": day[:3], "bg": "transparent", "title": day})
+            for hour, (revenue, orders) in enumerate(zip(revenue_row, orders_row)):
+                intensity = round(revenue / peak, 2)
+                cells.append({
+                    "text": "",
+                    "bg": f"rgba(106, 53, 135, {intensity})" if revenue else "var(--gray-3)",
+                    "title": f"{day} {hour:02d}:00 · {orders} órdenes · ${revenue:,.0f}"
+                })
+        self.heatmap_cells = cells
+
+    @rx.event(background=True)
+    async def poll_report_job(self):
+        """Consulta el job hasta que termine y carga su resultado."""
+        error = None
+        while True:
+            await asyncio.sleep(REPORT_JOB_POLL_SECONDS)
+            async with self:
+                job_id = self.job_id
+            if not job_id:
+                return
+            # La consulta va fuera del lock para no congelar la página mientras responde
+            response = await self._background_api_call("GET", f"/reports/jobs/{job_id}")
+            async with self:
+                if job_id != self.job_id:
+                    return # Se pidió otro reporte mientras tanto
+                if not response:
+                    self.job_id = ""
+                    error = "Error al consultar el reporte"
+                    break
+
+                job = response.json()
+                self.job_status = job["status"]
+                self.job_progress = job["progress"]
+                if job["status"] == "Completado":
+                    self.report = SalesReport(**job["result"])
+                    self.job_id = ""
+                    break
+                if job["status"] == "Fallido":
+                    self.job_id = ""
+                    error = f"El reporte falló: {job['error']}"
+                    break
+
+        if error:
+            yield rx.toast(error, status="error")
+
+    async def load_more_sales(self):
+        # params: httpx codifica el cursor (base64 puede traer "=")
+        params = {"start_date": self.start_date, "end_date": self.end_date}
+        if self.detail_cursor:
+            params["cursor"] = self.detail_cursor
+
+        response = await self.super()._api_call("GET", "/reports/sales/detail", params=params)
+
+        if response and response.status_code == 200:
+            data = response.json()
+            self.detailed_sales = self.detailed_sales + [
+                OrderDetail(
+                    id=order["id"],
+                    # La API devuelve UTC; se muestra la hora local del negocio
+                    created_at=local_datetime(datetime.fromisoformat(order["created_at"])).strftime("%Y-%m-%d %H:%M"),
+                    total_amount=order["total_amount"],
+                    items_summary=", ".join(
+                        f"{item['quantity']}x {item['product_name']}" for item in order["items"]
+                    ),
+                    status=order["status"],
+                    user_name=order["user_full_name"],
+                )
+                for order in data["items"]
+            ]
+            self.detail_cursor = data["next_cursor"] or ""
+            self.has_more_sales = data["next_cursor"] is not None
+        else:
+            return rx.toast("Error al cargar el detalle de ventas", status="error")
\ No newline at end of file
@@ -0,0 +1,125 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi import HTTPException, Request, status
+
+class TokenBucketLimiter:
+    """
+    Token bucket por clave (email, IP, ...). Los buckets viven en un LRU
+    acotado: con muchas claves distintas se descartan los más antiguos,
+    así la memoria no crece aunque un script pruebe miles de emails.
+    """
+
+    def __init__(self, name: str, capacity: int, refill_per_minute: float, max_buckets: int):
+        self.name = name
+        self.capacity = capacity
+        self.refill_per_second = refill_per_minute / 60
+        self.max_buckets = max_buckets
+        self._buckets: "OrderedDict[str, list]" = OrderedDict() # clave -> [tokens, último_ts]
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.rejected = 0
+        self.evicted = 0
+
+    def allow(self, key: str) -> bool:
+        """Consume un token de la clave. False si el bucket está vacío."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = [float(self.capacity), now]
+                self._buckets[key] = bucket
+                if len(self._buckets) > self.max_buckets:
+                    self._buckets.popitem(last=False)
+                    self.evicted += 1
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(self.capacity, bucket[0] + (now - bucket[1]) * self.refill_per_second)
+                bucket[1] = now
+
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                self.allowed += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def retry_after_seconds(self) -> int:
+        return max(1, int(1 / self.refill_per_second)) if self.refill_per_second else 60
+
+    def get_metrics(self) -> dict:
+        with self._lock:
+            return {
+                "name": self.name,
+                "capacity": self.capacity,
+                "refill_per_minute": self.refill_per_second * 60,
+                "buckets": len(self._buckets),
+                "max_buckets": self.max_buckets,
+                "allowed": self.allowed,
+                "rejected": self.rejected,
+                "evicted": self.evicted,
+            }
+
+# --- Límites de /auth/login (cada intento fallido cuesta un bcrypt completo) ---
+LOGIN_MAX_BUCKETS = int(os.environ.get("LOGIN_MAX_BUCKETS", 10000))
+
+login_email_limiter = TokenBucketLimiter(
+    "login_email",
+    capacity=int(os.environ.get("LOGIN_EMAIL_BURST", 5)),
+    refill_per_minute=float(os.environ.get("LOGIN_EMAIL_PER_MINUTE", 5)),
+    max_buckets=LOGIN_MAX_BUCKETS,
+)
+# Más holgado: todo un turno puede entrar desde la misma red (o vía el backend de Reflex)
+login_ip_limiter = TokenBucketLimiter(
+    "login_ip",
+    capacity=int(os.environ.get("LOGIN_IP_BURST", 30)),
+    refill_per_minute=float(os.environ.get("LOGIN_IP_PER_MINUTE", 30)),
+    max_buckets=LOGIN_MAX_BUCKETS,
+)
+
+# Proxies de confianza (IPs separadas por coma): solo a ellos se les cree la
+# cabecera X-Real-IP. Por defecto el loopback, donde corren Nginx (que la
+# sobrescribe con $remote_addr) y el backend de Reflex (que reenvía la de Nginx).
+TRUSTED_PROXIES = {
+    ip.strip() for ip in os.environ.get("TRUSTED_PROXIES", "127.0.0.1,::1").split(",") if ip.strip()
+}
+
+def resolve_client_ip(peer: str, headers) -> str:
+    """
+    IP real del cliente a partir de la conexión (`peer`) y sus cabeceras.
+    Solo se usa X-Real-IP, y solo si `peer` es un proxy de confianza: es la
+    única cabecera que Nginx escribe siempre. X-Forwarded-For no se lee porque
+    puede traer entradas puestas por el propio cliente.
+    """
+    if peer not in TRUSTED_PROXIES:
+        return peer
+    real_ip = (headers.get("x-real-ip") or "").strip()
+    return real_ip or peer
+
+def get_client_ip(request: Request) -> str:
+    """IP del cliente; X-Real-IP solo cuenta desde TRUSTED_PROXIES."""
+    peer = request.client.host if request.client else "desconocido"
+    return resolve_client_ip(peer, request.headers)
+
+def check_login_rate(request: Request, email: str):
+    """Rechaza el intento con 429 antes de consultar la BD o calcular un hash."""
+    limiter = None
+    if not login_ip_limiter.allow(get_client_ip(request)):
+        limiter = login_ip_limiter
+    elif not login_email_limiter.allow(email.strip().lower()):
+        limiter = login_email_limiter
+
+    if limiter is not None:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Demasiados intentos de inicio de sesión. Intente de nuevo en unos minutos.",
+            headers={"Retry-After": str(limiter.retry_after_seconds())},
+        )
+
+def get_login_throttle_metrics() -> dict:
+    return {
+        "email": login_email_limiter.get_metrics(),
+        "ip": login_ip_limiter.get_metrics(),
+    }
@@ -0,0 +1,120 @@
+"""
+Benchmark de la carga masiva de inventario (filas/segundo).
+
+Compara el camino anterior (un SELECT por fila + db.add de cada producto) con
+logic_inventory.process_inventory_file (validación vectorizada, una consulta
+IN y un upsert ON CONFLICT(sku) por lote). La mitad de los SKUs de cada
+archivo ya existen, así que se mide tanto la creación como la actualización.
+
+Uso:
+    python benchmarks/bench_inventory.py --rows 1000 10000 100000
+    python benchmarks/bench_inventory.py --legacy-max-rows 100000
+    DATABASE_URL=postgresql://... python benchmarks/bench_inventory.py
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+if not os.environ.get("DATABASE_URL"):
+    _tmp_dir = tempfile.mkdtemp(prefix="bench_inventory_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp_dir, 'bench.db')}"
+
+import pandas as pd  # noqa: E402
+from sqlmodel import SQLModel, Session, select  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+from FavoredCoffee.database import engine  # noqa: E402
+from FavoredCoffee.models import Product  # noqa: E402
+from FavoredCoffee.logic.logic_inventory import process_inventory_file  # noqa: E402
+
+
+def legacy_process_inventory_file(db: Session, file_content: bytes, file_type: str):
+    """Copia del camino original: validación con iterrows y un SELECT por fila."""
+    df = pd.read_csv(io.BytesIO(file_content))
+    df.columns = [col.lower().strip() for col in df.columns]
+    for index, row in df.iterrows():
+        if pd.isna(row["sku"]) or pd.isna(row["name"]) or pd.isna(row["category"]):
+            raise ValueError(f"Fila {index+2}: 'sku', 'name' y 'category' no pueden estar vacíos")
+        if not isinstance(row["price"], (int, float)) or row["price"] <= 0:
+            raise ValueError(f"Fila {index+2}: 'price' debe ser un número positivo")
+        if not isinstance(row["stock_a_sumar"], (int, float)):
+            raise ValueError(f"Fila {index+2}: 'stock_a_sumar' debe ser un número")
+
+    for _, row in df.iterrows():
+        product_sku = str(row["sku"])
+        product = db.exec(select(Product).where(Product.sku == product_sku)).first()
+        stock_a_sumar = int(row["stock_a_sumar"])
+        if product:
+            product.name = row["name"]
+            product.category = row["category"]
+            product.price = float(row["price"])
+            product.stock += stock_a_sumar
+        else:
+            product = Product(
+                sku=product_sku, name=row["name"], category=row["category"],
+                price=float(row["price"]), stock=stock_a_sumar
+            )
+        db.add(product)
+    db.commit()
+
+
+def build_file(prefix: str, rows: int) -> bytes:
+    """CSV de `rows` filas; la mitad de los SKUs se siembran antes (actualizaciones)."""
+    random.seed(rows)
+    df = pd.DataFrame({
+        "sku": [f"{prefix}-{i}" for i in range(rows)],
+        "name": [f"Producto {i}" for i in range(rows)],
+        "category": [random.choice(["Bebida", "Comida", "Postre"]) for _ in range(rows)],
+        "price": [float(random.randint(2, 12) * 500) for _ in range(rows)],
+        "stock_a_sumar": [random.randint(-5, 50) for _ in range(rows)],
+    })
+    return df.to_csv(index=False).encode()
+
+
+def seed_existing(prefix: str, rows: int):
+    with Session(engine) as db:
+        existing = [
+            {"sku": f"{prefix}-{i}", "name": "Viejo", "category": "Bebida", "price": 1000.0, "stock": 10}
+            for i in range(0, rows, 2)
+        ]
+        for start in range(0, len(existing), 5000):
+            db.exec(insert(Product), params=existing[start:start + 5000])
+        db.commit()
+
+
+def run(label: str, fn, prefix: str, rows: int):
+    seed_existing(prefix, rows)
+    content = build_file(prefix, rows)
+    with Session(engine) as db:
+        start = time.perf_counter()
+        fn(db, content, "text/csv")
+        elapsed = time.perf_counter() - start
+    print(f"{label:<26} {rows:>7} filas en {elapsed:8.2f}s -> {rows / elapsed:10.1f} filas/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--legacy-max-rows", type=int, default=10000,
+                        help="El camino anterior es O(filas) consultas: se omite por encima de este tamaño")
+    args = parser.parse_args()
+
+    SQLModel.metadata.create_all(bind=engine)
+    print(f"Base de datos: {engine.url.render_as_string(hide_password=True)}")
+    for rows in args.rows:
+        if rows <= args.legacy_max_rows:
+            run("antes (SELECT por fila)", legacy_process_inventory_file, f"LEGACY{rows}", rows)
+        else:
+            print(f"{'antes (SELECT por fila)':<26} {rows:>7} filas omitido (--legacy-max-rows {args.legacy_max_rows})")
+        run("después (IN + upsert)", process_inventory_file, f"BULK{rows}", rows)
+
+
+if __name__ == "__main__":
+    main()
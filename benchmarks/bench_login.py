@@ -0,0 +1,127 @@
+"""
+Benchmark de login: ráfaga de logins (inicio de turno) mientras otro cliente
+consulta un endpoint liviano. Mide la latencia de ese endpoint con bcrypt en
+el event loop (camino anterior) y con bcrypt en el pool de security.
+
+Uso:
+    python benchmarks/bench_login.py --logins 40
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+if not os.environ.get("DATABASE_URL"):
+    _tmp_dir = tempfile.mkdtemp(prefix="bench_login_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp_dir, 'bench.db')}"
+
+# Todos los logins del benchmark salen de la misma IP: sin límite por IP
+os.environ.setdefault("LOGIN_IP_BURST", "1000000")
+
+import httpx  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+from sqlmodel import SQLModel, Session, select  # noqa: E402
+
+from FavoredCoffee.database import engine  # noqa: E402
+from FavoredCoffee.models import User  # noqa: E402
+from FavoredCoffee.routers import auth  # noqa: E402
+from FavoredCoffee.security import get_password_hash, verify_password, verify_password_async  # noqa: E402
+
+PASSWORD = "turno-manana"
+
+
+def seed(num_users: int):
+    SQLModel.metadata.create_all(bind=engine)
+    hashed = get_password_hash(PASSWORD)
+    with Session(engine) as db:
+        for i in range(num_users):
+            email = f"cajero{i}@cafe.com"
+            if not db.exec(select(User).where(User.email == email)).first():
+                db.add(User(email=email, hashed_password=hashed, full_name=f"Cajero {i}"))
+        db.commit()
+
+
+def build_app() -> FastAPI:
+    api = FastAPI()
+    api.include_router(auth.router)
+
+    @api.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    return api
+
+
+async def blocking_verify(plain_password, hashed_password) -> bool:
+    # Camino anterior: bcrypt directamente en el event loop
+    return verify_password(plain_password, hashed_password)
+
+
+async def run(label: str, num_logins: int):
+    transport = httpx.ASGITransport(app=build_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        latencies = []
+        gaps = []
+        done = asyncio.Event()
+
+        async def probe():
+            # Un cliente "normal" que consulta cada 5 ms; si el loop se bloquea,
+            # aumenta el tiempo entre respuestas consecutivas
+            last = time.perf_counter()
+            while not done.is_set():
+                start = time.perf_counter()
+                await client.get("/ping")
+                now = time.perf_counter()
+                latencies.append((now - start) * 1000)
+                gaps.append((now - last) * 1000)
+                last = now
+                await asyncio.sleep(0.005)
+
+        async def login(i):
+            response = await client.post(
+                "/auth/login", data={"username": f"cajero{i}@cafe.com", "password": PASSWORD}
+            )
+            assert response.status_code == 200, response.text
+
+        probe_task = asyncio.create_task(probe())
+        start = time.perf_counter()
+        try:
+            await asyncio.gather(*(login(i) for i in range(num_logins)))
+        finally:
+            elapsed = time.perf_counter() - start
+            done.set()
+            await probe_task
+
+    latencies.sort()
+    print(
+        f"{label:<20} {num_logins} logins en {elapsed:6.2f}s ({num_logins / elapsed:5.1f}/s) | "
+        f"/ping: {len(latencies) / elapsed:6.1f} resp/s, p50 {statistics.median(latencies):6.1f} ms, "
+        f"mayor bloqueo {max(gaps):7.1f} ms"
+    )
+
+
+async def compare(num_logins: int):
+    auth.verify_password_async = blocking_verify
+    await run("antes (en el loop)", num_logins)
+    auth.verify_password_async = verify_password_async
+    await run("después (pool)", num_logins)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=40)
+    args = parser.parse_args()
+
+    seed(args.logins)
+
+    asyncio.run(compare(args.logins))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Benchmark de creación de órdenes (órdenes/segundo).
+
+Compara el camino anterior (dos commits + dos refresh + SELECT ... FOR UPDATE)
+con el camino actual de logic_orders.create_new_order, con el ledger de
+movimientos de stock (STOCK_LEDGER) y, con varios hilos, con el modo group
+commit (logic_group_commit).
+
+Uso:
+    python benchmarks/bench_orders.py --orders 2000 --threads 4
+    python benchmarks/bench_orders.py --threads 16 --window-ms 5 --max-orders 50
+    DATABASE_URL=postgresql://... python benchmarks/bench_orders.py
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+if not os.environ.get("DATABASE_URL"):
+    _tmp_dir = tempfile.mkdtemp(prefix="bench_orders_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp_dir, 'bench.db')}"
+
+from sqlmodel import SQLModel, Session, select  # noqa: E402
+
+from FavoredCoffee.database import engine  # noqa: E402
+from FavoredCoffee.models import Product, Order, OrderItem, User  # noqa: E402
+from FavoredCoffee.schemas import OrderRequest  # noqa: E402
+from FavoredCoffee.logic.logic_settings import create_initial_settings, get_settings  # noqa: E402
+from FavoredCoffee.logic.logic_orders import create_new_order  # noqa: E402
+from FavoredCoffee.logic.logic_group_commit import GroupCommitWriter  # noqa: E402
+from FavoredCoffee.logic import logic_stock  # noqa: E402
+
+
+def legacy_create_order(db: Session, order_request: OrderRequest, user: User) -> Order:
+    """Copia del camino original: dos commits y dos refresh por orden."""
+    settings = get_settings(db)
+    product_ids = [item.product_id for item in order_request.items]
+    products_db = db.exec(
+        select(Product).where(Product.id.in_(product_ids)).with_for_update()
+    ).all()
+    products_map = {p.id: p for p in products_db}
+
+    subtotal = 0.0
+    items_to_create = []
+    for item in order_request.items:
+        product = products_map[item.product_id]
+        subtotal += product.price * item.quantity
+        items_to_create.append((product, item.quantity, product.price))
+
+    tax = round(subtotal * (settings.tax_rate / 100), 2)
+    new_order = Order(
+        user_id=user.id, payment_method=order_request.payment_method,
+        subtotal=subtotal, tax_amount=tax, total_amount=round(subtotal + tax, 2)
+    )
+    db.add(new_order)
+    db.commit()
+    db.refresh(new_order)
+    for product, quantity, price in items_to_create:
+        product.stock -= quantity
+        db.add(product)
+        db.add(OrderItem(order_id=new_order.id, product_id=product.id,
+                         quantity=quantity, price_at_purchase=price))
+    db.commit()
+    db.refresh(new_order)
+    return new_order
+
+
+def seed(num_products: int) -> User:
+    SQLModel.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        create_initial_settings(db)
+        user = db.exec(select(User).where(User.email == "bench@cafe.com")).first()
+        if not user:
+            user = User(email="bench@cafe.com", hashed_password="x", full_name="Bench", role="Vendedor")
+            db.add(user)
+        for i in range(num_products):
+            sku = f"BENCH-{i}"
+            product = db.exec(select(Product).where(Product.sku == sku)).first()
+            if not product:
+                product = Product(sku=sku, name=f"Producto {i}", category="Bebida", price=3500.0)
+            product.stock = 10_000_000
+            db.add(product)
+        db.commit()
+        db.refresh(user)
+        product_ids = [p.id for p in db.exec(select(Product).where(Product.sku.like("BENCH-%"))).all()]
+        db.expunge(user)
+    return user, product_ids
+
+
+def random_order(product_ids, hot_ids) -> OrderRequest:
+    # La mayoría de las órdenes incluyen uno de los productos "calientes"
+    chosen = {random.choice(hot_ids)}
+    chosen.update(random.sample(product_ids, k=random.randint(0, 3)))
+    return OrderRequest(items=[{"product_id": pid, "quantity": random.randint(1, 3)} for pid in chosen])
+
+
+def run(label, fn, user, requests, threads):
+    def worker(order_request):
+        with Session(engine) as db:
+            fn(db, order_request, user)
+
+    start = time.perf_counter()
+    if threads <= 1:
+        for order_request in requests:
+            worker(order_request)
+    else:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(worker, requests))
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {len(requests):>6} órdenes en {elapsed:7.2f}s -> {len(requests) / elapsed:8.1f} órdenes/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=1000)
+    parser.add_argument("--products", type=int, default=50)
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--window-ms", type=float, default=5)
+    parser.add_argument("--max-orders", type=int, default=50)
+    args = parser.parse_args()
+
+    user, product_ids = seed(args.products)
+    hot_ids = product_ids[:2]
+    random.seed(42)
+    requests = [random_order(product_ids, hot_ids) for _ in range(args.orders)]
+
+    print(f"Base de datos: {engine.url.render_as_string(hide_password=True)} | hilos: {args.threads}")
+    run("antes (2 commits)", legacy_create_order, user, requests, args.threads)
+    run("después (1 transacción)", create_new_order, user, requests, args.threads)
+
+    logic_stock.STOCK_LEDGER = True
+    run("ledger de stock", create_new_order, user, requests, args.threads)
+    with Session(engine) as db:
+        compacted = logic_stock.compact_stock_movements(db, batch_size=len(requests) * 5)
+    print(f"  movimientos compactados: {compacted}")
+    logic_stock.STOCK_LEDGER = False
+
+    if args.threads > 1:
+        writer = GroupCommitWriter(args.window_ms, args.max_orders)
+        run("group commit", lambda db, request, u: writer.submit(request, u), user, requests, args.threads)
+        metrics = writer.get_metrics()
+        print(f"  lotes: {metrics['batches']} | tamaño promedio: {metrics['avg_batch_size']} "
+              f"| latencia promedio del lote: {metrics['avg_batch_ms']} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Benchmark del reporte de ventas.
+
+Compara la implementación anterior de get_sales_report (tres recorridos del
+rango: métricas, tuplas OrderItem/Product/Order y órdenes con joinedload) con
+el motor de un solo recorrido (logic_report_engine.scan_sales) sobre el rango
+completo y con el camino actual (rollups para días cerrados + scan de hoy).
+
+Uso:
+    python benchmarks/bench_reports.py --orders 50000 --days 180
+    DATABASE_URL=postgresql://... python benchmarks/bench_reports.py
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+if not os.environ.get("DATABASE_URL"):
+    _tmp_dir = tempfile.mkdtemp(prefix="bench_reports_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp_dir, 'bench.db')}"
+
+import pytz  # noqa: E402
+from sqlmodel import SQLModel, Session, select, func  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+from sqlalchemy.orm import joinedload  # noqa: E402
+
+from FavoredCoffee.database import engine  # noqa: E402
+from FavoredCoffee.models import Product, Order, OrderItem, User  # noqa: E402
+from FavoredCoffee.logic.logic_settings import TIMEZONE  # noqa: E402
+from FavoredCoffee.logic import logic_rollups, logic_report_engine  # noqa: E402
+from FavoredCoffee.logic.logic_reports import _build_sales_report  # noqa: E402
+
+
+def legacy_sales_report(db: Session, start_date, end_date):
+    """Copia del camino original: tres recorridos del mismo rango."""
+    start_utc = TIMEZONE.localize(datetime.combine(start_date, datetime.min.time())).astimezone(pytz.utc)
+    end_utc = TIMEZONE.localize(datetime.combine(end_date, datetime.max.time())).astimezone(pytz.utc)
+    in_range = (Order.status == "Pagada", Order.created_at >= start_utc, Order.created_at <= end_utc)
+
+    metrics = db.exec(
+        select(func.sum(Order.total_amount), func.count(Order.id), func.avg(Order.total_amount)).where(*in_range)
+    ).first()
+
+    report_items = db.exec(
+        select(OrderItem, Product, Order)
+        .join(Product, OrderItem.product_id == Product.id)
+        .join(Order, OrderItem.order_id == Order.id)
+        .where(*in_range)
+    ).all()
+    top_products, sales_by_category, sales_over_time = {}, {}, {}
+    for item, product, order in report_items:
+        top_products[product.name] = top_products.get(product.name, 0) + item.quantity
+        sales_by_category[product.category] = sales_by_category.get(product.category, 0) + item.quantity
+    for item, product, order in report_items:
+        order_date_local = pytz.utc.localize(order.created_at).astimezone(TIMEZONE).date()
+        week_key = (order_date_local - timedelta(days=order_date_local.weekday())).isoformat()
+        week = sales_over_time.setdefault(week_key, {"total_sales": 0.0, "order_ids": set()})
+        if order.id not in week["order_ids"]:
+            week["total_sales"] += order.total_amount
+            week["order_ids"].add(order.id)
+
+    detailed_orders = db.exec(
+        select(Order)
+        .options(joinedload(Order.user), joinedload(Order.items).joinedload(OrderItem.product))
+        .where(*in_range)
+        .order_by(Order.created_at.desc())
+    ).unique().all()
+    return metrics, top_products, sales_by_category, sales_over_time, len(detailed_orders)
+
+
+def seed(num_orders: int, num_days: int, num_products: int):
+    SQLModel.metadata.create_all(bind=engine)
+    random.seed(42)
+    now = datetime.utcnow()
+    with Session(engine) as db:
+        user = User(email="bench-reports@cafe.com", hashed_password="x", full_name="Bench", role="Vendedor")
+        db.add(user)
+        products = [
+            Product(sku=f"BENCH-R-{i}", name=f"Producto {i}", category=random.choice(["Bebida", "Comida", "Postre"]),
+                    price=float(random.randint(2, 12) * 500), stock=10_000_000)
+            for i in range(num_products)
+        ]
+        db.add_all(products)
+        db.commit()
+        prices = {p.id: p.price for p in products}
+        product_ids = list(prices)
+
+        order_rows, item_rows = [], []
+        for order_id in range(1, num_orders + 1):
+            chosen = random.sample(product_ids, k=random.randint(1, 4))
+            quantities = {pid: random.randint(1, 3) for pid in chosen}
+            subtotal = sum(prices[pid] * qty for pid, qty in quantities.items())
+            order_rows.append({
+                "id": order_id, "user_id": user.id, "payment_method": "Efectivo", "status": "Pagada",
+                "created_at": now - timedelta(seconds=random.randint(0, num_days * 86400)),
+                "subtotal": subtotal, "tax_amount": 0.0, "total_amount": subtotal
+            })
+            item_rows.extend(
+                {"order_id": order_id, "product_id": pid, "quantity": qty, "price_at_purchase": prices[pid]}
+                for pid, qty in quantities.items()
+            )
+        db.exec(insert(Order), params=order_rows)
+        db.exec(insert(OrderItem), params=item_rows)
+        db.commit()
+
+        start = time.perf_counter()
+        logic_rollups.rebuild_rollups(db)
+        print(f"rollups reconstruidos en {time.perf_counter() - start:.2f}s")
+
+
+def run(label, fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        with Session(engine) as db:
+            start = time.perf_counter()
+            fn(db)
+            timings.append(time.perf_counter() - start)
+    print(f"{label:<34} mejor {min(timings) * 1000:9.1f} ms | promedio {sum(timings) / len(timings) * 1000:9.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=20000)
+    parser.add_argument("--days", type=int, default=120)
+    parser.add_argument("--products", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    seed(args.orders, args.days, args.products)
+    end_date = logic_rollups.today()
+    start_date = end_date - timedelta(days=args.days)
+    start_utc = logic_rollups.start_of_day_utc(start_date)
+    end_utc = logic_rollups.start_of_day_utc(end_date + timedelta(days=1))
+
+    print(f"Base de datos: {engine.url.render_as_string(hide_password=True)} | "
+          f"{args.orders} órdenes en {args.days} días")
+    run("antes (3 recorridos)", lambda db: legacy_sales_report(db, start_date, end_date), args.repeat)
+    run("scan único (CTE, rango completo)",
+        lambda db: logic_report_engine.scan_sales(db, start_utc, end_utc, "week"), args.repeat)
+    run("rollups + scan de hoy",
+        lambda db: _build_sales_report(db, start_date, end_date, "week", lambda _: None), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Fixtures comunes. La base de datos se elige al importar FavoredCoffee.database,
+así que DATABASE_URL apunta a una SQLite temporal antes de cualquier import
+del paquete (igual que los scripts de benchmarks/).
+
+Uso:
+    python -m pytest -q
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_tmp_dir = tempfile.mkdtemp(prefix="favoredcoffee_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp_dir, 'test.db')}"
+
+from sqlmodel import SQLModel, Session  # noqa: E402
+
+from FavoredCoffee.database import engine  # noqa: E402
+from FavoredCoffee.models import Product, User  # noqa: E402
+from FavoredCoffee.logic import logic_idempotency, logic_report_cache, logic_settings  # noqa: E402
+from FavoredCoffee.logic.logic_settings import create_initial_settings  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def clean_database():
+    """Tablas vacías y cachés en memoria limpios en cada prueba."""
+    SQLModel.metadata.drop_all(engine)
+    SQLModel.metadata.create_all(engine)
+    logic_settings._cached_settings = None
+    logic_idempotency._cache.clear()
+    logic_report_cache.purge_report_cache()
+    logic_report_cache._cache_version = None
+    with Session(engine) as session:
+        create_initial_settings(session)
+    yield
+
+
+@pytest.fixture
+def db():
+    with Session(engine) as session:
+        yield session
+
+
+def _add_user(email: str, role: str) -> User:
+    with Session(engine) as session:
+        user = User(email=email, hashed_password="x", full_name=email.split("@")[0], role=role)
+        session.add(user)
+        session.commit()
+        session.refresh(user)
+        session.expunge(user)
+        return user
+
+
+@pytest.fixture
+def user() -> User:
+    return _add_user("vendedor@favored.co", "Vendedor")
+
+
+@pytest.fixture
+def other_user() -> User:
+    return _add_user("otro@favored.co", "Vendedor")
+
+
+@pytest.fixture
+def products():
+    """Tres productos con stock 5: {sku: id}."""
+    with Session(engine) as session:
+        catalog = [
+            Product(sku="CAF-1", name="Americano", category="Bebida", price=5000.0, stock=5),
+            Product(sku="CAF-2", name="Capuchino", category="Bebida", price=8000.0, stock=5),
+            Product(sku="PAN-1", name="Croissant", category="Comida", price=6000.0, stock=5),
+        ]
+        session.add_all(catalog)
+        session.commit()
+        return {p.sku: p.id for p in catalog}
+
+
+def get_stock(product_id: int) -> int:
+    with Session(engine) as session:
+        return session.get(Product, product_id).stock
@@ -0,0 +1,82 @@
+"""Exportación columnar (Parquet / Arrow IPC) de órdenes, items y productos."""
+import shutil
+import zipfile
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlmodel import Session
+
+from FavoredCoffee.models import Order, OrderItem
+from FavoredCoffee.logic import logic_columnar
+from FavoredCoffee.logic.logic_rollups import start_of_day_utc, today
+
+pa = pytest.importorskip("pyarrow")
+import pyarrow.ipc  # noqa: E402
+import pyarrow.parquet  # noqa: E402
+
+
+def add_order(db: Session, user, days_ago: int, items) -> int:
+    subtotal = sum(quantity * price for _, quantity, price in items)
+    order = Order(
+        user_id=user.id, created_at=start_of_day_utc(today() - timedelta(days=days_ago)) + timedelta(hours=10),
+        subtotal=subtotal, tax_amount=0.0, total_amount=subtotal
+    )
+    db.add(order)
+    db.flush()
+    for product_id, quantity, price in items:
+        db.add(OrderItem(order_id=order.id, product_id=product_id, quantity=quantity, price_at_purchase=price))
+    db.commit()
+    return order.id
+
+
+def read_table(path: str, export_format: str):
+    if export_format == "parquet":
+        return pa.parquet.read_table(path)
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).read_all()
+
+
+@pytest.fixture
+def history(db, user, products):
+    """Dos órdenes dentro del rango (hace 1 y 3 días) y una fuera (hace 10)."""
+    return {
+        "in_range": [
+            add_order(db, user, 1, [(products["CAF-1"], 2, 5000.0), (products["PAN-1"], 1, 6000.0)]),
+            add_order(db, user, 3, [(products["CAF-2"], 1, 8000.0)]),
+        ],
+        "outside": add_order(db, user, 10, [(products["CAF-1"], 1, 5000.0)]),
+    }
+
+
+@pytest.mark.parametrize("export_format", ["parquet", "arrow"])
+def test_export_writes_the_range_in_small_batches(monkeypatch, tmp_path, db, history, export_format):
+    monkeypatch.setattr(logic_columnar, "COLUMNAR_BATCH_ROWS", 1) # Varios RecordBatches por tabla
+
+    written = logic_columnar.export_columnar(
+        db, today() - timedelta(days=5), today(), export_format, str(tmp_path)
+    )
+
+    assert {name: info["rows"] for name, info in written.items()} == {"orders": 2, "order_items": 3, "products": 3}
+    orders = read_table(written["orders"]["path"], export_format)
+    assert orders.column("id").to_pylist() == history["in_range"]
+    assert sum(orders.column("total_amount").to_pylist()) == 16000.0 + 8000.0
+    assert str(orders.schema.field("created_at").type) == "timestamp[us, tz=UTC]"
+    items = read_table(written["order_items"]["path"], export_format)
+    assert set(items.column("order_id").to_pylist()) == set(history["in_range"])
+
+
+def test_export_zip_contains_one_file_per_table(db, history):
+    zip_path, work_dir = logic_columnar.export_columnar_zip(db, today() - timedelta(days=5), today(), "parquet")
+    try:
+        with zipfile.ZipFile(zip_path) as archive:
+            assert sorted(archive.namelist()) == ["order_items.parquet", "orders.parquet", "products.parquet"]
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True) # Lo borra quien llama, como la ruta de la API
+
+
+@pytest.mark.parametrize("export_format, days", [("csv", 1), ("parquet", -1)])
+def test_invalid_format_or_range_is_rejected(tmp_path, db, export_format, days):
+    with pytest.raises(HTTPException) as error:
+        logic_columnar.export_columnar(db, today(), today() + timedelta(days=days), export_format, str(tmp_path))
+    assert error.value.status_code == 400
@@ -0,0 +1,110 @@
+"""Modo group commit: lotes, aislamiento por orden, claves y timeouts."""
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi import HTTPException
+from sqlmodel import Session, select, func
+
+from conftest import get_stock
+from FavoredCoffee.database import engine
+from FavoredCoffee.models import Order
+from FavoredCoffee.schemas import OrderRequest
+from FavoredCoffee.logic import logic_group_commit, logic_idempotency
+from FavoredCoffee.logic.logic_group_commit import GroupCommitWriter
+from FavoredCoffee.logic.logic_orders import create_new_order
+
+
+def order_request(product_id: int, quantity: int = 1) -> OrderRequest:
+    return OrderRequest(items=[{"product_id": product_id, "quantity": quantity}])
+
+
+def order_count() -> int:
+    with Session(engine) as session:
+        return session.exec(select(func.count()).select_from(Order)).one()
+
+
+def submit_all(writer: GroupCommitWriter, jobs):
+    """Envía (request, user, key) en paralelo; devuelve la orden o el HTTPException de cada uno."""
+    def submit(job):
+        try:
+            return writer.submit(*job)
+        except HTTPException as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=len(jobs)) as pool:
+        return list(pool.map(submit, jobs))
+
+
+def test_concurrent_orders_share_one_commit_and_fail_independently(user, products):
+    writer = GroupCommitWriter(window_ms=200, max_orders=3)
+
+    results = submit_all(writer, [
+        (order_request(products["CAF-1"], 2), user, None),
+        (order_request(products["CAF-2"], 9), user, None), # Sin stock
+        (order_request(products["PAN-1"], 1), user, None),
+    ])
+
+    rejected = [r for r in results if isinstance(r, HTTPException)]
+    assert len(rejected) == 1 and rejected[0].status_code == 400
+    assert order_count() == 2
+    assert (get_stock(products["CAF-1"]), get_stock(products["CAF-2"]), get_stock(products["PAN-1"])) == (3, 5, 4)
+    metrics = writer.get_metrics()
+    assert metrics["batches"] == 1
+    assert metrics["failed_orders"] == 1
+
+
+def test_repeated_key_inside_a_batch_is_applied_once(user, products):
+    writer = GroupCommitWriter(window_ms=200, max_orders=2)
+
+    first, second = submit_all(writer, [
+        (order_request(products["CAF-1"]), user, "pos-1"),
+        (order_request(products["CAF-1"]), user, "pos-1"),
+    ])
+
+    assert first.id == second.id
+    assert order_count() == 1
+    assert get_stock(products["CAF-1"]) == 4
+
+
+def test_key_collision_only_affects_its_own_order(monkeypatch, db, user, products):
+    winner = create_new_order(db, order_request(products["CAF-1"]), user, idempotency_key="pos-1")
+    logic_idempotency._cache.clear()
+
+    # Carrera: el lote no ve la clave al consultarla, pero ya existe al guardar
+    real_lookup = logic_idempotency.get_stored_response
+    lookups = []
+    def racing_lookup(*args, **kwargs):
+        lookups.append(args)
+        return None if len(lookups) == 1 else real_lookup(*args, **kwargs)
+    monkeypatch.setattr(logic_idempotency, "get_stored_response", racing_lookup)
+
+    writer = GroupCommitWriter(window_ms=200, max_orders=2)
+    replayed, other = submit_all(writer, [
+        (order_request(products["CAF-1"]), user, "pos-1"),
+        (order_request(products["CAF-2"]), user, None),
+    ])
+
+    assert replayed.id == winner.id
+    assert not isinstance(other, HTTPException)
+    assert order_count() == 2
+    assert get_stock(products["CAF-1"]) == 4 # La orden repetida no descontó de nuevo
+    assert get_stock(products["CAF-2"]) == 4
+
+
+def test_timed_out_order_is_cancelled_and_never_applied(monkeypatch, user, products):
+    monkeypatch.setattr(logic_group_commit, "ORDER_GROUP_COMMIT_TIMEOUT_SECONDS", 0.1)
+    writer = GroupCommitWriter(window_ms=5, max_orders=10)
+    start_writer = writer._ensure_started
+    monkeypatch.setattr(writer, "_ensure_started", lambda: None) # Escritor detenido
+
+    with pytest.raises(HTTPException) as error:
+        writer.submit(order_request(products["CAF-1"]), user)
+    assert error.value.status_code == 503
+
+    # Al arrancar, el escritor descarta el trabajo cancelado y sigue con el resto
+    start_writer()
+    monkeypatch.setattr(logic_group_commit, "ORDER_GROUP_COMMIT_TIMEOUT_SECONDS", 10)
+    writer.submit(order_request(products["CAF-2"]), user)
+
+    assert order_count() == 1
+    assert get_stock(products["CAF-1"]) == 5
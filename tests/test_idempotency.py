@@ -0,0 +1,95 @@
+"""Idempotency-Key en la creación de órdenes: repetición y claves en conflicto."""
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlmodel import Session, select, func
+
+from conftest import get_stock
+from FavoredCoffee.database import engine
+from FavoredCoffee.models import IdempotencyKey, Order
+from FavoredCoffee.schemas import OrderRequest
+from FavoredCoffee.logic import logic_idempotency
+from FavoredCoffee.logic.logic_orders import create_new_order
+
+
+def order_request(product_id: int, quantity: int = 1) -> OrderRequest:
+    return OrderRequest(items=[{"product_id": product_id, "quantity": quantity}])
+
+
+def order_count() -> int:
+    with Session(engine) as session:
+        return session.exec(select(func.count()).select_from(Order)).one()
+
+
+def test_replay_returns_the_same_order_without_selling_twice(db, user, products):
+    first = create_new_order(db, order_request(products["CAF-1"], 2), user, idempotency_key="pos-1")
+    replay = create_new_order(db, order_request(products["CAF-1"], 2), user, idempotency_key="pos-1")
+
+    assert replay == first
+    assert order_count() == 1
+    assert get_stock(products["CAF-1"]) == 3
+
+
+def test_replay_after_restart_is_served_from_the_table(db, user, products):
+    first = create_new_order(db, order_request(products["CAF-1"]), user, idempotency_key="pos-1")
+    logic_idempotency._cache.clear() # Otro worker o un reinicio: el LRU está vacío
+
+    replay = create_new_order(db, order_request(products["CAF-1"]), user, idempotency_key="pos-1")
+
+    assert replay.id == first.id
+    assert order_count() == 1
+
+
+@pytest.mark.parametrize("from_table", [False, True])
+def test_same_key_with_a_different_order_is_rejected(db, user, products, from_table):
+    create_new_order(db, order_request(products["CAF-1"], 1), user, idempotency_key="pos-1")
+    if from_table:
+        logic_idempotency._cache.clear()
+
+    with pytest.raises(HTTPException) as error:
+        create_new_order(db, order_request(products["CAF-1"], 3), user, idempotency_key="pos-1")
+
+    assert error.value.status_code == 422
+    assert order_count() == 1
+    assert get_stock(products["CAF-1"]) == 4
+
+
+def test_same_key_from_another_user_is_rejected(db, user, other_user, products):
+    create_new_order(db, order_request(products["CAF-1"]), user, idempotency_key="pos-1")
+
+    with pytest.raises(HTTPException) as error:
+        create_new_order(db, order_request(products["CAF-1"]), other_user, idempotency_key="pos-1")
+
+    assert error.value.status_code == 422
+    assert order_count() == 1
+
+
+def test_expired_key_creates_a_new_order(db, user, products):
+    first = create_new_order(db, order_request(products["CAF-1"]), user, idempotency_key="pos-1")
+    logic_idempotency._cache.clear()
+    with Session(engine) as session:
+        key = session.get(IdempotencyKey, "pos-1")
+        key.expires_at = datetime.utcnow() - timedelta(seconds=1)
+        session.add(key)
+        session.commit()
+
+    second = create_new_order(db, order_request(products["CAF-1"]), user, idempotency_key="pos-1")
+
+    assert second.id != first.id
+    assert order_count() == 2
+    with Session(engine) as session:
+        assert session.get(IdempotencyKey, "pos-1").expires_at > datetime.utcnow()
+
+
+def test_purge_removes_expired_keys(db, user, products):
+    create_new_order(db, order_request(products["CAF-1"]), user, idempotency_key="pos-1")
+    with Session(engine) as session:
+        key = session.get(IdempotencyKey, "pos-1")
+        key.expires_at = datetime.utcnow() - timedelta(seconds=1)
+        session.add(key)
+        session.commit()
+
+    with Session(engine) as session:
+        assert logic_idempotency.purge_expired_keys(session) == 1
+        assert session.get(IdempotencyKey, "pos-1") is None
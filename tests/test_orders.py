@@ -0,0 +1,109 @@
+"""Creación de órdenes: descuento condicional de stock, lotes y ledger."""
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi import HTTPException
+from sqlmodel import Session, select, func
+
+from conftest import get_stock
+from FavoredCoffee.database import engine
+from FavoredCoffee.models import Order, OrderItem, StockMovement
+from FavoredCoffee.schemas import OrderRequest
+from FavoredCoffee.logic import logic_stock
+from FavoredCoffee.logic.logic_orders import create_new_order, create_orders_batch
+
+
+def order_request(*items, **extra) -> OrderRequest:
+    return OrderRequest(items=[{"product_id": p, "quantity": q} for p, q in items], **extra)
+
+
+def count(model) -> int:
+    with Session(engine) as session:
+        return session.exec(select(func.count()).select_from(model)).one()
+
+
+def test_create_order_decrements_stock_and_writes_items(db, user, products):
+    response = create_new_order(db, order_request((products["CAF-1"], 2), (products["PAN-1"], 1)), user)
+
+    assert response.subtotal == 2 * 5000.0 + 6000.0
+    assert [item.quantity for item in response.items] == [2, 1]
+    assert get_stock(products["CAF-1"]) == 3
+    assert get_stock(products["PAN-1"]) == 4
+    assert count(Order) == 1
+    assert count(OrderItem) == 2
+
+
+def test_insufficient_stock_rolls_back_the_whole_order(db, user, products):
+    # El primer item sí alcanza: su descuento también debe deshacerse
+    with pytest.raises(HTTPException) as error:
+        create_new_order(db, order_request((products["CAF-1"], 1), (products["CAF-2"], 6)), user)
+
+    assert error.value.status_code == 400
+    assert get_stock(products["CAF-1"]) == 5
+    assert get_stock(products["CAF-2"]) == 5
+    assert count(Order) == 0
+
+
+def _buy_concurrently(user, product_id: int, attempts: int):
+    def buy(_):
+        with Session(engine) as session:
+            try:
+                create_new_order(session, order_request((product_id, 1)), user)
+                return 200
+            except HTTPException as e:
+                return e.status_code
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        return list(pool.map(buy, range(attempts)))
+
+
+def test_concurrent_orders_never_oversell(user, products):
+    codes = _buy_concurrently(user, products["CAF-1"], attempts=12)
+
+    assert codes.count(200) == 5
+    assert set(codes) == {200, 400}
+    assert get_stock(products["CAF-1"]) == 0
+
+
+def test_ledger_concurrent_orders_never_oversell(monkeypatch, user, products):
+    monkeypatch.setattr(logic_stock, "STOCK_LEDGER", True)
+
+    codes = _buy_concurrently(user, products["CAF-1"], attempts=12)
+
+    assert codes.count(200) == 5
+    # Product.stock no se toca hasta compactar; el disponible sí quedó en 0
+    assert get_stock(products["CAF-1"]) == 5
+    with Session(engine) as session:
+        assert logic_stock.get_pending_deltas(session) == {products["CAF-1"]: -5}
+        assert logic_stock.compact_stock_movements(session) == 5
+    assert get_stock(products["CAF-1"]) == 0
+    assert count(StockMovement) == 0
+
+
+def test_batch_isolates_rejected_orders(db, user, products):
+    results = create_orders_batch(db, [
+        order_request((products["CAF-1"], 2)),
+        # Descuenta CAF-2 y luego falla en PAN-1: su SAVEPOINT deshace ambos
+        order_request((products["CAF-2"], 1), (products["PAN-1"], 9)),
+        order_request((products["CAF-2"], 3)),
+    ], user)
+
+    assert [r.success for r in results] == [True, False, True]
+    assert "Stock insuficiente" in results[1].detail
+    assert get_stock(products["CAF-1"]) == 3
+    assert get_stock(products["CAF-2"]) == 2
+    assert get_stock(products["PAN-1"]) == 5
+    assert count(Order) == 2
+
+
+def test_sold_at_is_stored_within_the_backdate_window(db, user, products):
+    from datetime import datetime, timedelta, timezone
+
+    sold_at = datetime.now(timezone.utc) - timedelta(hours=30)
+    response = create_new_order(db, order_request((products["CAF-1"], 1), sold_at=sold_at), user)
+    assert response.created_at == sold_at.replace(tzinfo=None)
+
+    for rejected in (datetime.now(timezone.utc) + timedelta(hours=1), datetime.now(timezone.utc) - timedelta(days=30)):
+        with pytest.raises(HTTPException) as error:
+            create_new_order(db, order_request((products["CAF-1"], 1), sold_at=rejected), user)
+        assert error.value.status_code == 422
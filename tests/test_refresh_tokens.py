@@ -0,0 +1,119 @@
+"""Refresh tokens rotativos: rotación, ventana de gracia y detección de reuso."""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlmodel import Session, select
+
+from FavoredCoffee.database import engine
+from FavoredCoffee.models import RefreshToken
+from FavoredCoffee.logic import logic_auth
+
+
+def issue(user) -> str:
+    with Session(engine) as session:
+        return logic_auth.issue_refresh_token(session, user)
+
+
+def rotate(raw_token: str) -> str:
+    with Session(engine) as session:
+        _, new_token = logic_auth.rotate_refresh_token(session, raw_token)
+        return new_token
+
+
+def active_tokens(user_id: int):
+    with Session(engine) as session:
+        return session.exec(
+            select(RefreshToken).where(RefreshToken.user_id == user_id, RefreshToken.revoked_at == None)
+        ).all()
+
+
+def age_revocation(raw_token: str, seconds: int):
+    """Simula que el token se rotó hace `seconds` segundos."""
+    with Session(engine) as session:
+        record = session.exec(
+            select(RefreshToken).where(RefreshToken.token_hash == logic_auth._hash_token(raw_token))
+        ).one()
+        record.revoked_at = datetime.utcnow() - timedelta(seconds=seconds)
+        session.add(record)
+        session.commit()
+
+
+def test_rotation_revokes_the_old_token_and_issues_a_new_one(user):
+    first = issue(user)
+    second = rotate(first)
+
+    assert second != first
+    assert [t.token_hash for t in active_tokens(user.id)] == [logic_auth._hash_token(second)]
+    assert rotate(second) not in (first, second)
+
+
+def test_reuse_inside_the_grace_window_returns_the_same_successor(user):
+    first = issue(user)
+    second = rotate(first)
+
+    # Dos pestañas o una respuesta perdida: el token viejo llega otra vez
+    assert rotate(first) == second
+    assert len(active_tokens(user.id)) == 1
+
+
+def test_reuse_after_the_grace_window_revokes_every_token(user):
+    first = issue(user)
+    second = rotate(first)
+    other_device = issue(user)
+    age_revocation(first, logic_auth.REFRESH_TOKEN_REUSE_GRACE_SECONDS + 1)
+
+    with pytest.raises(HTTPException) as error:
+        rotate(first)
+
+    assert error.value.status_code == 401
+    assert active_tokens(user.id) == []
+    for token in (second, other_device):
+        with pytest.raises(HTTPException):
+            rotate(token)
+
+
+def test_reuse_after_the_successor_was_rotated_is_rejected(user):
+    first = issue(user)
+    second = rotate(first)
+    rotate(second)
+
+    # El sucesor ya no está activo: no hay nada que devolver, se trata como robo
+    with pytest.raises(HTTPException) as error:
+        rotate(first)
+    assert error.value.status_code == 401
+    assert active_tokens(user.id) == []
+
+
+def test_concurrent_rotations_all_get_the_same_successor(user):
+    first = issue(user)
+
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        successors = list(pool.map(lambda _: rotate(first), range(6)))
+
+    assert len(set(successors)) == 1
+    assert [t.token_hash for t in active_tokens(user.id)] == [logic_auth._hash_token(successors[0])]
+
+
+def test_expired_or_unknown_tokens_are_rejected(user):
+    first = issue(user)
+    with Session(engine) as session:
+        record = session.exec(select(RefreshToken)).one()
+        record.expires_at = datetime.utcnow() - timedelta(seconds=1)
+        session.add(record)
+        session.commit()
+
+    for token in (first, "no-existe"):
+        with pytest.raises(HTTPException) as error:
+            rotate(token)
+        assert error.value.status_code == 401
+
+
+def test_logout_revokes_the_token(user):
+    first = issue(user)
+    with Session(engine) as session:
+        logic_auth.revoke_refresh_token(session, first)
+
+    with pytest.raises(HTTPException):
+        rotate(first)
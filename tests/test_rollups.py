@@ -0,0 +1,158 @@
+"""Rollups de ventas: los reportes leídos de rollups deben coincidir con las órdenes crudas."""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlmodel import Session, select
+
+from FavoredCoffee.models import HourlySalesRollup, Order, OrderItem
+from FavoredCoffee.logic import logic_reports, logic_rollups
+from FavoredCoffee.logic.logic_report_engine import sales_aggregates, scan_sales
+from FavoredCoffee.logic.logic_rollups import start_of_day_utc, today, week_start
+
+DAYS = 20
+
+
+def add_order(db: Session, user, created_at: datetime, items) -> int:
+    """Orden pagada con su hora real (UTC), encolada para los rollups como en logic_orders."""
+    subtotal = sum(quantity * price for _, quantity, price in items)
+    order = Order(
+        user_id=user.id, created_at=created_at,
+        subtotal=subtotal, tax_amount=0.0, total_amount=subtotal
+    )
+    db.add(order)
+    db.flush()
+    for product_id, quantity, price in items:
+        db.add(OrderItem(order_id=order.id, product_id=product_id, quantity=quantity, price_at_purchase=price))
+    logic_rollups.record_order(db, order.id)
+    db.commit()
+    return order.id
+
+
+def cancel_order(db: Session, order_id: int):
+    """Cancelación: cambia el estado y encola el delta negativo en la misma transacción."""
+    order = db.get(Order, order_id)
+    order.status = "Cancelada"
+    db.add(order)
+    logic_rollups.record_order(db, order_id, sign=-1)
+    db.commit()
+
+
+def seed_history(db: Session, user, products, days=range(1, DAYS + 1)):
+    """Varias órdenes por día, incluidas horas que en Bogotá caen en el día anterior."""
+    start = start_of_day_utc(today())
+    for offset in days:
+        day = start - timedelta(days=offset)
+        add_order(db, user, day + timedelta(hours=3), [(products["CAF-1"], 1, 5000.0)]) # 22:00 local
+        add_order(db, user, day + timedelta(hours=14, minutes=offset), [
+            (products["CAF-2"], 2, 8000.0), (products["PAN-1"], offset % 3 + 1, 6000.0)
+        ])
+        if offset % 4 == 0:
+            cancel_order(db, add_order(db, user, day + timedelta(hours=18), [(products["PAN-1"], 5, 6000.0)]))
+
+
+def compact_all(db: Session):
+    while logic_rollups.compact_rollups(db):
+        pass
+
+
+def raw_aggregates(db: Session, start_date, end_date, granularity: str) -> dict:
+    return scan_sales(db, start_of_day_utc(start_date), start_of_day_utc(end_date + timedelta(days=1)), granularity)
+
+
+def assert_same_aggregates(actual: dict, expected: dict):
+    assert actual["total_sales"] == pytest.approx(expected["total_sales"])
+    assert actual["order_count"] == expected["order_count"]
+    assert actual["products"] == expected["products"]
+    assert actual["categories"] == expected["categories"]
+    assert actual["periods"] == pytest.approx(expected["periods"])
+
+
+@pytest.mark.parametrize("granularity", ["day", "week", "month"])
+def test_compacted_rollups_match_raw_orders(db, user, products, granularity):
+    seed_history(db, user, products)
+    start_date, end_date = today() - timedelta(days=DAYS + 1), today()
+    expected = raw_aggregates(db, start_date, end_date, granularity)
+    assert expected["order_count"] == 2 * DAYS
+
+    # Pendientes: todo se lee de las órdenes
+    assert_same_aggregates(sales_aggregates(db, start_date, end_date, granularity), expected)
+
+    compact_all(db)
+    assert logic_rollups.first_open_day(db) >= today() - timedelta(days=1)
+    assert_same_aggregates(sales_aggregates(db, start_date, end_date, granularity), expected)
+
+
+def test_hourly_rollups_match_raw_orders(db, user, products):
+    seed_history(db, user, products, days=range(1, 8))
+    compact_all(db)
+    start_date, end_date = today() - timedelta(days=8), today()
+
+    assert_same_aggregates(
+        sales_aggregates(db, start_date, end_date, "hour"), raw_aggregates(db, start_date, end_date, "hour")
+    )
+
+
+def test_cancellation_compacted_later_removes_the_order(db, user, products):
+    day = start_of_day_utc(today()) - timedelta(days=2)
+    add_order(db, user, day + timedelta(hours=3), [(products["CAF-1"], 1, 5000.0)])
+    cancelled = add_order(db, user, day + timedelta(hours=18), [(products["PAN-1"], 2, 6000.0)])
+    compact_all(db)
+    cancel_order(db, cancelled)
+    compact_all(db)
+    start_date, end_date = today() - timedelta(days=3), today()
+
+    for granularity in ("hour", "day", "week"):
+        assert_same_aggregates(
+            sales_aggregates(db, start_date, end_date, granularity), raw_aggregates(db, start_date, end_date, granularity)
+        )
+    # La hora que solo tenía la orden cancelada no queda como fila en cero
+    assert len(db.exec(select(HourlySalesRollup)).all()) == 1
+
+
+def test_pending_and_compacted_orders_are_counted_once(db, user, products):
+    seed_history(db, user, products, days=range(3, DAYS + 1))
+    compact_all(db)
+    # Ventas sincronizadas tarde: días ya consolidados vuelven a tener pendientes
+    seed_history(db, user, products, days=[2, 5, 9])
+    start_date, end_date = today() - timedelta(days=DAYS + 1), today()
+
+    assert logic_rollups.first_open_day(db) == logic_rollups.business_date(
+        start_of_day_utc(today()) - timedelta(days=9) + timedelta(hours=3)
+    )
+    expected = raw_aggregates(db, start_date, end_date, "day")
+    assert_same_aggregates(sales_aggregates(db, start_date, end_date, "day"), expected)
+
+    compact_all(db)
+    assert_same_aggregates(sales_aggregates(db, start_date, end_date, "day"), expected)
+
+
+def test_rebuild_matches_raw_orders_and_skips_pending_ones(db, user, products):
+    seed_history(db, user, products, days=range(3, DAYS + 1))
+    compact_all(db)
+    seed_history(db, user, products, days=[4]) # Pendiente durante el rebuild
+    start_date, end_date = today() - timedelta(days=DAYS + 1), today()
+    expected = raw_aggregates(db, start_date, end_date, "day")
+
+    logic_rollups.rebuild_rollups(db)
+    assert_same_aggregates(sales_aggregates(db, start_date, end_date, "day"), expected)
+
+    compact_all(db) # La orden pendiente se suma una sola vez
+    assert_same_aggregates(sales_aggregates(db, start_date, end_date, "day"), expected)
+
+
+def test_sales_report_and_weekly_sales_match_raw_orders(db, user, products):
+    seed_history(db, user, products)
+    compact_all(db)
+    seed_history(db, user, products, days=[1])
+    start_date, end_date = today() - timedelta(days=DAYS + 1), today()
+    expected = raw_aggregates(db, start_date, end_date, "day")
+
+    report = logic_reports.get_sales_report(db, start_date, end_date, "day")
+    assert report["total_orders"] == expected["order_count"]
+    assert report["total_revenue"] == pytest.approx(expected["total_sales"])
+
+    last_week = week_start(today()) - timedelta(days=7)
+    week_expected = raw_aggregates(db, last_week, last_week + timedelta(days=6), "day")
+    sales, orders = logic_rollups.weekly_sales(db, [last_week])[last_week]
+    assert sales == pytest.approx(week_expected["total_sales"])
+    assert orders == week_expected["order_count"]
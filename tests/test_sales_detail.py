@@ -0,0 +1,60 @@
+"""Detalle de ventas: paginación por cursor sobre (created_at, id)."""
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlmodel import Session
+
+from FavoredCoffee.models import Order
+from FavoredCoffee.logic.logic_reports import get_detailed_sales
+from FavoredCoffee.logic.logic_rollups import start_of_day_utc, today
+
+
+def add_orders(db: Session, user, created_ats, status: str = "Pagada"):
+    orders = [
+        Order(user_id=user.id, created_at=created_at, status=status, subtotal=1000.0, tax_amount=0.0, total_amount=1000.0)
+        for created_at in created_ats
+    ]
+    db.add_all(orders)
+    db.commit()
+    return [order.id for order in orders]
+
+
+def all_pages(db: Session, start_date, end_date, limit: int):
+    ids, cursor, pages = [], None, 0
+    while True:
+        page = get_detailed_sales(db, start_date, end_date, cursor=cursor, limit=limit)
+        ids += [item.id for item in page["items"]]
+        pages += 1
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return ids, pages
+
+
+def test_pages_cover_every_order_once_even_with_equal_timestamps(db, user):
+    noon = start_of_day_utc(today() - timedelta(days=1)) + timedelta(hours=12)
+    # Bloques de órdenes con el mismo created_at que quedan partidos entre páginas
+    created_ats = [noon + timedelta(minutes=minute) for minute in (0, 0, 0, 5, 5, 9, 9, 9, 9, 20, 30)]
+    ids = add_orders(db, user, created_ats)
+    add_orders(db, user, [noon + timedelta(minutes=7)], status="Cancelada")
+
+    paged, pages = all_pages(db, today() - timedelta(days=2), today(), limit=3)
+
+    expected = [i for _, i in sorted(zip(created_ats, ids), reverse=True)]
+    assert paged == expected
+    assert pages == 4
+
+
+def test_last_full_page_has_no_next_cursor(db, user):
+    noon = start_of_day_utc(today()) + timedelta(hours=12)
+    add_orders(db, user, [noon] * 4)
+
+    page = get_detailed_sales(db, today(), today(), limit=4)
+    assert len(page["items"]) == 4
+    assert page["next_cursor"] is None
+
+
+def test_invalid_cursor_is_rejected(db):
+    with pytest.raises(HTTPException) as error:
+        get_detailed_sales(db, today(), today(), cursor="no-es-un-cursor")
+    assert error.value.status_code == 400